@@ -3,14 +3,47 @@ ASGI config for DjangoEnquete project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn DjangoEnquete.asgi:application``)
+so that the live results stream (``/api/enquetes/<id>/stream/``) does not hold
+a worker thread per connected viewer. Under ASGI the list, retrieve and vote
+endpoints are also served by async views (``enquete.assincrono``); set
+``ENQUETE_VIEWS_ASSINCRONAS=0`` to keep the sync DRF views.
+
+WhiteNoise's middleware is sync-only: in the middleware stack it would make
+Django run the whole chain in a thread. Here it is left out of ``MIDDLEWARE``
+and static files (``STATIC_URL``) are answered before Django, by WhiteNoise as
+a WSGI app in a thread of its own; API requests never touch it. Behind a CDN
+or a proxy that serves ``STATIC_ROOT``, those requests never get here.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
 
+from asgiref.wsgi import WsgiToAsgi
+from django.conf import settings
 from django.core.asgi import get_asgi_application
+from whitenoise import WhiteNoise
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoEnquete.settings')
+os.environ.setdefault('ENQUETE_VIEWS_ASSINCRONAS', '1')
+os.environ.setdefault('ENQUETE_WHITENOISE_MIDDLEWARE', '0')
+
+django_application = get_asgi_application()
+
+
+def _nao_encontrado(environ, start_response):
+    start_response('404 Not Found', [('Content-Type', 'text/plain; charset=utf-8')])
+    return [b'Not Found']
+
+
+estaticos = WsgiToAsgi(WhiteNoise(
+    _nao_encontrado, root=settings.STATIC_ROOT, prefix=settings.STATIC_URL, autorefresh=settings.DEBUG
+))
+
 
-application = get_asgi_application()
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'].startswith(settings.STATIC_URL):
+        return await estaticos(scope, receive, send)
+    return await django_application(scope, receive, send)
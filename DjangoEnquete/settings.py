@@ -43,8 +43,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    # Middleware do Whitenoise
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Métricas por rota (latência, consultas, tempo de SQL), em /api/metrics/
+    'enquete.metricas.MetricasMiddleware',
+    # Leituras no primário por alguns segundos depois de uma escrita (réplicas)
+    'enquete.replicas.FixacaoPrimarioMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,6 +56,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Middleware do Whitenoise, só sob WSGI: ele é apenas síncrono, e sob ASGI
+# faria o Django adaptar a cadeia inteira (uma thread por requisição). O
+# asgi.py desliga esta opção e serve os estáticos antes do Django.
+ENQUETE_WHITENOISE_MIDDLEWARE = os.environ.get('ENQUETE_WHITENOISE_MIDDLEWARE', '1') == '1'
+if ENQUETE_WHITENOISE_MIDDLEWARE:
+    MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+
 ROOT_URLCONF = 'DjangoEnquete.urls'
 
 TEMPLATES = [
@@ -82,6 +91,27 @@ DATABASES = {
     )
 }
 
+# SQLite (uso local): escritores concorrentes esperam pelo lock em vez de
+# falhar na hora, e o banco de testes fica em arquivo para ser compartilhado
+# entre threads (o padrão em memória não enfileira escritas).
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'timeout': 30,
+        'transaction_mode': 'IMMEDIATE',
+    })
+    DATABASES['default']['TEST'] = {'NAME': BASE_DIR / 'test_db.sqlite3'}
+
+# Réplicas de leitura (URLs separadas por vírgula), como replica_1, replica_2...
+# As leituras da API (list, retrieve, resultados etc.) vão para elas; votos e
+# demais escritas ficam no primário. Nos testes espelham o banco padrão.
+DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+]
+for indice, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    DATABASES[f'replica_{indice}'] = dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True)
+    DATABASES[f'replica_{indice}']['TEST'] = {'MIRROR': 'default'}
+ENQUETE_REPLICAS = [alias for alias in DATABASES if alias.startswith('replica_')]
+DATABASE_ROUTERS = ['enquete.replicas.RoteadorReplicas']
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -116,6 +146,18 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Nomes fixos no schema para os enums de status (enquete e expurgo)
+SPECTACULAR_SETTINGS = {
+    'ENUM_NAME_OVERRIDES': {
+        'StatusEnqueteEnum': 'enquete.models.STATUS_ENQUETE',
+        'StatusExpurgoEnum': 'enquete.models.ExecucaoExpurgo.STATUS_CHOICES',
+    },
+}
+
+# Documentação: usa o schema gerado no build (`manage.py gerar_schema`, em
+# STATIC_ROOT/openapi/) quando ele existe; '0' volta a gerar a cada requisição.
+ENQUETE_SCHEMA_ESTATICO = os.environ.get('ENQUETE_SCHEMA_ESTATICO', '1') == '1'
+
 # Configuração de CORS segura
 CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ALLOWED_ORIGINS', 'http://localhost:4200,http://127.0.0.1:4200').split(',')
 CORS_ALLOW_CREDENTIALS = True
@@ -146,3 +188,143 @@ LOGGING = {
         'level': 'WARNING',
     },
 }
+
+# Contadores de votos fragmentados: quantidade padrão de slots por opção.
+# 1 mantém o contador direto em Opcao.votos; cada enquete pode sobrescrever.
+ENQUETE_SLOTS_CONTADOR = int(os.environ.get('ENQUETE_SLOTS_CONTADOR', 1))
+
+# Modo de registro dos votos: 'direto' grava a cada requisição; 'buffer'
+# aceita o voto em memória e grava em lotes a cada intervalo (em segundos)
+# ou quando o lote enche.
+ENQUETE_MODO_VOTO = os.environ.get('ENQUETE_MODO_VOTO', 'direto')
+ENQUETE_BUFFER_TAMANHO_LOTE = int(os.environ.get('ENQUETE_BUFFER_TAMANHO_LOTE', 500))
+ENQUETE_BUFFER_INTERVALO = float(os.environ.get('ENQUETE_BUFFER_INTERVALO', 1.0))
+
+# Cache: Redis quando REDIS_URL estiver definido (compartilhado entre os
+# workers, requer o pacote 'redis'); senão, memória local do processo.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Cache dos payloads das enquetes. Ligado por padrão só com cache
+# compartilhado: com memória local, cada worker aqueceria a própria cópia.
+ENQUETE_CACHE_PAYLOADS = os.environ.get('ENQUETE_CACHE_PAYLOADS', '1' if REDIS_URL else '0') == '1'
+ENQUETE_CACHE_ALIAS = 'default'
+ENQUETE_CACHE_TIMEOUT = int(os.environ.get('ENQUETE_CACHE_TIMEOUT', 300))
+# Acertos e falhas são somados no cache a cada tantos segundos, fora das requisições.
+ENQUETE_CACHE_ESTATISTICAS_INTERVALO = float(os.environ.get('ENQUETE_CACHE_ESTATISTICAS_INTERVALO', 10.0))
+
+# Resultados ao vivo (SSE): broker que distribui os avisos de voto entre os
+# processos, intervalo mínimo entre atualizações e keep-alive, em segundos.
+ENQUETE_BROKER = os.environ.get(
+    'ENQUETE_BROKER',
+    'enquete.streaming.BrokerRedis' if REDIS_URL else 'enquete.streaming.BrokerEmProcesso'
+)
+ENQUETE_STREAM_INTERVALO = float(os.environ.get('ENQUETE_STREAM_INTERVALO', 1.0))
+ENQUETE_STREAM_HEARTBEAT = float(os.environ.get('ENQUETE_STREAM_HEARTBEAT', 15.0))
+
+# Paginação da lista de enquetes: 'offset' (limit/offset, com contagem) ou
+# 'cursor' (keyset, sem contagem). O cliente também escolhe com ?paginacao=.
+ENQUETE_PAGINACAO = os.environ.get('ENQUETE_PAGINACAO', 'offset')
+ENQUETE_PAGINA_CURSOR_TAMANHO = int(os.environ.get('ENQUETE_PAGINA_CURSOR_TAMANHO', 20))
+
+# Leituras (list e retrieve) montadas direto das linhas do banco, sem o
+# EnqueteSerializer, e renderizadas com orjson quando instalado. A saída é a
+# mesma; '0' volta ao serializer.
+ENQUETE_LEITURA_RAPIDA = os.environ.get('ENQUETE_LEITURA_RAPIDA', '1') == '1'
+
+# Réplicas: segundos que um cliente lê do primário depois de escrever e
+# segundos que uma réplica com falha fica fora da escolha.
+ENQUETE_REPLICA_FIXACAO = int(os.environ.get('ENQUETE_REPLICA_FIXACAO', 5))
+ENQUETE_REPLICA_ESPERA = float(os.environ.get('ENQUETE_REPLICA_ESPERA', 30))
+# O cookie dessa fixação vai nas requisições do frontend (CORS com
+# credenciais): com ele em outro site (FRONTEND_URL), só com SameSite=None,
+# que os navegadores exigem junto com Secure.
+ENQUETE_REPLICA_COOKIE_SAMESITE = os.environ.get('ENQUETE_REPLICA_COOKIE_SAMESITE', 'None' if FRONTEND_URL else 'Lax')
+
+# Filtro em memória de quem já votou, por enquete: o voto repetido recebe o
+# 409 sem ir ao banco. Limites de participantes guardados no processo (total
+# e por enquete) e tempo (segundos) até reaquecer cada enquete a partir do banco.
+ENQUETE_FILTRO_PARTICIPANTES = os.environ.get('ENQUETE_FILTRO_PARTICIPANTES', '0') == '1'
+ENQUETE_FILTRO_PARTICIPANTES_MAX_ENTRADAS = int(os.environ.get('ENQUETE_FILTRO_PARTICIPANTES_MAX_ENTRADAS', 200000))
+ENQUETE_FILTRO_PARTICIPANTES_MAX_POR_ENQUETE = int(os.environ.get('ENQUETE_FILTRO_PARTICIPANTES_MAX_POR_ENQUETE', 20000))
+ENQUETE_FILTRO_PARTICIPANTES_TTL = float(os.environ.get('ENQUETE_FILTRO_PARTICIPANTES_TTL', 300))
+
+# Admin de votos e opções: máximo de linhas contadas na paginação (sem
+# filtros, no PostgreSQL, vale a estimativa do planejador) e de enquetes
+# listadas pela busca do filtro por enquete.
+ENQUETE_ADMIN_CONTAGEM_MAXIMA = int(os.environ.get('ENQUETE_ADMIN_CONTAGEM_MAXIMA', 10000))
+ENQUETE_ADMIN_FILTRO_MAXIMO = int(os.environ.get('ENQUETE_ADMIN_FILTRO_MAXIMO', 20))
+
+# Quantidade máxima de enquetes aceitas por requisição de criação em lote.
+ENQUETE_LOTE_MAXIMO = int(os.environ.get('ENQUETE_LOTE_MAXIMO', 1000))
+
+# Quantidade máxima de votos aceitos por requisição de voto em lote.
+ENQUETE_LOTE_VOTOS_MAXIMO = int(os.environ.get('ENQUETE_LOTE_VOTOS_MAXIMO', 5000))
+
+# Linhas lidas do banco por vez (cursor no servidor) nas exportações em fluxo.
+ENQUETE_EXPORTACAO_LOTE = int(os.environ.get('ENQUETE_EXPORTACAO_LOTE', 2000))
+
+# Quantidade máxima de enquetes por consulta de resultados em lote (?ids=).
+ENQUETE_RESULTADOS_MAXIMO = int(os.environ.get('ENQUETE_RESULTADOS_MAXIMO', 200))
+
+# Expurgo de enquetes expiradas: enquetes por lote, votos apagados por
+# transação e orçamento de tempo (segundos) da execução disparada pela API.
+ENQUETE_EXPURGO_TAMANHO_LOTE = int(os.environ.get('ENQUETE_EXPURGO_TAMANHO_LOTE', 100))
+ENQUETE_EXPURGO_LOTE_VOTOS = int(os.environ.get('ENQUETE_EXPURGO_LOTE_VOTOS', 5000))
+ENQUETE_EXPURGO_ORCAMENTO = float(os.environ.get('ENQUETE_EXPURGO_ORCAMENTO', 60))
+ENQUETE_EXPURGO_RELATORIO = int(os.environ.get('ENQUETE_EXPURGO_RELATORIO', 10))
+
+# Arquivamento de votos: tempo (segundos) após o encerramento antes de
+# arquivar, para que votos ainda em buffer sejam gravados.
+ENQUETE_ARQUIVAMENTO_CARENCIA = int(os.environ.get('ENQUETE_ARQUIVAMENTO_CARENCIA', 300))
+
+# Linha do tempo dos votos: votos incorporados por transação, idade mínima
+# (segundos) de um voto para ser incorporado e máximo de intervalos por
+# consulta ao endpoint.
+ENQUETE_INTERVALOS_LOTE = int(os.environ.get('ENQUETE_INTERVALOS_LOTE', 5000))
+ENQUETE_INTERVALOS_ATRASO = int(os.environ.get('ENQUETE_INTERVALOS_ATRASO', 5))
+ENQUETE_LINHA_DO_TEMPO_MAX_INTERVALOS = int(os.environ.get('ENQUETE_LINHA_DO_TEMPO_MAX_INTERVALOS', 1440))
+
+# Reconciliação dos contadores com os votos: enquetes conferidas por
+# transação e idade mínima (segundos) de um voto para a marca d'água passar dele.
+ENQUETE_RECONCILIACAO_LOTE = int(os.environ.get('ENQUETE_RECONCILIACAO_LOTE', 200))
+ENQUETE_RECONCILIACAO_ATRASO = int(os.environ.get('ENQUETE_RECONCILIACAO_ATRASO', 5))
+
+# Marcas d'água: por quanto tempo (segundos) a marca espera um id que falta
+# antes de passar dele (uma transação aberta há mais tempo que isso perde o
+# processamento incremental). É também o atraso máximo da marca.
+ENQUETE_MARCA_LACUNA_VALIDADE = int(os.environ.get('ENQUETE_MARCA_LACUNA_VALIDADE', 60))
+
+# Métricas por rota em /api/metrics/. Com vários workers, aponte
+# ENQUETE_METRICAS_DIR para um diretório local compartilhado: cada processo
+# grava ali seu acumulado a cada intervalo (segundos), por uma thread de
+# fundo, e os arquivos de processos encerrados são apagados na leitura.
+ENQUETE_METRICAS = os.environ.get('ENQUETE_METRICAS', '1') == '1'
+ENQUETE_METRICAS_DIR = os.environ.get('ENQUETE_METRICAS_DIR')
+ENQUETE_METRICAS_INTERVALO_GRAVACAO = float(os.environ.get('ENQUETE_METRICAS_INTERVALO_GRAVACAO', 5))
+
+# Log de requisições lentas (logger 'enquete.lentas'), com o SQL executado:
+# desligado com 0; senão, limite em milissegundos e máximo de consultas no log.
+ENQUETE_LOG_LENTAS_MS = float(os.environ.get('ENQUETE_LOG_LENTAS_MS', 0))
+ENQUETE_LOG_LENTAS_MAX_SQL = int(os.environ.get('ENQUETE_LOG_LENTAS_MAX_SQL', 50))
+
+# Views assíncronas (list, retrieve e votar) nas mesmas URLs. Ligadas pelo
+# asgi.py; sob WSGI cada requisição já ocupa uma thread e elas não ajudam.
+ENQUETE_VIEWS_ASSINCRONAS = os.environ.get('ENQUETE_VIEWS_ASSINCRONAS', '0') == '1'
+if ENQUETE_VIEWS_ASSINCRONAS:
+    # Sob ASGI cada requisição usa sua própria thread para o ORM: conexões
+    # persistentes se acumulariam, uma por thread
+    for banco in DATABASES.values():
+        banco['CONN_MAX_AGE'] = 0
@@ -0,0 +1,16 @@
+"""
+Configurações dos testes: as do projeto mais um segundo banco de teste (não
+um espelho), com a configuração do padrão, para os testes de réplica saberem
+quem respondeu. Fica fora de ENQUETE_REPLICAS; os testes o ligam com
+override_settings.
+
+    python manage.py test --settings=DjangoEnquete.settings_testes
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES
+
+DATABASES['replica_teste'] = {**DATABASES['default'], 'TEST': {'NAME': (
+    BASE_DIR / 'test_db_replica.sqlite3'
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3'
+    else f"test_{DATABASES['default']['NAME']}_replica"
+)}}
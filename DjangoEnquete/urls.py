@@ -1,18 +1,19 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import RedirectView
-from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from enquete import documentacao
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('enquete.urls', namespace='enquete')),
     path('', RedirectView.as_view(url='/api/swagger/', permanent=False)),
 
-    # Documentação automática
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
-    path('api/swagger/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path('api/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
+    # Documentação automática (schema pré-gerado por `gerar_schema`, quando existe)
+    path('api/schema/', documentacao.schema, name='schema'),
+    path('api/swagger/', documentacao.swagger, name='swagger-ui'),
+    path('api/redoc/', documentacao.redoc, name='redoc'),
 
     # Autenticação JWT
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -1,6 +1,110 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
 from .models import Enquete, Opcao, Voto
-from django.utils import timezone
+from .reconciliacao import marcar_para_conferir
+from .versoes import enquetes_alteradas
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginador do admin sem ``COUNT(*)`` exato sobre tabelas grandes. Sem
+    filtros, no PostgreSQL, usa a estimativa do planejador (``reltuples``);
+    com filtros, ou em outros bancos, conta no máximo
+    ``ENQUETE_ADMIN_CONTAGEM_MAXIMA`` linhas (páginas além disso pedem um
+    filtro mais preciso).
+    """
+
+    @cached_property
+    def count(self):
+        consulta = self.object_list
+        maximo = settings.ENQUETE_ADMIN_CONTAGEM_MAXIMA
+        if not consulta.query.where:
+            estimativa = self._estimativa(consulta)
+            if estimativa is not None and estimativa > maximo:
+                return estimativa
+        return consulta.order_by()[:maximo].count()
+
+    @staticmethod
+    def _estimativa(consulta):
+        conexao = connections[consulta.db]
+        if conexao.vendor != 'postgresql':
+            return None
+        with conexao.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [consulta.model._meta.db_table]
+            )
+            linha = cursor.fetchone()
+        # -1: tabela ainda não analisada
+        return linha[0] if linha and linha[0] >= 0 else None
+
+
+class FiltroEnquete(admin.SimpleListFilter):
+    """
+    Filtro por enquete sem carregar todas na barra lateral: um campo de busca
+    pelo id ou por parte do título, que lista só as enquetes encontradas
+    (até ``ENQUETE_ADMIN_FILTRO_MAXIMO``). O filtro em si é por ``enquete_id``,
+    que usa o índice da chave estrangeira.
+    """
+    title = 'enquete'
+    parameter_name = 'enquete'
+    template = 'admin/enquete/filtro_busca.html'
+
+    def lookups(self, request, model_admin):
+        valor = (self.value() or '').strip()
+        if not valor:
+            return []
+        enquetes = Enquete.objects.filter(id=valor) if valor.isdigit() else Enquete.objects.filter(
+            titulo__icontains=valor
+        ).order_by('-data_criacao')
+        return [
+            (str(id_enquete), f'#{id_enquete} {titulo}')
+            for id_enquete, titulo in enquetes.values_list('id', 'titulo')[:settings.ENQUETE_ADMIN_FILTRO_MAXIMO]
+        ]
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        if not self.lookup_choices:
+            raise IncorrectLookupParameters('Nenhuma enquete encontrada.')
+        return queryset.filter(enquete_id__in=[int(id_enquete) for id_enquete, _ in self.lookup_choices])
+
+    def choices(self, changelist):
+        yield {
+            'busca': True,
+            'valor': self.value() or '',
+            'ocultos': [
+                (chave, valor)
+                for chave, valores in changelist.filter_params.items() if chave != self.parameter_name
+                for valor in valores
+            ],
+        }
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'Todas',
+        }
+        for id_enquete, titulo in self.lookup_choices:
+            yield {
+                'selected': self.value() == id_enquete,
+                'query_string': changelist.get_query_string({self.parameter_name: id_enquete}),
+                'display': titulo,
+            }
+
+
+class AdminEscalavel(admin.ModelAdmin):
+    """Changelist para tabelas grandes: contagem estimada, sem contagem total nem facetas."""
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
 
 @admin.register(Enquete)
 class EnqueteAdmin(admin.ModelAdmin):
@@ -10,20 +114,61 @@ class EnqueteAdmin(admin.ModelAdmin):
     ordering = ('-data_criacao',)
 
     def get_status(self, obj):
-        return "Aberta" if obj.expires_at > timezone.now() else "Encerrada"
+        return obj.status
 
     get_status.short_description = 'Status'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            enquetes_alteradas(obj.pk)
+
 
 @admin.register(Opcao)
-class OpcaoAdmin(admin.ModelAdmin):
+class OpcaoAdmin(AdminEscalavel):
     list_display = ('id', 'enquete', 'texto_opcao', 'votos')
-    list_filter = ('enquete',)
+    list_select_related = ('enquete',)
+    list_filter = (FiltroEnquete,)
     search_fields = ('texto_opcao',)
+    raw_id_fields = ('enquete',)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        enquetes_alteradas(obj.enquete_id)
+        marcar_para_conferir(obj.enquete_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        enquetes_alteradas(obj.enquete_id)
+        marcar_para_conferir(obj.enquete_id)
+
+    def delete_queryset(self, request, queryset):
+        ids = set(queryset.values_list('enquete_id', flat=True))
+        super().delete_queryset(request, queryset)
+        enquetes_alteradas(*ids)
+        marcar_para_conferir(*ids)
 
 
 @admin.register(Voto)
-class VotoAdmin(admin.ModelAdmin):
+class VotoAdmin(AdminEscalavel):
     list_display = ('id', 'id_participante', 'enquete', 'opcao_escolhida', 'data_voto')
-    list_filter = ('enquete',)
-    search_fields = ('id_participante',)
\ No newline at end of file
+    list_select_related = ('enquete', 'opcao_escolhida')
+    list_filter = (FiltroEnquete,)
+    # Busca exata: usa o índice de (id_participante, enquete)
+    search_fields = ('id_participante__exact',)
+    raw_id_fields = ('enquete', 'opcao_escolhida')
+
+    # O admin não mexe nos contadores: a reconciliação acerta as enquetes alteradas
+    def save_model(self, request, obj, form, change):
+        anterior = Voto.objects.filter(pk=obj.pk).values_list('enquete_id', flat=True).first() if change else None
+        super().save_model(request, obj, form, change)
+        marcar_para_conferir(*{obj.enquete_id, anterior} - {None})
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        marcar_para_conferir(obj.enquete_id)
+
+    def delete_queryset(self, request, queryset):
+        ids = set(queryset.values_list('enquete_id', flat=True))
+        super().delete_queryset(request, queryset)
+        marcar_para_conferir(*ids)
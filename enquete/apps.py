@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class EnqueteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'enquete'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .metricas import instalar_medidor
+        connection_created.connect(instalar_medidor, dispatch_uid='enquete_medidor_sql')
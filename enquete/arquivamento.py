@@ -0,0 +1,180 @@
+"""
+Arquivamento dos votos de enquetes encerradas.
+
+Uma enquete encerrada não recebe mais votos, mas suas linhas em ``Voto``
+ficam na tabela quente (e nos índices usados pelo caminho do voto) até o
+expurgo, 72 horas depois. O arquivamento congela os totais por opção em
+``Opcao.votos``, move os votos individuais para um ``ArquivoVotos``
+compactado e os apaga da tabela de votos.
+
+Só a troca de estado é uma transação (curta): totais, arquivo e
+``arquivada_em``. A leitura dos votos para o arquivo vem antes dela, e a
+remoção depois, em fatias de ids como no expurgo, sem travas longas na
+enquete nem na marca d'água da linha do tempo.
+"""
+import codecs
+import csv
+import io
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.utils import timezone
+
+from .expurgo import apagar_direto
+from .linha_do_tempo import MARCA as MARCA_INTERVALOS, incorporar
+from .models import ArquivoVotos, ContadorOpcao, Enquete, MarcaDagua, Opcao, Voto
+from .versoes import incrementar_versao
+
+LINHAS_POR_BLOCO = 5000
+
+
+def enquetes_para_arquivar():
+    """Encerradas há mais que a carência (para votos em buffer chegarem) e ainda não arquivadas."""
+    limite = timezone.now() - timedelta(seconds=settings.ENQUETE_ARQUIVAMENTO_CARENCIA)
+    return Enquete.objects.filter(expires_at__lte=limite, arquivada_em__isnull=True).order_by('expires_at')
+
+
+def _compactar_votos(enquete_id):
+    """Retorna ``(conteudo_zlib, linhas, bytes_csv)`` dos votos da enquete, lidos em blocos."""
+    compressor = zlib.compressobj(9)
+    partes = []
+    linhas = 0
+    bytes_csv = 0
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    votos = (
+        Voto.objects.filter(enquete_id=enquete_id)
+        .order_by('id')
+        .values_list('id_participante', 'opcao_escolhida_id', 'data_voto')
+        .iterator(chunk_size=LINHAS_POR_BLOCO)
+    )
+    for id_participante, id_opcao, data_voto in votos:
+        escritor.writerow([id_participante, id_opcao, data_voto.isoformat()])
+        linhas += 1
+        if linhas % LINHAS_POR_BLOCO == 0:
+            bloco = buffer.getvalue().encode()
+            bytes_csv += len(bloco)
+            partes.append(compressor.compress(bloco))
+            buffer.seek(0)
+            buffer.truncate()
+
+    bloco = buffer.getvalue().encode()
+    bytes_csv += len(bloco)
+    partes.append(compressor.compress(bloco))
+    partes.append(compressor.flush())
+    return b''.join(partes), linhas, bytes_csv
+
+
+def _bytes_na_tabela(enquete_id, bytes_csv):
+    """Espaço ocupado pelas linhas de votos: exato no PostgreSQL, estimado pelo CSV nos demais."""
+    if connection.vendor != 'postgresql':
+        return bytes_csv
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT COALESCE(SUM(pg_column_size(v.*)), 0) FROM {Voto._meta.db_table} v '
+            'WHERE v.enquete_id = %s',
+            [enquete_id]
+        )
+        return cursor.fetchone()[0]
+
+
+def ler_votos_arquivados(arquivo, tamanho_pedaco=64 * 1024):
+    """Gera ``(id_participante, id_opcao, data_voto_iso)`` de um ``ArquivoVotos``, aos pedaços."""
+    descompressor = zlib.decompressobj()
+    decodificador = codecs.getincrementaldecoder('utf-8')()
+    conteudo = bytes(arquivo.conteudo)
+    resto = ''
+
+    for inicio in range(0, len(conteudo) + 1, tamanho_pedaco):
+        pedaco = conteudo[inicio:inicio + tamanho_pedaco]
+        if pedaco:
+            texto = resto + decodificador.decode(descompressor.decompress(pedaco))
+        else:
+            texto = resto + decodificador.decode(descompressor.flush(), final=True)
+        # Só processa até a última quebra de linha; o resto espera o próximo pedaço
+        completo, _, resto = texto.rpartition('\n')
+        for id_participante, id_opcao, data_voto in csv.reader(io.StringIO(completo)):
+            yield id_participante, int(id_opcao), data_voto
+
+
+def _congelar(enquete, conteudo, linhas, bytes_liberados):
+    """
+    Com a enquete travada: totais congelados, arquivo gravado e ``arquivada_em``
+    marcado. Os votos que a linha do tempo ainda não incorporou entram nela e
+    saem da tabela agora, com a marca travada: depois, o processamento não os veria.
+    """
+    enquete_id = enquete.pk
+    # Totais congelados a partir dos votos, que também absorvem os slots
+    contagens = dict(
+        Voto.objects.filter(enquete_id=enquete_id)
+        .values_list('opcao_escolhida_id')
+        .annotate(total=Count('id'))
+    )
+    if sum(contagens.values()) != linhas:
+        # Um voto chegou depois da leitura (buffer atrasado): o arquivo é refeito, já com a trava
+        conteudo, linhas, _ = _compactar_votos(enquete_id)
+    Opcao.objects.filter(enquete_id=enquete_id).update(votos=Case(
+        *[When(id=id_opcao, then=Value(total)) for id_opcao, total in contagens.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    ))
+    ContadorOpcao.objects.filter(opcao__enquete_id=enquete_id).delete()
+    arquivo = ArquivoVotos.objects.create(
+        enquete=enquete, total_votos=linhas, conteudo=conteudo, bytes_liberados=bytes_liberados
+    )
+
+    marca = MarcaDagua.travar(MARCA_INTERVALOS)
+    cauda = list(
+        Voto.objects.filter(enquete_id=enquete_id, id__gt=marca.ultimo_id)
+        .values_list('id', 'enquete_id', 'opcao_escolhida_id', 'data_voto')
+    )
+    incorporar(voto[1:] for voto in cauda)
+    apagar_direto(Voto, 'id', [voto[0] for voto in cauda])
+
+    enquete.arquivada_em = timezone.now()
+    enquete.save(update_fields=['arquivada_em'])
+    # Totais congelados (que podem diferir dos contadores) ganham versão nova no mesmo commit
+    incrementar_versao(enquete_id)
+    return arquivo
+
+
+def apagar_votos_arquivados(enquete_id, tamanho_fatia=None):
+    """
+    Apaga os votos de uma enquete já arquivada em fatias de ``tamanho_fatia``
+    ids, cada uma na sua transação. Retorna quantos foram apagados.
+    """
+    tamanho_fatia = tamanho_fatia or settings.ENQUETE_EXPURGO_LOTE_VOTOS
+    apagados = 0
+    while True:
+        fatia = list(Voto.objects.filter(enquete_id=enquete_id).values_list('id', flat=True)[:tamanho_fatia])
+        if fatia:
+            with transaction.atomic():
+                apagados += apagar_direto(Voto, 'id', fatia)
+        if len(fatia) < tamanho_fatia:
+            return apagados
+
+
+def arquivar_enquete(enquete_id, tamanho_fatia=None):
+    """
+    Arquiva os votos de uma enquete encerrada e os apaga em fatias. Retorna o
+    ``ArquivoVotos`` criado, ou ``None`` se a enquete já estava arquivada; nesse
+    caso, os votos que uma execução interrompida deixou são apagados.
+    """
+    arquivada = Enquete.objects.filter(pk=enquete_id).values_list('arquivada_em', flat=True).get()
+    arquivo = None
+    if not arquivada:
+        # Encerrada há mais que a carência, a enquete não recebe votos: a leitura longa fica sem travas
+        conteudo, linhas, bytes_csv = _compactar_votos(enquete_id)
+        bytes_liberados = _bytes_na_tabela(enquete_id, bytes_csv)
+        with transaction.atomic():
+            enquete = Enquete.objects.select_for_update().get(pk=enquete_id)
+            if not enquete.arquivada_em:
+                arquivo = _congelar(enquete, conteudo, linhas, bytes_liberados)
+
+    apagar_votos_arquivados(enquete_id, tamanho_fatia)
+    return arquivo
@@ -0,0 +1,187 @@
+"""
+Views assíncronas de leitura e voto, servidas pelo ASGI.
+
+Com ``settings.ENQUETE_VIEWS_ASSINCRONAS`` (ligado por ``DjangoEnquete/asgi.py``),
+``list``, ``retrieve`` e ``votar`` respondem por estas views nas mesmas
+URLs. Enquanto a requisição espera o banco, o event loop segue atendendo as
+outras, em vez de cada requisição em andamento ocupar uma thread do worker.
+
+A regra continua na ``EnqueteViewSet`` e nos módulos de domínio: paginação,
+filtros, cache e validadores HTTP são os da viewset, instanciada sem passar
+pelo dispatch do DRF, e a validação do voto é a do ``VotoInputSerializer``.
+As leituras usam o ORM assíncrono; a transação do voto, que precisa de uma
+thread, roda em ``sync_to_async``. Respostas são JSON, com o mesmo
+renderizador do DRF. Os demais métodos (criação, edição, exclusão) e o
+navegador da API (``text/html`` ou ``?format=``) seguem para a viewset síncrona.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import aprefetch_related_objects
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.request import Request
+
+from . import cache as cache_enquetes
+from .buffer import obter_buffer
+from .contadores import prefetch_opcoes
+from .leitura import NAO_ENCONTRADA, RenderizadorJSON, aler_enquetes
+from .models import Enquete
+from .replicas import em_replica
+from .serializers import EnqueteSerializer, VotoInputSerializer
+from .versoes import (
+    aestado_da_enquete, aplicar_validadores, estado_da_linha, validadores_enquete, validadores_lista
+)
+from .views import EnqueteViewSet
+from .votacao import ErroVoto, registrar_voto
+
+RENDERIZADOR = RenderizadorJSON()
+
+lista_sincrona = EnqueteViewSet.as_view({'get': 'list', 'post': 'create'}, basename='enquete', detail=False)
+detalhe_sincrono = EnqueteViewSet.as_view(
+    {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'},
+    basename='enquete', detail=True
+)
+votar_sincrono = EnqueteViewSet.as_view({'post': 'votar'}, basename='enquete', detail=True)
+
+
+def _para_viewset_sincrona(request, metodo):
+    """Outros métodos e o navegador da API (HTML) ficam com o DRF."""
+    formato = request.GET.get('format')
+    return (
+        request.method != metodo
+        or (formato and formato != RENDERIZADOR.format)
+        or 'text/html' in request.headers.get('Accept', '')
+    )
+
+
+def _viewset(request, acao, **kwargs):
+    """Viewset pronta para uso fora do dispatch, já negociada para JSON."""
+    requisicao = Request(request, parsers=[JSONParser(), FormParser(), MultiPartParser()])
+    requisicao.accepted_renderer = RENDERIZADOR
+    requisicao.accepted_media_type = RENDERIZADOR.media_type
+    return EnqueteViewSet(
+        request=requisicao, action=acao, args=(), kwargs=kwargs, format_kwarg=None,
+        basename='enquete', detail=acao != 'list'
+    )
+
+
+def _json(dados, status_http=status.HTTP_200_OK):
+    resposta = HttpResponse(
+        RENDERIZADOR.render(dados), status=status_http, content_type=RENDERIZADOR.media_type
+    )
+    patch_vary_headers(resposta, ['Accept'])
+    return resposta
+
+
+async def _ler_payloads(viewset, ids):
+    """Assíncrona de ``EnqueteViewSet.ler_payloads``."""
+    if settings.ENQUETE_LEITURA_RAPIDA:
+        return await aler_enquetes(ids)
+    por_id = {e.pk: e async for e in viewset.get_queryset().filter(id__in=ids)}
+    enquetes = [por_id[i] for i in ids if i in por_id]
+    return enquetes, viewset.get_serializer(enquetes, many=True).data
+
+
+async def _payloads_da_pagina(viewset, itens):
+    if cache_enquetes.ativo():
+        return await sync_to_async(viewset.payloads_em_cache)(itens)
+    return (await _ler_payloads(viewset, [e.pk for e in itens]))[1]
+
+
+@csrf_exempt
+@em_replica
+async def listar_enquetes(request):
+    if _para_viewset_sincrona(request, 'GET'):
+        return await sync_to_async(lista_sincrona)(request)
+
+    viewset = _viewset(request, 'list')
+    # Paginação (contagem e fatia) é síncrona no DRF
+    itens, paginada = await sync_to_async(viewset.pagina_de_versoes)()
+    etag, ultima_modificacao = validadores_lista(
+        viewset.request, itens, viewset.paginator if paginada else None
+    )
+    nao_modificada = viewset.resposta_nao_modificada(request, etag, ultima_modificacao)
+    if nao_modificada:
+        return nao_modificada
+
+    payloads = await _payloads_da_pagina(viewset, itens)
+    dados = viewset.resposta_da_pagina(payloads, paginada).data
+    return aplicar_validadores(_json(dados), etag, ultima_modificacao)
+
+
+@csrf_exempt
+@em_replica
+async def detalhar_enquete(request, pk):
+    if _para_viewset_sincrona(request, 'GET'):
+        return await sync_to_async(detalhe_sincrono)(request, pk=pk)
+
+    viewset = _viewset(request, 'retrieve', pk=pk)
+    estado = None
+    if cache_enquetes.ativo() or viewset.requisicao_condicional(request):
+        estado = await aestado_da_enquete(pk)
+        if estado is None:
+            return _json({'detail': NAO_ENCONTRADA}, status.HTTP_404_NOT_FOUND)
+        etag, ultima_modificacao = validadores_enquete(viewset.request, pk, **estado)
+        nao_modificada = viewset.resposta_nao_modificada(request, etag, ultima_modificacao)
+        if nao_modificada:
+            return nao_modificada
+
+    payload = chaves = None
+    if cache_enquetes.ativo():
+        chaves = {pk: cache_enquetes.chave_do_payload(pk, estado['versao'], estado['total_votos'])}
+        payload = await sync_to_async(cache_enquetes.obter_payload)(pk, chaves[pk])
+
+    if payload is None:
+        enquetes, payloads = await _ler_payloads(viewset, [pk])
+        if not payloads:
+            return _json({'detail': NAO_ENCONTRADA}, status.HTTP_404_NOT_FOUND)
+        payload = payloads[0]
+        if chaves:
+            await sync_to_async(cache_enquetes.guardar_payloads)(chaves, enquetes, payloads)
+
+    if estado is None:
+        etag, ultima_modificacao = validadores_enquete(viewset.request, pk, **estado_da_linha(enquetes[0], payload))
+    return aplicar_validadores(_json(payload), etag, ultima_modificacao)
+
+
+@csrf_exempt
+async def votar_enquete(request, pk):
+    if _para_viewset_sincrona(request, 'POST'):
+        return await sync_to_async(votar_sincrono)(request, pk=pk)
+
+    viewset = _viewset(request, 'votar', pk=pk)
+    try:
+        enquete = await Enquete.objects.aget(pk=pk)
+    except Enquete.DoesNotExist:
+        return _json({'detail': NAO_ENCONTRADA}, status.HTTP_404_NOT_FOUND)
+
+    serializer = VotoInputSerializer(data=viewset.request.data)
+    if not serializer.is_valid():
+        return _json(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    dados = {
+        'id_opcao': serializer.validated_data['id_opcao'],
+        'id_participante': serializer.validated_data['id_participante'],
+    }
+    bufferizado = settings.ENQUETE_MODO_VOTO == 'buffer'
+    compacta = viewset.resposta_compacta(viewset.request)
+
+    try:
+        if bufferizado:
+            await sync_to_async(obter_buffer().aceitar)(enquete, **dados)
+        else:
+            _, placar = await sync_to_async(registrar_voto)(enquete, com_placar=compacta, **dados)
+    except ErroVoto as erro:
+        return _json({'error': erro.mensagem}, erro.status_http)
+
+    if bufferizado:
+        return _json({'message': 'Voto aceito e será contabilizado em instantes.'}, status.HTTP_202_ACCEPTED)
+
+    if compacta:
+        return _json(placar)
+
+    await aprefetch_related_objects([enquete], prefetch_opcoes())
+    return _json(EnqueteSerializer(enquete).data)
@@ -0,0 +1,251 @@
+"""
+Ingestão de votos com escrita adiada (write-behind).
+
+No modo ``buffer`` o ``votar`` apenas valida e aceita o voto em memória; uma
+thread de fundo persiste os votos em lotes, com um ``bulk_create`` de ``Voto``
+e um único UPDATE agregado dos contadores por lote.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .contadores import incrementar_votos
+from .models import Enquete, Opcao, Voto
+from .participantes import obter_filtro
+from .votacao import EnqueteEncerrada, OpcaoInvalida, VotoDuplicado, votos_alterados
+
+logger = logging.getLogger(__name__)
+
+
+class BufferVotos:
+    """
+    Fila de votos aceitos e ainda não persistidos, com descarga em lotes.
+
+    O voto duplicado é barrado no aceite: primeiro contra os votos pendentes
+    deste processo, depois contra o filtro de participantes (se ligado) e
+    por fim contra o banco. Um duplicado gravado por outro processo depois do
+    aceite é descartado na descarga (e registrado no log): o 202 do aceite
+    não garante a gravação.
+    """
+
+    def __init__(self, tamanho_lote, intervalo):
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+
+        self._pendentes = []
+        self._chaves = set()
+        self._lock = threading.Lock()
+        self._lock_descarga = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+
+        self.aceitos = 0
+        self.persistidos = 0
+        self.descartados = 0
+        self.ultima_descarga = None
+
+    def aceitar(self, enquete, id_opcao, id_participante):
+        """Valida o voto e o coloca na fila. Levanta as mesmas exceções de ``registrar_voto``."""
+        if enquete.arquivada_em or enquete.expires_at <= timezone.now():
+            raise EnqueteEncerrada()
+
+        if not Opcao.objects.filter(id=id_opcao, enquete=enquete).exists():
+            raise OpcaoInvalida()
+
+        chave = (enquete.id, id_participante)
+        with self._lock:
+            if chave in self._chaves:
+                raise VotoDuplicado()
+        filtro = obter_filtro()
+        if filtro and filtro.ja_votou(enquete.id, id_participante):
+            raise VotoDuplicado()
+        if Voto.objects.filter(enquete=enquete, id_participante=id_participante).exists():
+            if filtro:
+                filtro.registrar(enquete.id, id_participante)
+            raise VotoDuplicado()
+
+        with self._lock:
+            if chave in self._chaves:
+                raise VotoDuplicado()
+            self._chaves.add(chave)
+            self._pendentes.append((enquete.id, id_opcao, id_participante, time.monotonic()))
+            self.aceitos += 1
+            lote_cheio = len(self._pendentes) >= self.tamanho_lote
+
+        self._garantir_thread()
+        if lote_cheio:
+            self._acordar.set()
+
+    def descarregar(self):
+        """Persiste todos os votos pendentes, lote a lote. Retorna quantos foram gravados."""
+        gravados = 0
+        with self._lock_descarga:
+            while True:
+                with self._lock:
+                    lote = self._pendentes[:self.tamanho_lote]
+                if not lote:
+                    return gravados
+
+                try:
+                    gravados += self._persistir(lote)
+                except Exception:
+                    # O lote continua na fila e é tentado de novo na próxima descarga
+                    logger.exception('Falha ao persistir lote de %d votos.', len(lote))
+                    return gravados
+
+                with self._lock:
+                    del self._pendentes[:len(lote)]
+                    self._chaves.difference_update((v[0], v[2]) for v in lote)
+                    self.ultima_descarga = timezone.now()
+
+    def _persistir(self, lote):
+        votos = [
+            Voto(enquete_id=enquete_id, opcao_escolhida_id=id_opcao, id_participante=id_participante)
+            for enquete_id, id_opcao, id_participante, _ in lote
+        ]
+
+        # Enquetes arquivadas ou expurgadas depois do aceite: os votos não são
+        # mais gravados nem somados aos contadores
+        abertas = set(
+            Enquete.objects.filter(
+                id__in={voto.enquete_id for voto in votos}, arquivada_em__isnull=True
+            ).values_list('id', flat=True)
+        )
+        fechadas = [
+            (voto.enquete_id, voto.id_participante) for voto in votos if voto.enquete_id not in abertas
+        ]
+        if fechadas:
+            logger.warning(
+                'Descarga do buffer descartou %d votos aceitos com 202 de enquetes arquivadas ou '
+                'apagadas, como (enquete, participante): %s', len(fechadas), fechadas
+            )
+        votos = [voto for voto in votos if voto.enquete_id in abertas]
+
+        # Participantes gravados por outro processo depois do aceite saem antes
+        # do INSERT, para não derrubar o lote inteiro para o voto a voto
+        existentes = set(
+            Voto.objects.filter(
+                enquete_id__in={voto.enquete_id for voto in votos},
+                id_participante__in={voto.id_participante for voto in votos}
+            ).values_list('enquete_id', 'id_participante')
+        )
+        novos = [voto for voto in votos if (voto.enquete_id, voto.id_participante) not in existentes]
+
+        try:
+            with transaction.atomic():
+                Voto.objects.bulk_create(novos)
+                incrementar_votos(self._contar(novos))
+                self._votos_alterados(novos)
+            aceitos = novos
+        except IntegrityError:
+            # Gravado entre a conferência e o INSERT, ou uma linha que o banco recusa: segue voto a voto
+            aceitos = []
+            for voto in novos:
+                try:
+                    with transaction.atomic():
+                        voto.save()
+                        incrementar_votos({voto.opcao_escolhida_id: 1})
+                        self._votos_alterados([voto])
+                    aceitos.append(voto)
+                except IntegrityError:
+                    pass
+
+        filtro = obter_filtro()
+        if filtro:
+            # Gravados aqui ou por outro processo: todos já votaram
+            for voto in votos:
+                filtro.registrar(voto.enquete_id, voto.id_participante)
+
+        gravados = {(voto.enquete_id, voto.id_participante) for voto in aceitos}
+        descartados = [
+            (voto.enquete_id, voto.id_participante) for voto in votos
+            if (voto.enquete_id, voto.id_participante) not in gravados
+        ]
+        if descartados:
+            logger.warning(
+                'Descarga do buffer descartou %d votos aceitos com 202 (participante já votou ou '
+                'linha recusada pelo banco), como (enquete, participante): %s', len(descartados), descartados
+            )
+
+        with self._lock:
+            self.persistidos += len(aceitos)
+            self.descartados += len(descartados) + len(fechadas)
+        return len(aceitos)
+
+    @staticmethod
+    def _votos_alterados(votos):
+        ids = {voto.enquete_id for voto in votos}
+        if ids:
+            transaction.on_commit(lambda: votos_alterados(*ids))
+
+    @staticmethod
+    def _contar(votos):
+        contagens = {}
+        for voto in votos:
+            contagens[voto.opcao_escolhida_id] = contagens.get(voto.opcao_escolhida_id, 0) + 1
+        return contagens
+
+    def estatisticas(self):
+        """Retrato da fila: o que foi aceito, gravado e o atraso do voto mais antigo."""
+        with self._lock:
+            pendentes = len(self._pendentes)
+            mais_antigo = self._pendentes[0][3] if self._pendentes else None
+            return {
+                'aceitos': self.aceitos,
+                'persistidos': self.persistidos,
+                'descartados': self.descartados,
+                'pendentes': pendentes,
+                'atraso_segundos': round(time.monotonic() - mais_antigo, 3) if mais_antigo else 0.0,
+                'ultima_descarga': self.ultima_descarga,
+                'tamanho_lote': self.tamanho_lote,
+                'intervalo_segundos': self.intervalo,
+            }
+
+    def _garantir_thread(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._executar, name='buffer-votos', daemon=True)
+            self._thread.start()
+
+    def _executar(self):
+        try:
+            while not self._parar.is_set():
+                self._acordar.wait(self.intervalo)
+                self._acordar.clear()
+                close_old_connections()
+                self.descarregar()
+        finally:
+            connection.close()
+
+    def encerrar(self):
+        """Para a thread de fundo e grava o que ainda estiver na fila."""
+        self._parar.set()
+        self._acordar.set()
+        if self._thread:
+            self._thread.join()
+        self.descarregar()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def obter_buffer():
+    """Buffer do processo, criado na primeira utilização e descarregado na saída."""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = BufferVotos(
+                tamanho_lote=settings.ENQUETE_BUFFER_TAMANHO_LOTE,
+                intervalo=settings.ENQUETE_BUFFER_INTERVALO
+            )
+            atexit.register(_buffer.encerrar)
+    return _buffer
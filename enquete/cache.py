@@ -0,0 +1,139 @@
+"""
+Cache dos payloads serializados das enquetes.
+
+Cada enquete é guardada já serializada (``EnqueteSerializer(...).data``) sob
+a chave ``enquete:payload:<id>:<versao>:<total de votos>``, o mesmo par do
+ETag (ver ``versoes``), lido antes do payload. O ``retrieve`` lê uma chave e
+o ``list`` busca as chaves da página com um único ``get_many``.
+
+Não há invalidação: um voto ou uma edição muda a chave, e o payload antigo
+só expira. Um payload lido do banco depois do estado é no mínimo tão novo
+quanto ele, então mesmo um voto que entre entre a leitura e o ``set`` nunca
+deixa um placar velho sob a chave nova. O payload também nunca vive além da
+próxima mudança de status, que depende só do relógio.
+
+Acertos e falhas são contados na memória do processo e somados no cache
+compartilhado por uma thread de fundo, a cada
+``ENQUETE_CACHE_ESTATISTICAS_INTERVALO`` segundos: a leitura de um payload
+não paga escritas extras no cache.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PREFIXO = 'enquete:payload:'
+CHAVE_ACERTOS = 'enquete:cache:acertos'
+CHAVE_FALHAS = 'enquete:cache:falhas'
+
+
+def ativo():
+    return settings.ENQUETE_CACHE_PAYLOADS
+
+
+def _cache():
+    return caches[settings.ENQUETE_CACHE_ALIAS]
+
+
+def chave_do_payload(id_enquete, versao, total_votos):
+    return f'{PREFIXO}{id_enquete}:{versao}:{total_votos}'
+
+
+class ContadoresLocais:
+    """Acertos e falhas ainda não somados no cache, descarregados periodicamente."""
+
+    def __init__(self):
+        self._pendentes = {CHAVE_ACERTOS: 0, CHAVE_FALHAS: 0}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def somar(self, acertos, falhas):
+        with self._lock:
+            self._pendentes[CHAVE_ACERTOS] += acertos
+            self._pendentes[CHAVE_FALHAS] += falhas
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._executar, name='cache-estatisticas', daemon=True)
+                self._thread.start()
+                atexit.register(self.descarregar)
+
+    def descarregar(self):
+        with self._lock:
+            pendentes = {chave: quantidade for chave, quantidade in self._pendentes.items() if quantidade}
+            self._pendentes = dict.fromkeys(self._pendentes, 0)
+        cache = _cache()
+        for chave, quantidade in pendentes.items():
+            # add() cria o contador sem sobrescrever o valor de outro processo
+            cache.add(chave, 0, timeout=None)
+            try:
+                cache.incr(chave, quantidade)
+            except ValueError:
+                cache.set(chave, quantidade, timeout=None)
+
+    def _executar(self):
+        while True:
+            time.sleep(settings.ENQUETE_CACHE_ESTATISTICAS_INTERVALO)
+            try:
+                self.descarregar()
+            except Exception:
+                logger.exception('Falha ao gravar as estatísticas do cache de payloads.')
+
+
+contadores = ContadoresLocais()
+
+
+def _timeout(enquete):
+    """Validade do payload: o timeout padrão, limitado à próxima troca de status."""
+    timeout = settings.ENQUETE_CACHE_TIMEOUT
+    now = timezone.now()
+    for limite in (enquete.expires_at, enquete.delete_at):
+        if limite and limite > now:
+            return max(1, min(timeout, int((limite - now).total_seconds())))
+    return timeout
+
+
+def obter_payloads(chaves):
+    """Retorna ``{id: payload}`` só com as enquetes de ``chaves`` (``{id: chave}``) encontradas no cache."""
+    if not chaves:
+        return {}
+    encontrados = _cache().get_many(list(chaves.values()))
+    payloads = {i: encontrados[c] for i, c in chaves.items() if c in encontrados}
+    contadores.somar(len(payloads), len(chaves) - len(payloads))
+    return payloads
+
+
+def obter_payload(id_enquete, chave):
+    return obter_payloads({id_enquete: chave}).get(id_enquete)
+
+
+def guardar_payloads(chaves, enquetes, payloads):
+    """
+    Guarda os payloads de ``enquetes`` (na mesma ordem) sob as ``chaves``
+    (``{id: chave}``) calculadas antes de lê-los, cada um com seu timeout.
+    Basta que cada enquete tenha ``id``, ``expires_at`` e ``delete_at``.
+    """
+    cache = _cache()
+    for enquete, payload in zip(enquetes, payloads):
+        cache.set(chaves[enquete.id], payload, timeout=_timeout(enquete))
+
+
+def estatisticas():
+    """Totais de todos os processos, com os deste já descarregados; os dos outros chegam no próximo ciclo."""
+    contadores.descarregar()
+    cache = _cache()
+    totais = cache.get_many([CHAVE_ACERTOS, CHAVE_FALHAS])
+    acertos = totais.get(CHAVE_ACERTOS, 0)
+    falhas = totais.get(CHAVE_FALHAS, 0)
+    consultas = acertos + falhas
+    return {
+        'ativo': ativo(),
+        'backend': settings.CACHES[settings.ENQUETE_CACHE_ALIAS]['BACKEND'],
+        'acertos': acertos,
+        'falhas': falhas,
+        'taxa_acerto': round(acertos / consultas, 4) if consultas else None,
+    }
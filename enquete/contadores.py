@@ -0,0 +1,117 @@
+"""
+Contadores de votos das opções.
+
+Por padrão o total fica direto em ``Opcao.votos``. Em enquetes muito
+disputadas, o contador pode ser fragmentado em N slots (``ContadorOpcao``):
+cada voto incrementa um slot sorteado, e o total é ``Opcao.votos`` mais a
+soma dos slots, até que ``consolidar_contadores`` os incorpore.
+"""
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Prefetch, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import ContadorOpcao, Opcao
+
+
+def slots_da_enquete(enquete):
+    """Quantidade de slots em uso: a da enquete ou o padrão global."""
+    return enquete.slots_contador or settings.ENQUETE_SLOTS_CONTADOR
+
+
+def opcoes_com_total():
+    """Queryset de opções anotado com os votos ainda pendentes nos slots."""
+    return Opcao.objects.annotate(
+        votos_pendentes=Coalesce(Sum('contadores__votos'), 0)
+    )
+
+
+def total_de_votos(enquete=OuterRef('pk')):
+    """
+    Expressão com o total de votos da enquete (opções mais slots), para
+    anotar consultas de ``Enquete``: duas subconsultas, sem ler as opções.
+    """
+    votos = (
+        Opcao.objects.filter(enquete=enquete).order_by()
+        .values('enquete').annotate(total=Sum('votos')).values('total')
+    )
+    pendentes = (
+        ContadorOpcao.objects.filter(opcao__enquete=enquete).order_by()
+        .values('opcao__enquete').annotate(total=Sum('votos')).values('total')
+    )
+    return Coalesce(Subquery(votos), 0) + Coalesce(Subquery(pendentes), 0)
+
+
+def prefetch_opcoes():
+    """Prefetch de ``opcoes`` já com o total de votos pronto para serializar."""
+    return Prefetch('opcoes', queryset=opcoes_com_total())
+
+
+def placar(id_enquete):
+    """Votos atuais de cada opção da enquete e o total, em uma consulta."""
+    opcoes = [
+        {'id': id_opcao, 'votos': votos + pendentes}
+        for id_opcao, votos, pendentes in opcoes_com_total()
+        .filter(enquete_id=id_enquete)
+        .values_list('id', 'votos', 'votos_pendentes')
+    ]
+    return {
+        'id': id_enquete,
+        'total_votos': sum(opcao['votos'] for opcao in opcoes),
+        'opcoes': opcoes,
+    }
+
+
+def incrementar_slot(id_opcao, slots):
+    """Incrementa um slot sorteado da opção, criando os slots na primeira vez."""
+    slot = random.randrange(slots)
+    filtro = ContadorOpcao.objects.filter(opcao_id=id_opcao, slot=slot)
+
+    if not filtro.update(votos=F('votos') + 1):
+        ContadorOpcao.objects.bulk_create(
+            [ContadorOpcao(opcao_id=id_opcao, slot=s) for s in range(slots)],
+            ignore_conflicts=True
+        )
+        filtro.update(votos=F('votos') + 1)
+
+
+def incrementar_votos(contagens):
+    """
+    Soma ``{id_opcao: quantidade}`` em ``Opcao.votos`` com um único UPDATE.
+    """
+    if not contagens:
+        return 0
+
+    incremento = Case(
+        *[When(id=id_opcao, then=Value(quantidade)) for id_opcao, quantidade in contagens.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    )
+    return Opcao.objects.filter(id__in=contagens).update(votos=F('votos') + incremento)
+
+
+def consolidar_contadores(opcao_ids=None):
+    """
+    Incorpora os slots em ``Opcao.votos`` e zera os slots, atomicamente.
+
+    Os slots são travados antes da leitura, então votos que chegarem durante
+    a consolidação esperam o commit e não se perdem.
+    Retorna ``{id_opcao: votos_incorporados}``.
+    """
+    slots = ContadorOpcao.objects.filter(votos__gt=0)
+    if opcao_ids is not None:
+        slots = slots.filter(opcao_id__in=opcao_ids)
+
+    with transaction.atomic():
+        linhas = list(slots.select_for_update().values_list('id', 'opcao_id', 'votos'))
+
+        contagens = {}
+        for _, id_opcao, votos in linhas:
+            contagens[id_opcao] = contagens.get(id_opcao, 0) + votos
+
+        incrementar_votos(contagens)
+        ContadorOpcao.objects.filter(id__in=[linha[0] for linha in linhas]).update(votos=0)
+
+    return contagens
@@ -0,0 +1,71 @@
+"""
+Schema OpenAPI pré-gerado e views da documentação carregadas sob demanda.
+
+Gerar o schema percorre a ``EnqueteViewSet`` e os serializers inteiros; em
+vez de fazer isso em cada worker, o comando ``gerar_schema`` grava o schema
+uma vez (YAML e JSON, com as versões .gz) em ``STATIC_ROOT/openapi/``, de
+onde o WhiteNoise serve como qualquer estático. Rode-o no build, depois do
+``collectstatic``.
+
+``/api/schema/`` redireciona para o arquivo pré-gerado quando ele existe e
+``ENQUETE_SCHEMA_ESTATICO`` está ligado; senão, gera na hora como antes. O
+Swagger e o ReDoc leem o mesmo arquivo. As views do drf-spectacular (e o que
+elas importam) só são carregadas na primeira requisição à documentação, não
+na inicialização do worker.
+"""
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponseRedirect
+
+DIRETORIO = 'openapi'
+ARQUIVOS = {'yaml': 'schema.yaml', 'json': 'schema.json'}
+
+_views = {}
+
+
+def caminho_do_schema(formato):
+    return Path(settings.STATIC_ROOT) / DIRETORIO / ARQUIVOS[formato]
+
+
+def url_do_schema(formato):
+    """URL do schema pré-gerado, ou ``None`` quando ele não deve ou não pode ser usado."""
+    if not settings.ENQUETE_SCHEMA_ESTATICO or not caminho_do_schema(formato).exists():
+        return None
+    return f'{settings.STATIC_URL}{DIRETORIO}/{ARQUIVOS[formato]}'
+
+
+def _formato(request):
+    formato = request.GET.get('format', '')
+    if formato in ('json', 'openapi-json') or 'json' in request.headers.get('Accept', ''):
+        return 'json'
+    return 'yaml'
+
+
+def _view(nome, **initkwargs):
+    """``as_view()`` da view ``nome`` do drf-spectacular, importada no primeiro uso."""
+    chave = (nome, *sorted(initkwargs.items()))
+    if chave not in _views:
+        from drf_spectacular import views
+        _views[chave] = getattr(views, nome).as_view(**initkwargs)
+    return _views[chave]
+
+
+def schema(request, *args, **kwargs):
+    url = url_do_schema(_formato(request))
+    if url:
+        return HttpResponseRedirect(url)
+    return _view('SpectacularAPIView')(request, *args, **kwargs)
+
+
+def _documentacao(nome):
+    url = url_do_schema('yaml')
+    return _view(nome, url=url) if url else _view(nome, url_name='schema')
+
+
+def swagger(request, *args, **kwargs):
+    return _documentacao('SpectacularSwaggerView')(request, *args, **kwargs)
+
+
+def redoc(request, *args, **kwargs):
+    return _documentacao('SpectacularRedocView')(request, *args, **kwargs)
@@ -0,0 +1,141 @@
+"""
+Exportação em fluxo dos votos de uma enquete e dos resultados de várias.
+
+As linhas saem do banco por um cursor no servidor (``iterator(chunk_size=...)``)
+e vão para a resposta em blocos de ``TAMANHO_BLOCO`` bytes, em CSV ou NDJSON:
+a memória fica constante, seja qual for o tamanho da enquete. Os votos de
+uma enquete arquivada vêm do ``ArquivoVotos``, descompactado aos pedaços (só
+o arquivo compactado fica inteiro na memória).
+
+Com gzip aceito em ``Accept-Encoding`` (com ``q`` maior que zero, ou por
+``*``) a resposta sai compactada no próprio fluxo
+(``Content-Encoding: gzip``). Sob ASGI, o fluxo é entregue por um iterador
+assíncrono que lê cada bloco em ``sync_to_async``, em vez de o Django
+consumir o iterador síncrono inteiro antes de enviar.
+"""
+import csv
+import io
+import json
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .arquivamento import ler_votos_arquivados
+from .contadores import opcoes_com_total
+from .models import ArquivoVotos, Opcao, Voto
+
+FORMATOS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+CAMPOS_VOTOS = ('id_participante', 'id_opcao', 'texto_opcao', 'data_voto')
+CAMPOS_RESULTADOS = ('id_enquete', 'titulo', 'id_opcao', 'texto_opcao', 'votos')
+TAMANHO_BLOCO = 64 * 1024
+
+
+def votos_da_enquete(enquete):
+    """``(id_participante, id_opcao, texto_opcao, data_voto_iso)`` de cada voto, em ordem de chegada."""
+    textos = dict(Opcao.objects.filter(enquete=enquete).values_list('id', 'texto_opcao'))
+
+    if enquete.arquivada_em:
+        arquivo = ArquivoVotos.objects.filter(enquete=enquete).first()
+        votos = ler_votos_arquivados(arquivo) if arquivo else ()
+        for id_participante, id_opcao, data_voto in votos:
+            yield id_participante, id_opcao, textos.get(id_opcao), data_voto
+        return
+
+    votos = (
+        Voto.objects.filter(enquete=enquete)
+        .order_by('id')
+        .values_list('id_participante', 'opcao_escolhida_id', 'data_voto')
+        .iterator(chunk_size=settings.ENQUETE_EXPORTACAO_LOTE)
+    )
+    for id_participante, id_opcao, data_voto in votos:
+        yield id_participante, id_opcao, textos.get(id_opcao), data_voto.isoformat()
+
+
+def totais_das_opcoes(enquetes):
+    """Total de cada opção (com os slots pendentes) das ``enquetes`` (queryset), em uma consulta."""
+    opcoes = (
+        opcoes_com_total()
+        .filter(enquete__in=enquetes.order_by().values('id'))
+        .order_by('enquete_id', 'id')
+        .values_list('enquete_id', 'enquete__titulo', 'id', 'texto_opcao', 'votos', 'votos_pendentes')
+        .iterator(chunk_size=settings.ENQUETE_EXPORTACAO_LOTE)
+    )
+    for id_enquete, titulo, id_opcao, texto_opcao, votos, pendentes in opcoes:
+        yield id_enquete, titulo, id_opcao, texto_opcao, votos + pendentes
+
+
+def em_blocos(linhas, campos, formato):
+    """Serializa ``linhas`` em blocos de bytes de ``TAMANHO_BLOCO``: CSV com cabeçalho ou NDJSON."""
+    buffer = io.StringIO()
+    if formato == 'csv':
+        escritor = csv.writer(buffer, lineterminator='\n')
+        escritor.writerow(campos)
+        escrever = escritor.writerow
+    else:
+        def escrever(linha):
+            buffer.write(json.dumps(dict(zip(campos, linha)), ensure_ascii=False))
+            buffer.write('\n')
+
+    for linha in linhas:
+        escrever(linha)
+        if buffer.tell() >= TAMANHO_BLOCO:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def compactar(blocos):
+    compressor = zlib.compressobj(wbits=31)  # 31: formato gzip
+    for bloco in blocos:
+        compactado = compressor.compress(bloco)
+        if compactado:
+            yield compactado
+    yield compressor.flush()
+
+
+def aceita_gzip(accept_encoding):
+    """
+    Se o cabeçalho ``Accept-Encoding`` aceita gzip: listado (ou coberto por
+    ``*``) com ``q`` maior que zero. ``gzip;q=0`` recusa.
+    """
+    pesos = {}
+    for item in accept_encoding.split(','):
+        codificacao, *parametros = [parte.strip() for parte in item.split(';')]
+        peso = 1.0
+        for parametro in parametros:
+            nome, _, valor = parametro.partition('=')
+            if nome.strip().lower() == 'q':
+                try:
+                    peso = float(valor)
+                except ValueError:
+                    peso = 0.0
+        pesos[codificacao.lower()] = peso
+    return pesos.get('gzip', pesos.get('x-gzip', pesos.get('*', 0.0))) > 0
+
+
+async def _assincrono(blocos):
+    proximo = sync_to_async(next)
+    while (bloco := await proximo(blocos, None)) is not None:
+        yield bloco
+
+
+def resposta_exportacao(request, linhas, campos, formato, nome_arquivo):
+    """``StreamingHttpResponse`` com ``linhas`` em ``formato``, compactada se o cliente aceitar gzip."""
+    blocos = em_blocos(linhas, campos, formato)
+    gzip = aceita_gzip(request.headers.get('Accept-Encoding', ''))
+    if gzip:
+        blocos = compactar(blocos)
+    if isinstance(request, ASGIRequest):
+        blocos = _assincrono(blocos)
+
+    resposta = StreamingHttpResponse(blocos, content_type=FORMATOS[formato])
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.{formato}"'
+    if gzip:
+        resposta['Content-Encoding'] = 'gzip'
+    patch_vary_headers(resposta, ['Accept-Encoding'])
+    return resposta
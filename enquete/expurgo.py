@@ -0,0 +1,261 @@
+"""
+Expurgo das enquetes expiradas (``delete_at`` já passou), em lotes.
+
+Em vez de um único ``delete()`` (que faz o coletor do Django carregar todas
+as opções e votos na memória e apagar tudo em uma transação longa), o motor
+apaga por lotes de enquetes com DELETEs diretos no banco: primeiro os votos,
+em fatias de tamanho fixo e cada fatia em sua própria transação, depois os
+dependentes das opções, as opções e as enquetes.
+
+Cada lote é registrado em ``ExecucaoExpurgo``. O progresso é persistido a
+cada lote, então interromper no meio (por tempo, falha ou processo
+encerrado) não perde nada: a próxima execução continua a partir do que
+ainda satisfaz o corte, ou retoma a mesma (``iniciar_execucao``). Só uma
+execução fica em andamento por vez, e a que está rodando renova
+``atualizada_em`` a cada fatia de votos, então só uma parada de verdade
+parece abandonada.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .linha_do_tempo import MARCA as MARCA_INTERVALOS
+from .models import Enquete, ExecucaoExpurgo, MarcaDagua, Opcao, Voto
+
+logger = logging.getLogger(__name__)
+
+
+def apagar_direto(modelo, campo, valores):
+    """
+    ``DELETE`` direto pelo cursor das linhas de ``modelo`` com ``campo`` em
+    ``valores``, sem coletar objetos nem disparar cascatas em Python.
+    Retorna quantas linhas foram apagadas.
+    """
+    if not valores:
+        return 0
+    tabela = connection.ops.quote_name(modelo._meta.db_table)
+    coluna = connection.ops.quote_name(modelo._meta.get_field(campo).column)
+    marcadores = ', '.join(['%s'] * len(valores))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {tabela} WHERE {coluna} IN ({marcadores})', list(valores))
+        return cursor.rowcount
+
+
+def _dependentes(modelo, *apagados_antes):
+    """
+    ``(modelo, campo)`` das chaves estrangeiras em cascata para ``modelo``,
+    lidas do ``_meta`` (também as ocultas, com ``related_name='+'``): um
+    modelo novo que aponte para ele entra sozinho.
+    """
+    return [
+        (relacao.related_model, relacao.field.name)
+        for relacao in modelo._meta.get_fields(include_hidden=True)
+        if relacao.auto_created and not relacao.concrete and not relacao.many_to_many
+        and relacao.on_delete is models.CASCADE
+        and relacao.related_model not in apagados_antes
+    ]
+
+
+def dependentes_das_opcoes():
+    """``(modelo, campo)`` que apontam para as opções (além dos votos), apagados antes delas."""
+    return _dependentes(Opcao, Voto)
+
+
+def dependentes_das_enquetes():
+    """``(modelo, campo)`` que apontam diretamente para as enquetes (além de votos e opções)."""
+    return _dependentes(Enquete, Voto, Opcao)
+
+
+class MotorExpurgo:
+    def __init__(self, tamanho_lote=None, tamanho_lote_votos=None, orcamento_segundos=None):
+        self.tamanho_lote = tamanho_lote or settings.ENQUETE_EXPURGO_TAMANHO_LOTE
+        self.tamanho_lote_votos = tamanho_lote_votos or settings.ENQUETE_EXPURGO_LOTE_VOTOS
+        self.orcamento_segundos = orcamento_segundos
+        self._inicio = None
+
+    def tempo_esgotado(self):
+        return (
+            self.orcamento_segundos is not None
+            and time.monotonic() - self._inicio >= self.orcamento_segundos
+        )
+
+    def executar(self, execucao=None):
+        """
+        Expurga até acabar ou até esgotar o orçamento de tempo. Sem
+        ``execucao``, inicia uma nova com corte no instante atual; com ela,
+        retoma a execução usando o mesmo corte.
+        """
+        self._inicio = time.monotonic()
+        if execucao is None:
+            execucao = ExecucaoExpurgo.objects.create(corte=timezone.now())
+        else:
+            execucao.status = ExecucaoExpurgo.EXECUTANDO
+            execucao.atualizada_em = timezone.now()
+            execucao.save(update_fields=['status', 'atualizada_em'])
+
+        try:
+            while not self.tempo_esgotado():
+                ids = list(
+                    Enquete.objects.filter(delete_at__lte=execucao.corte)
+                    .order_by('delete_at', 'id')
+                    .values_list('id', flat=True)[:self.tamanho_lote]
+                )
+                if not ids:
+                    execucao.status = ExecucaoExpurgo.CONCLUIDA
+                    break
+                self.expurgar_lote(execucao, ids)
+            else:
+                execucao.status = ExecucaoExpurgo.INTERROMPIDA
+        except Exception as erro:
+            logger.exception('Falha no expurgo de enquetes (execução %s).', execucao.pk)
+            execucao.status = ExecucaoExpurgo.FALHOU
+            execucao.erro = str(erro)
+            raise
+        finally:
+            execucao.finalizada_em = execucao.atualizada_em = timezone.now()
+            execucao.save()
+
+        return execucao
+
+    def expurgar_lote(self, execucao, ids):
+        inicio = time.monotonic()
+
+        votos = 0
+        while True:
+            fatia = list(
+                Voto.objects.filter(enquete_id__in=ids)
+                .values_list('id', flat=True)[:self.tamanho_lote_votos]
+            )
+            if fatia:
+                with transaction.atomic():
+                    votos += apagar_direto(Voto, 'id', fatia)
+                    # Sinal de vida por fatia: um lote longo não parece uma execução abandonada
+                    ExecucaoExpurgo.objects.filter(pk=execucao.pk).update(atualizada_em=timezone.now())
+            if len(fatia) < self.tamanho_lote_votos:
+                break
+            if self.tempo_esgotado():
+                # Lote incompleto: as enquetes continuam lá e serão retomadas
+                self.registrar_lote(execucao, inicio, votos=votos)
+                return
+
+        with transaction.atomic():
+            # Com a marca travada, a linha do tempo não cria intervalos destas opções no meio
+            MarcaDagua.travar(MARCA_INTERVALOS)
+            ids_opcoes = list(Opcao.objects.filter(enquete_id__in=ids).values_list('id', flat=True))
+            for modelo, campo in dependentes_das_opcoes():
+                apagar_direto(modelo, campo, ids_opcoes)
+            for modelo, campo in dependentes_das_enquetes():
+                apagar_direto(modelo, campo, ids)
+            opcoes = apagar_direto(Opcao, 'id', ids_opcoes)
+            enquetes = apagar_direto(Enquete, 'id', ids)
+
+        self.registrar_lote(execucao, inicio, votos=votos, opcoes=opcoes, enquetes=enquetes)
+
+    def registrar_lote(self, execucao, inicio, votos=0, opcoes=0, enquetes=0):
+        lote = {
+            'enquetes': enquetes,
+            'opcoes': opcoes,
+            'votos': votos,
+            'segundos': round(time.monotonic() - inicio, 4),
+        }
+        execucao.lotes.append(lote)
+        execucao.enquetes_removidas += enquetes
+        execucao.opcoes_removidas += opcoes
+        execucao.votos_removidos += votos
+        execucao.atualizada_em = timezone.now()
+        execucao.save(update_fields=[
+            'lotes', 'enquetes_removidas', 'opcoes_removidas', 'votos_removidos', 'atualizada_em'
+        ])
+        logger.info('Expurgo %s: lote %s', execucao.pk, lote)
+
+
+def _limite_de_abandono():
+    """Execuções em andamento paradas desde antes disto (o dobro do orçamento) foram abandonadas."""
+    return timezone.now() - timedelta(seconds=2 * settings.ENQUETE_EXPURGO_ORCAMENTO)
+
+
+def execucao_em_andamento():
+    """
+    Execução ainda marcada como em andamento e com progresso recente. Uma
+    marcada como em andamento, mas parada há mais que o dobro do orçamento,
+    é considerada abandonada (processo encerrado no meio).
+    """
+    return ExecucaoExpurgo.objects.filter(
+        status=ExecucaoExpurgo.EXECUTANDO, atualizada_em__gte=_limite_de_abandono()
+    ).first()
+
+
+def execucao_para_retomar():
+    """A execução mais recente que não terminou: interrompida, com falha ou abandonada."""
+    return ExecucaoExpurgo.objects.filter(
+        Q(status__in=[ExecucaoExpurgo.INTERROMPIDA, ExecucaoExpurgo.FALHOU])
+        | Q(status=ExecucaoExpurgo.EXECUTANDO, atualizada_em__lt=_limite_de_abandono())
+    ).first()
+
+
+def _travar_execucoes():
+    """
+    Trava a tabela de execuções até o fim da transação: duas chamadas
+    simultâneas não passam juntas da verificação. O modo só conflita com ele
+    mesmo e com escritas, então a leitura do progresso não espera. No SQLite
+    (de desenvolvimento) as transações ``IMMEDIATE`` já se enfileiram.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'LOCK TABLE {connection.ops.quote_name(ExecucaoExpurgo._meta.db_table)} IN SHARE ROW EXCLUSIVE MODE'
+            )
+
+
+def iniciar_execucao(retomar=False):
+    """
+    Reserva a execução que vai rodar: ``(execucao, iniciada)``. Com outra em
+    andamento, retorna ela (``iniciada`` falso). Com ``retomar``, reabre a
+    de ``execucao_para_retomar``, se houver, em vez de criar uma nova.
+    """
+    with transaction.atomic():
+        _travar_execucoes()
+        andamento = execucao_em_andamento()
+        if andamento:
+            return andamento, False
+
+        execucao = execucao_para_retomar() if retomar else None
+        if execucao is None:
+            return ExecucaoExpurgo.objects.create(corte=timezone.now()), True
+        execucao.status = ExecucaoExpurgo.EXECUTANDO
+        execucao.erro = ''
+        execucao.finalizada_em = None
+        execucao.atualizada_em = timezone.now()
+        execucao.save(update_fields=['status', 'erro', 'finalizada_em', 'atualizada_em'])
+        return execucao, True
+
+
+def disparar_em_segundo_plano():
+    """
+    Inicia o expurgo em uma thread, com o orçamento padrão. Retorna
+    ``(execucao, iniciada)``: a execução criada, ou a que já estava em
+    andamento (``iniciada`` falso).
+    """
+    execucao, iniciada = iniciar_execucao()
+    if not iniciada:
+        return execucao, False
+
+    motor = MotorExpurgo(orcamento_segundos=settings.ENQUETE_EXPURGO_ORCAMENTO)
+
+    def executar():
+        close_old_connections()
+        try:
+            motor.executar(execucao)
+        except Exception:
+            pass  # Já registrado na execução e no log
+        finally:
+            connection.close()
+
+    threading.Thread(target=executar, name='expurgo-enquetes', daemon=True).start()
+    return execucao, True
@@ -0,0 +1,23 @@
+"""
+Filtros da lista de enquetes (``DjangoFilterBackend``).
+"""
+import django_filters
+from django.utils import timezone
+
+from .models import STATUS_ENQUETE, Enquete, filtro_status
+
+
+class EnqueteFilter(django_filters.FilterSet):
+    # O status não é coluna: vira faixas sobre expires_at/delete_at, ambas indexadas
+    status = django_filters.ChoiceFilter(
+        choices=[(status, status) for status in STATUS_ENQUETE],
+        method='filtrar_status',
+        help_text="Apenas enquetes neste status: 'Aberta', 'Encerrada' ou 'Para Deletar'."
+    )
+
+    class Meta:
+        model = Enquete
+        fields = ['status']
+
+    def filtrar_status(self, queryset, name, value):
+        return queryset.filter(filtro_status(value, timezone.now()))
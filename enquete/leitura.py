@@ -0,0 +1,133 @@
+"""
+Caminho rápido de leitura das enquetes (``list`` e ``retrieve``).
+
+Com a base aquecida, o custo de CPU das leituras está nos campos do
+``EnqueteSerializer``/``OpcaoSerializer``, não no banco. Aqui os payloads
+são montados direto de duas consultas ``values_list`` (enquetes e opções
+com o total dos slots), agrupadas em uma passada, com o status calculado
+contra um único ``agora`` e as datas convertidas para um fuso resolvido uma
+vez, no mesmo formato ISO 8601 do ``DateTimeField`` do DRF (com outro
+``DATETIME_FORMAT``, é o próprio campo do DRF que formata). O payload é
+idêntico ao do serializer, chave a chave.
+
+``RenderizadorJSON`` gera o JSON com ``orjson``, quando instalado, e sai
+byte a byte igual ao ``JSONRenderer`` do DRF na saída compacta; sem o
+pacote, é o próprio ``JSONRenderer``. O ``benchmark_serializacao`` compara
+os dois caminhos e confere que a saída é a mesma.
+"""
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+from .contadores import opcoes_com_total
+from .models import Enquete, calcular_status
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NAO_ENCONTRADA = f'No {Enquete._meta.object_name} matches the given query.'
+CAMPOS_ENQUETE = ('id', 'titulo', 'data_criacao', 'expires_at', 'delete_at', 'versao', 'atualizada_em')
+
+_DATA = serializers.DateTimeField()
+_CODIFICADOR = encoders.JSONEncoder()
+
+
+def consultas(ids):
+    """Querysets (ainda não avaliados) das linhas das enquetes ``ids`` e das suas opções."""
+    enquetes = Enquete.objects.filter(id__in=ids).values_list(*CAMPOS_ENQUETE, named=True)
+    opcoes = opcoes_com_total().filter(enquete_id__in=ids).values_list(
+        'enquete_id', 'id', 'texto_opcao', 'votos', 'votos_pendentes'
+    )
+    return enquetes, opcoes
+
+
+def formatador_de_datas():
+    """Formata datas como o ``DateTimeField`` do DRF, com o fuso atual lido uma só vez."""
+    formato = api_settings.DATETIME_FORMAT
+    if not settings.USE_TZ or formato is None or formato.lower() != ISO_8601:
+        return _DATA.to_representation
+    fuso = timezone.get_current_timezone()
+
+    def formatar(valor):
+        texto = valor.astimezone(fuso).isoformat()
+        return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+    return formatar
+
+
+def montar_payloads(enquetes, opcoes, agora=None):
+    """Payloads no formato do ``EnqueteSerializer``, na ordem de ``enquetes``."""
+    agora = agora or timezone.now()
+    data = formatador_de_datas()
+
+    opcoes_por_enquete = {}
+    for id_enquete, id_opcao, texto_opcao, votos, pendentes in opcoes:
+        opcoes_por_enquete.setdefault(id_enquete, []).append(
+            {'id': id_opcao, 'texto_opcao': texto_opcao, 'votos': votos + pendentes}
+        )
+
+    return [
+        {
+            'id': enquete.id,
+            'titulo': enquete.titulo,
+            'data_criacao': data(enquete.data_criacao),
+            'expires_at': data(enquete.expires_at),
+            'delete_at': data(enquete.delete_at) if enquete.delete_at else None,
+            'status': calcular_status(enquete.expires_at, enquete.delete_at, agora),
+            'opcoes': opcoes_por_enquete.get(enquete.id, []),
+        }
+        for enquete in enquetes
+    ]
+
+
+def _na_ordem(ids, enquetes):
+    por_id = {enquete.id: enquete for enquete in enquetes}
+    return [por_id[i] for i in ids if i in por_id]
+
+
+def ler_enquetes(ids):
+    """
+    ``(linhas, payloads)`` das enquetes ``ids``, na mesma ordem (as ausentes
+    ficam de fora). As linhas (com ``id``, ``expires_at`` e ``delete_at``)
+    servem para o cache calcular a validade de cada payload.
+    """
+    enquetes, opcoes = consultas(ids)
+    linhas = _na_ordem(ids, enquetes)
+    if not linhas:
+        return [], []
+    return linhas, montar_payloads(linhas, opcoes)
+
+
+async def aler_enquetes(ids):
+    enquetes, opcoes = consultas(ids)
+    linhas = _na_ordem(ids, [enquete async for enquete in enquetes])
+    if not linhas:
+        return [], []
+    return linhas, montar_payloads(linhas, [opcao async for opcao in opcoes])
+
+
+def _padrao(objeto):
+    # Datas, decimais, textos traduzíveis etc. saem como no encoder do DRF
+    return _CODIFICADOR.default(objeto)
+
+
+class RenderizadorJSON(JSONRenderer):
+    """``JSONRenderer`` com orjson na saída compacta, a padrão; indentada fica com o DRF."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data, default=_padrao,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+        # Como o DRF: U+2028 e U+2029 escapados, para o JSON valer como literal JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
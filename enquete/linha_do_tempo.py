@@ -0,0 +1,157 @@
+"""
+Linha do tempo dos votos: votos de cada opção por minuto ou por hora.
+
+Os votos são somados em ``VotosPorIntervalo`` (uma linha por opção e minuto,
+em UTC) por um processamento incremental: ``atualizar_intervalos`` lê os
+votos com ``id`` acima da marca d'água, soma por intervalo e avança a marca,
+tudo na mesma transação e com a marca travada. Fica fora do caminho do voto
+e roda pelo comando ``atualizar_linha_do_tempo`` (agendado) ou antes do
+arquivamento, que apaga os votos individuais.
+
+A marca só passa de votos com mais de ``ENQUETE_INTERVALOS_ATRASO``
+segundos e espera nas lacunas de ids (transações ainda abertas, ou
+desfeitas) por até ``ENQUETE_MARCA_LACUNA_VALIDADE`` segundos: um voto que
+aparece nesse prazo, por exemplo um que esperou a trava de uma opção
+concorrida, ainda está acima da marca e é incorporado; um que demore mais
+fica de fora dos intervalos. A leitura soma os intervalos já incorporados
+com a cauda de votos acima da marca, agregada no banco, então a linha do
+tempo está sempre em dia, e a cauda é limitada pela frequência do
+processamento e por esse prazo, não pelo total de votos.
+"""
+from datetime import timedelta, timezone as fuso
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import MarcaDagua, Voto, VotosPorIntervalo
+
+MARCA = 'votos_por_intervalo'
+RESOLUCOES = {'minuto': timedelta(minutes=1), 'hora': timedelta(hours=1)}
+RESOLUCOES_SQL = {'minuto': 'minute', 'hora': 'hour'}
+
+
+def inicio_do_intervalo(instante, resolucao='minuto'):
+    """Início, em UTC, do intervalo de ``resolucao`` que contém ``instante``."""
+    instante = instante.astimezone(fuso.utc).replace(second=0, microsecond=0)
+    if resolucao == 'hora':
+        return instante.replace(minute=0)
+    return instante
+
+
+def incorporar(votos):
+    """
+    Soma ``(id_enquete, id_opcao, data_voto)`` em ``VotosPorIntervalo``: os
+    intervalos existentes com um ``bulk_update``, os novos com um ``bulk_create``.
+    Chame com a marca travada, para que ninguém altere os mesmos intervalos.
+    """
+    contagens = {}
+    for id_enquete, id_opcao, data_voto in votos:
+        chave = (id_enquete, id_opcao, inicio_do_intervalo(data_voto))
+        contagens[chave] = contagens.get(chave, 0) + 1
+    if not contagens:
+        return
+
+    existentes = {
+        (intervalo.opcao_id, intervalo.inicio): intervalo
+        for intervalo in VotosPorIntervalo.objects.filter(
+            opcao_id__in={id_opcao for _, id_opcao, _ in contagens},
+            inicio__in={inicio for _, _, inicio in contagens}
+        )
+    }
+    alterados, novos = [], []
+    for (id_enquete, id_opcao, inicio), quantidade in contagens.items():
+        intervalo = existentes.get((id_opcao, inicio))
+        if intervalo is None:
+            novos.append(VotosPorIntervalo(
+                enquete_id=id_enquete, opcao_id=id_opcao, inicio=inicio, votos=quantidade
+            ))
+        else:
+            intervalo.votos += quantidade
+            alterados.append(intervalo)
+
+    VotosPorIntervalo.objects.bulk_update(alterados, ['votos'])
+    VotosPorIntervalo.objects.bulk_create(novos)
+
+
+def atualizar_intervalos(lote=None, atraso=None):
+    """
+    Incorpora os votos acima da marca d'água, ``lote`` por transação, até
+    alcançar os votos mais novos que ``atraso`` segundos. Retorna quantos votos
+    foram incorporados.
+    """
+    lote = lote or settings.ENQUETE_INTERVALOS_LOTE
+    atraso = settings.ENQUETE_INTERVALOS_ATRASO if atraso is None else atraso
+
+    total = 0
+    while True:
+        corte = timezone.now() - timedelta(seconds=atraso)
+        with transaction.atomic():
+            marca = MarcaDagua.travar(MARCA)
+            votos = list(
+                Voto.objects.filter(id__gt=marca.ultimo_id).order_by('id')
+                .values_list('id', 'enquete_id', 'opcao_escolhida_id', 'data_voto')[:lote]
+            )
+            # Para no primeiro voto recente demais: os ids abaixo dele que ainda
+            # não apareceram estão em transações que podem terminar logo
+            prontos = []
+            for voto in votos:
+                if voto[3] > corte:
+                    break
+                prontos.append(voto)
+
+            passados = 0
+            if prontos:
+                passados = marca.avancar([voto[0] for voto in prontos])
+                incorporar(voto[1:] for voto in prontos[:passados])
+                marca.save(update_fields=['ultimo_id', 'lacunas_ate', 'lacunas_desde', 'atualizada_em'])
+
+        total += passados
+        if passados < lote:
+            return total
+
+
+def linha_do_tempo(id_enquete, inicio, fim, resolucao='minuto'):
+    """
+    Intervalos da enquete entre ``inicio`` (alinhado ao começo do seu
+    intervalo) e ``fim`` (exclusivo), em ordem: ``{'inicio', 'total', 'votos'}``,
+    com ``votos`` por id de opção. Soma os intervalos já incorporados com os
+    votos acima da marca d'água, os dois agregados no banco por intervalo e
+    opção; intervalos sem votos ficam de fora.
+    """
+    inicio = inicio_do_intervalo(inicio, resolucao)
+    marca = MarcaDagua.objects.filter(nome=MARCA).first() or MarcaDagua(nome=MARCA)
+    tipo = RESOLUCOES_SQL[resolucao]
+
+    # Um processamento que termine entre as leituras pode contar uma fatia
+    # duas vezes nesta resposta; a próxima leitura já sai certa
+    incorporados = (
+        VotosPorIntervalo.objects.filter(enquete_id=id_enquete, inicio__gte=inicio, inicio__lt=fim)
+        .annotate(intervalo=Trunc('inicio', tipo, tzinfo=fuso.utc))
+        .values('intervalo', 'opcao_id')
+        .annotate(votos=Sum('votos'))
+        .values_list('intervalo', 'opcao_id', 'votos')
+        .order_by()
+    )
+    cauda = (
+        Voto.objects.filter(
+            id__gt=marca.ultimo_id, enquete_id=id_enquete, data_voto__gte=inicio, data_voto__lt=fim
+        )
+        .annotate(intervalo=Trunc('data_voto', tipo, tzinfo=fuso.utc))
+        .values('intervalo', 'opcao_escolhida_id')
+        .annotate(votos=Count('id'))
+        .values_list('intervalo', 'opcao_escolhida_id', 'votos')
+        .order_by()
+    )
+
+    por_intervalo = {}
+    for instante, id_opcao, votos in [*incorporados, *cauda]:
+        votos_da_opcao = por_intervalo.setdefault(instante, {})
+        votos_da_opcao[id_opcao] = votos_da_opcao.get(id_opcao, 0) + votos
+
+    return [
+        {'inicio': instante, 'total': sum(votos.values()), 'votos': votos}
+        for instante, votos in sorted(por_intervalo.items())
+    ]
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from enquete.arquivamento import arquivar_enquete, enquetes_para_arquivar
+
+
+class Command(BaseCommand):
+    """
+    Move os votos individuais das enquetes encerradas para o arquivo compacto,
+    congelando os totais por opção, e relata o que foi liberado da tabela de votos.
+    """
+    help = 'Arquiva os votos das enquetes encerradas e relata linhas e bytes liberados.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=None,
+                            help='Quantidade máxima de enquetes arquivadas nesta execução.')
+
+    def handle(self, *args, **options):
+        ids = enquetes_para_arquivar().values_list('id', flat=True)
+        if options['limite']:
+            ids = ids[:options['limite']]
+
+        enquetes = linhas = liberados = arquivo = 0
+        for id_enquete in list(ids):
+            resultado = arquivar_enquete(id_enquete)
+            if resultado is None:
+                continue
+
+            enquetes += 1
+            linhas += resultado.total_votos
+            liberados += resultado.bytes_liberados
+            arquivo += len(resultado.conteudo)
+            self.stdout.write(
+                f'Enquete {id_enquete}: {resultado.total_votos} votos, '
+                f'{filesizeformat(resultado.bytes_liberados)} liberados, '
+                f'arquivo de {filesizeformat(len(resultado.conteudo))}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {enquetes} enquetes arquivadas: {linhas} linhas removidas de votos, '
+            f'{filesizeformat(liberados)} liberados, {filesizeformat(arquivo)} em arquivo.'
+        ))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from enquete.linha_do_tempo import atualizar_intervalos
+
+
+class Command(BaseCommand):
+    """
+    Incorpora os votos novos em ``VotosPorIntervalo`` a partir da marca
+    d'água. Agende com a frequência desejada: a linha do tempo já soma os
+    votos ainda não incorporados, então a frequência só define o tamanho
+    dessa cauda lida a cada consulta.
+    """
+    help = 'Incorpora os votos novos na linha do tempo (votos por minuto de cada opção).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=None, help='Votos incorporados por transação.')
+        parser.add_argument('--atraso', type=int, default=None,
+                            help='Idade mínima (segundos) de um voto para ser incorporado.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        votos = atualizar_intervalos(lote=options['lote'], atraso=options['atraso'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {votos} votos incorporados à linha do tempo em {time.perf_counter() - inicio:.1f}s.'
+        ))
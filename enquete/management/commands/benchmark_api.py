@@ -0,0 +1,384 @@
+import asyncio
+import http.client
+import json
+import math
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from enquete.metricas import medir_consultas
+from enquete.models import Enquete, ExecucaoExpurgo, Opcao, Voto
+
+CENARIOS = ('lista', 'detalhe', 'voto', 'limpar')
+
+
+def percentil(ordenadas, p):
+    """Percentil pelo método do posto mais próximo, sobre uma lista já ordenada."""
+    if not ordenadas:
+        return 0.0
+    return ordenadas[max(0, math.ceil(p / 100 * len(ordenadas)) - 1)]
+
+
+class ClienteHTTP:
+    """Cliente de um servidor de verdade, com a mesma interface do ``Client`` e a conexão mantida."""
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        self.conexao = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=60)
+
+    def requisitar(self, metodo, caminho, corpo=None, content_type=None):
+        self.conexao.request(metodo, caminho, body=corpo, headers={'Content-Type': content_type} if corpo else {})
+        resposta = self.conexao.getresponse()
+        resposta.read()
+        return SimpleNamespace(status_code=resposta.status)
+
+    def get(self, caminho):
+        return self.requisitar('GET', caminho)
+
+    def post(self, caminho, corpo, content_type):
+        return self.requisitar('POST', caminho, corpo, content_type)
+
+    def delete(self, caminho):
+        return self.requisitar('DELETE', caminho)
+
+
+class Command(BaseCommand):
+    """
+    Benchmark dos endpoints da API com clientes simultâneos.
+
+    Cada cliente é uma thread com seu próprio ``django.test.Client`` e sua
+    própria conexão com o banco configurado (SQLite ou PostgreSQL): mede-se a
+    aplicação e o banco, sem a rede. Os alvos de ``detalhe`` e ``voto`` são
+    sorteados com viés para as enquetes abertas mais votadas, como em
+    produção. Popule o banco antes com ``gerar_dados_sinteticos``.
+
+    Com ``--interface asgi`` os clientes são corrotinas com ``AsyncClient``
+    em um único event loop, atendidas pelas views assíncronas (requer
+    ``ENQUETE_VIEWS_ASSINCRONAS=1``): compara, em um processo, quantas
+    requisições simultâneas cada interface sustenta.
+
+    Com ``--url``, os clientes (threads) fazem requisições HTTP de verdade a
+    um servidor já no ar sobre o mesmo banco, por exemplo um worker do
+    uvicorn (``--interface asgi``) contra um do gunicorn (``--interface
+    wsgi``): aí entram o servidor, os middlewares e a adaptação entre
+    síncrono e assíncrono, mas as consultas por requisição não são contadas.
+
+    O cenário ``voto`` grava votos e o ``limpar`` expurga as enquetes
+    vencidas, então rode sobre uma massa descartável. Cada execução é
+    acrescentada ao arquivo de resultados e comparada com a anterior do
+    mesmo banco e parâmetros, e com a última da outra interface.
+    """
+    help = 'Mede latência (p50/p99), vazão e consultas por requisição dos endpoints da API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cenarios', nargs='+', choices=CENARIOS, default=list(CENARIOS),
+                            help='Cenários a executar, nesta ordem (limpar roda sempre por último).')
+        parser.add_argument('--interface', choices=('wsgi', 'asgi'), default='wsgi',
+                            help='wsgi: clientes em threads; asgi: corrotinas em um event loop.')
+        parser.add_argument('--url', default='',
+                            help='Servidor já no ar (ex.: http://127.0.0.1:8000); --interface só o identifica.')
+        parser.add_argument('--clientes', type=int, default=8, help='Clientes simultâneos.')
+        parser.add_argument('--requisicoes', type=int, default=500, help='Requisições por cenário.')
+        parser.add_argument('--aquecimento', type=int, default=20,
+                            help='Requisições iniciais de cada cenário que não entram na medição.')
+        parser.add_argument('--lista-parametros', default='',
+                            help="Query string do cenário lista (ex.: 'limit=20' ou 'paginacao=cursor').")
+        parser.add_argument('--alvos', type=int, default=100,
+                            help='Enquetes abertas mais votadas sorteadas em detalhe e voto.')
+        parser.add_argument('--saida', default=str(settings.BASE_DIR / 'benchmarks' / 'resultados.jsonl'),
+                            help='Arquivo JSON Lines onde os resultados são acumulados.')
+        parser.add_argument('--rotulo', default='', help='Identificação livre da execução (ex.: commit).')
+        parser.add_argument('--tolerancia', type=float, default=10.0,
+                            help='Piora percentual, em relação à execução anterior, sinalizada como regressão.')
+        parser.add_argument('--semente', type=int, default=None, help='Semente do sorteio dos alvos.')
+
+    def handle(self, *args, **options):
+        self.interface = options['interface']
+        self.url = options['url']
+        if not self.url and (self.interface == 'asgi') != settings.ENQUETE_VIEWS_ASSINCRONAS:
+            raise CommandError(
+                'Use ENQUETE_VIEWS_ASSINCRONAS=1 com --interface asgi e ENQUETE_VIEWS_ASSINCRONAS=0 com wsgi.'
+            )
+        self.rng = random.Random(options['semente'])
+        self.lista_parametros = options['lista_parametros']
+        self.alvos, self.pesos, self.opcoes = self.carregar_alvos(options['alvos'])
+        cenarios = sorted(set(options['cenarios']), key=CENARIOS.index)
+        if self.alvos is None and {'detalhe', 'voto'} & set(cenarios):
+            raise CommandError('Nenhuma enquete aberta com opções. Rode gerar_dados_sinteticos antes.')
+
+        resultado = {
+            'quando': timezone.now().isoformat(),
+            'rotulo': options['rotulo'],
+            'banco': connection.vendor,
+            'parametros': {
+                chave: options[chave]
+                for chave in ('interface', 'clientes', 'requisicoes', 'aquecimento', 'alvos', 'lista_parametros')
+            },
+            'volume': {'enquetes': Enquete.objects.count(), 'votos': Voto.objects.count()},
+            'cenarios': {},
+        }
+        if self.url:
+            # Só se compara com execuções também feitas contra um servidor
+            resultado['parametros']['servidor'] = True
+        self.stdout.write(
+            f"Banco {resultado['banco']}: {resultado['volume']['enquetes']} enquetes, "
+            f"{resultado['volume']['votos']} votos."
+        )
+
+        # Os clientes de teste sempre enviam o host "testserver"
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for nome in cenarios:
+                if nome == 'limpar':
+                    metricas = self.cenario_limpar()
+                else:
+                    executar = self.executar_cenario_asgi if self.usa_asyncio() else self.executar_cenario
+                    metricas = executar(
+                        getattr(self, f'requisicao_{nome}'),
+                        options['requisicoes'], options['clientes'], options['aquecimento']
+                    )
+                resultado['cenarios'][nome] = metricas
+                self.stdout.write(self.formatar(nome, metricas))
+
+        anterior = self.execucao_anterior(options['saida'], resultado['banco'], resultado['parametros'])
+        outra_interface = self.execucao_anterior(options['saida'], resultado['banco'], {
+            **resultado['parametros'], 'interface': 'wsgi' if self.interface == 'asgi' else 'asgi'
+        })
+        self.salvar(options['saida'], resultado)
+        if anterior:
+            self.comparar(anterior, resultado, options['tolerancia'])
+        if outra_interface:
+            self.comparar(outra_interface, resultado, options['tolerancia'])
+        self.stdout.write(self.style.SUCCESS(f"✅ Resultados gravados em {options['saida']}."))
+
+    def carregar_alvos(self, quantidade):
+        ids = list(
+            Enquete.objects.filter(expires_at__gt=timezone.now(), opcoes__isnull=False)
+            .annotate(total=Sum('opcoes__votos'))
+            .order_by('-total', 'id')
+            .values_list('id', flat=True)[:quantidade]
+        )
+        if not ids:
+            return None, None, None
+
+        opcoes = {}
+        for id_opcao, id_enquete in Opcao.objects.filter(enquete_id__in=ids).values_list('id', 'enquete_id'):
+            opcoes.setdefault(id_enquete, []).append(id_opcao)
+        # Zipf sobre o ranking de votos: as mais votadas recebem mais tráfego
+        return ids, [1 / posicao for posicao in range(1, len(ids) + 1)], opcoes
+
+    def sortear_enquete(self):
+        return self.rng.choices(self.alvos, weights=self.pesos)[0]
+
+    def requisicao_lista(self):
+        url = reverse('enquete:enquete-list')
+        if self.lista_parametros:
+            url = f'{url}?{self.lista_parametros}'
+        return 'get', url, None
+
+    def requisicao_detalhe(self):
+        return 'get', reverse('enquete:enquete-detail', args=[self.sortear_enquete()]), None
+
+    def requisicao_voto(self):
+        id_enquete = self.sortear_enquete()
+        dados = {
+            'id_opcao': self.rng.choice(self.opcoes[id_enquete]),
+            'id_participante': f'benchmark_{uuid.uuid4().hex}',
+        }
+        return 'post', reverse('enquete:enquete-votar', args=[id_enquete]), dados
+
+    def usa_asyncio(self):
+        return self.interface == 'asgi' and not self.url
+
+    def criar_cliente(self):
+        if self.url:
+            return ClienteHTTP(self.url)
+        return AsyncClient() if self.interface == 'asgi' else Client()
+
+    @staticmethod
+    def medir(cliente, metodo, url, dados):
+        """Retorna ``(segundos, consultas, status)`` de uma requisição."""
+        with medir_consultas() as medicao:
+            inicio = time.perf_counter()
+            if dados is None:
+                resposta = getattr(cliente, metodo)(url)
+            else:
+                resposta = getattr(cliente, metodo)(url, json.dumps(dados), content_type='application/json')
+            duracao = time.perf_counter() - inicio
+        return duracao, medicao.consultas, resposta.status_code
+
+    @staticmethod
+    async def amedir(cliente, metodo, url, dados):
+        with medir_consultas() as medicao:
+            inicio = time.perf_counter()
+            if dados is None:
+                resposta = await getattr(cliente, metodo)(url)
+            else:
+                resposta = await getattr(cliente, metodo)(
+                    url, json.dumps(dados), content_type='application/json'
+                )
+            duracao = time.perf_counter() - inicio
+        return duracao, medicao.consultas, resposta.status_code
+
+    def executar_cenario(self, gerar_requisicao, total, clientes, aquecimento):
+        cliente = self.criar_cliente()
+        for _ in range(aquecimento):
+            self.medir(cliente, *gerar_requisicao())
+
+        # Requisições sorteadas antes, para o sorteio não entrar na medição
+        requisicoes = [gerar_requisicao() for _ in range(total)]
+        amostras = []
+        lock = threading.Lock()
+
+        def trabalhar(fatia):
+            cliente = self.criar_cliente()
+            medidas = []
+            try:
+                for requisicao in fatia:
+                    medidas.append(self.medir(cliente, *requisicao))
+            finally:
+                connection.close()
+            with lock:
+                amostras.extend(medidas)
+
+        threads = [
+            threading.Thread(target=trabalhar, args=(requisicoes[indice::clientes],))
+            for indice in range(clientes)
+        ]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.metricas(amostras, time.perf_counter() - inicio)
+
+    def executar_cenario_asgi(self, gerar_requisicao, total, clientes, aquecimento):
+        async def executar():
+            cliente = self.criar_cliente()
+            for _ in range(aquecimento):
+                await self.amedir(cliente, *gerar_requisicao())
+
+            requisicoes = [gerar_requisicao() for _ in range(total)]
+            amostras = []
+
+            async def trabalhar(fatia):
+                cliente = self.criar_cliente()
+                for requisicao in fatia:
+                    amostras.append(await self.amedir(cliente, *requisicao))
+
+            inicio = time.perf_counter()
+            await asyncio.gather(*(trabalhar(requisicoes[indice::clientes]) for indice in range(clientes)))
+            return self.metricas(amostras, time.perf_counter() - inicio)
+
+        return asyncio.run(executar())
+
+    def cenario_limpar(self):
+        """
+        Uma requisição DELETE (o expurgo roda em segundo plano) e a espera
+        até a execução disparada terminar, para medir também o expurgo.
+        """
+        requisicao = ('delete', reverse('enquete:enquete-limpar-enquetes-expiradas'), None)
+        if self.usa_asyncio():
+            amostra = asyncio.run(self.amedir(self.criar_cliente(), *requisicao))
+        else:
+            amostra = self.medir(self.criar_cliente(), *requisicao)
+        execucao = ExecucaoExpurgo.objects.first()
+        while execucao and execucao.status == ExecucaoExpurgo.EXECUTANDO:
+            time.sleep(0.2)
+            execucao.refresh_from_db()
+
+        metricas = self.metricas([amostra], amostra[0])
+        if execucao:
+            metricas['expurgo'] = {
+                'status': execucao.status,
+                'segundos': round((execucao.finalizada_em - execucao.iniciada_em).total_seconds(), 3),
+                'enquetes': execucao.enquetes_removidas,
+                'votos': execucao.votos_removidos,
+            }
+        return metricas
+
+    @staticmethod
+    def metricas(amostras, duracao):
+        latencias = sorted(segundos * 1000 for segundos, _, _ in amostras)
+        status = Counter(str(codigo) for _, _, codigo in amostras)
+        return {
+            'requisicoes': len(amostras),
+            'erros': sum(n for codigo, n in status.items() if int(codigo) >= 500),
+            'status': dict(status),
+            'p50_ms': round(percentil(latencias, 50), 3),
+            'p99_ms': round(percentil(latencias, 99), 3),
+            'media_ms': round(statistics.fmean(latencias), 3) if latencias else 0.0,
+            'vazao_rps': round(len(amostras) / duracao, 1) if duracao else 0.0,
+            'consultas_por_requisicao': round(
+                statistics.fmean(consultas for _, consultas, _ in amostras), 2
+            ) if amostras else 0.0,
+        }
+
+    @staticmethod
+    def formatar(nome, metricas):
+        linha = (
+            f"{nome:<8} req={metricas['requisicoes']:<6} p50={metricas['p50_ms']:8.2f}ms  "
+            f"p99={metricas['p99_ms']:8.2f}ms  req/s={metricas['vazao_rps']:8.1f}  "
+            f"consultas/req={metricas['consultas_por_requisicao']:5.1f}  status={metricas['status']}"
+        )
+        if 'expurgo' in metricas:
+            expurgo = metricas['expurgo']
+            linha += (
+                f"\n         expurgo {expurgo['status']}: {expurgo['enquetes']} enquetes, "
+                f"{expurgo['votos']} votos em {expurgo['segundos']}s"
+            )
+        return linha
+
+    @staticmethod
+    def execucao_anterior(caminho, banco, parametros):
+        """Última execução registrada com o mesmo banco e os mesmos parâmetros."""
+        try:
+            with open(caminho, encoding='utf-8') as arquivo:
+                execucoes = [json.loads(linha) for linha in arquivo if linha.strip()]
+        except FileNotFoundError:
+            return None
+        return next((
+            execucao for execucao in reversed(execucoes)
+            if execucao.get('banco') == banco and execucao.get('parametros') == parametros
+        ), None)
+
+    @staticmethod
+    def salvar(caminho, resultado):
+        Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+        with open(caminho, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+
+    def comparar(self, anterior, atual, tolerancia):
+        self.stdout.write(
+            f"Comparação com {anterior['parametros']['interface']} em {anterior['quando']} "
+            f"{anterior.get('rotulo') or ''}".rstrip() + ':'
+        )
+        for nome, metricas in atual['cenarios'].items():
+            antes = anterior['cenarios'].get(nome)
+            if not antes:
+                continue
+            partes = []
+            regressao = False
+            # Para latência, subir é piorar; para vazão, cair é piorar
+            for chave, pior_se_maior in (('p50_ms', True), ('p99_ms', True), ('vazao_rps', False)):
+                if not antes[chave]:
+                    continue
+                variacao = (metricas[chave] - antes[chave]) / antes[chave] * 100
+                partes.append(f'{chave} {variacao:+.1f}%')
+                if (variacao if pior_se_maior else -variacao) > tolerancia:
+                    regressao = True
+            linha = f"  {nome:<8} {'  '.join(partes)}"
+            self.stdout.write(self.style.WARNING(linha + '  ⚠️ regressão') if regressao else linha)
@@ -0,0 +1,68 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from enquete.contadores import consolidar_contadores
+from enquete.models import Enquete, Opcao
+from enquete.votacao import registrar_voto
+
+
+class Command(BaseCommand):
+    """
+    Compara a contenção do contador de votos com um slot e com vários slots.
+
+    Todos os votos vão para a mesma opção (o pior caso de uma "opção quente").
+    Cria uma enquete temporária no banco configurado e a remove ao final.
+    """
+    help = 'Mede a vazão de votos simultâneos na mesma opção para diferentes quantidades de slots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, nargs='+', default=[1, 16],
+                            help='Quantidades de slots a comparar.')
+        parser.add_argument('--votos', type=int, default=2000, help='Votos por rodada.')
+        parser.add_argument('--threads', type=int, default=16, help='Votantes simultâneos.')
+
+    def handle(self, *args, **options):
+        for slots in options['slots']:
+            self.rodada(slots, options['votos'], options['threads'])
+
+    def rodada(self, slots, total_votos, threads):
+        agora = timezone.now()
+        enquete = Enquete.objects.create(
+            titulo=f'Benchmark de contadores ({slots} slots)',
+            expires_at=agora + timedelta(hours=1),
+            delete_at=agora + timedelta(hours=1),
+            slots_contador=slots
+        )
+        opcao = Opcao.objects.create(enquete=enquete, texto_opcao='Quente')
+
+        def votar(i):
+            inicio = time.perf_counter()
+            try:
+                registrar_voto(enquete, id_opcao=opcao.id, id_participante=f'bench_{i}')
+            finally:
+                connection.close()
+            return time.perf_counter() - inicio
+
+        try:
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                latencias = sorted(executor.map(votar, range(total_votos)))
+            duracao = time.perf_counter() - inicio
+
+            consolidar_contadores([opcao.id])
+            opcao.refresh_from_db()
+        finally:
+            enquete.delete()
+
+        p50 = statistics.median(latencias) * 1000
+        p99 = latencias[int(len(latencias) * 0.99) - 1] * 1000
+        self.stdout.write(
+            f'slots={slots:<4} votos/s={total_votos / duracao:8.1f}  '
+            f'p50={p50:7.2f}ms  p99={p99:7.2f}ms  total_conferido={opcao.votos}'
+        )
@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from enquete import leitura
+from enquete.contadores import prefetch_opcoes
+from enquete.models import Enquete
+from enquete.serializers import EnqueteSerializer
+
+
+class Command(BaseCommand):
+    """
+    Compara a leitura das enquetes pelo ``EnqueteSerializer`` com o caminho
+    rápido de ``enquete.leitura``, nas mesmas enquetes do banco configurado.
+
+    Cada caminho é medido em três etapas (consultas, montagem dos payloads e
+    renderização do JSON), e os tempos saem normalizados por 1.000 enquetes.
+    Antes de medir, confere que os dois caminhos geram os mesmos bytes.
+    Popule o banco antes com ``gerar_dados_sinteticos``.
+    """
+    help = 'Mede o custo por 1.000 enquetes de serializar e renderizar pelo serializer e pelo caminho rápido.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enquetes', type=int, default=1000, help='Enquetes lidas por rodada.')
+        parser.add_argument('--repeticoes', type=int, default=7, help='Rodadas de cada caminho (vale a mediana).')
+
+    def handle(self, *args, **options):
+        ids = list(Enquete.objects.order_by('-id').values_list('id', flat=True)[:options['enquetes']])
+        if not ids:
+            raise CommandError('Nenhuma enquete no banco. Rode antes o gerar_dados_sinteticos.')
+
+        serializer, rapido = self.pelo_serializer(ids), self.pelo_caminho_rapido(ids)
+        if serializer[-1] != rapido[-1]:
+            raise CommandError('Os dois caminhos geraram JSON diferente.')
+
+        escala = 1000 / len(ids)
+        tempos = {}
+        for nome, medir in (('serializer', self.pelo_serializer), ('rapido', self.pelo_caminho_rapido)):
+            rodadas = [medir(ids)[:-1] for _ in range(options['repeticoes'])]
+            tempos[nome] = [statistics.median(etapa) * 1000 * escala for etapa in zip(*rodadas)]
+
+        codificador = 'orjson' if leitura.orjson else 'json (orjson não instalado)'
+        self.stdout.write(
+            f'{len(ids)} enquetes, mediana de {options["repeticoes"]} rodadas, JSON rápido com {codificador}.\n'
+            f'{"caminho":<12}{"consultas":>12}{"montagem":>12}{"render":>12}{"total":>12}   (ms por 1.000 enquetes)'
+        )
+        for nome, etapas in tempos.items():
+            colunas = ''.join(f'{valor:12.2f}' for valor in etapas + [sum(etapas)])
+            self.stdout.write(f'{nome:<12}{colunas}')
+
+        antes, depois = tempos['serializer'], tempos['rapido']
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Saída idêntica; montagem + render {(antes[1] + antes[2]) / (depois[1] + depois[2]):.1f}x '
+            f'e total {sum(antes) / sum(depois):.1f}x mais rápidos.'
+        ))
+
+    @staticmethod
+    def pelo_serializer(ids):
+        inicio = time.perf_counter()
+        por_id = Enquete.objects.prefetch_related(prefetch_opcoes()).in_bulk(ids)
+        enquetes = [por_id[i] for i in ids if i in por_id]
+        consultas = time.perf_counter()
+        dados = EnqueteSerializer(enquetes, many=True).data
+        montagem = time.perf_counter()
+        conteudo = JSONRenderer().render(dados)
+        fim = time.perf_counter()
+        return consultas - inicio, montagem - consultas, fim - montagem, conteudo
+
+    @staticmethod
+    def pelo_caminho_rapido(ids):
+        inicio = time.perf_counter()
+        enquetes, opcoes = leitura.consultas(ids)
+        por_id = {enquete.id: enquete for enquete in enquetes}
+        linhas = [por_id[i] for i in ids if i in por_id]
+        opcoes = list(opcoes)
+        consultas = time.perf_counter()
+        dados = leitura.montar_payloads(linhas, opcoes)
+        montagem = time.perf_counter()
+        conteudo = leitura.RenderizadorJSON().render(dados)
+        fim = time.perf_counter()
+        return consultas - inicio, montagem - consultas, fim - montagem, conteudo
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from enquete.contadores import consolidar_contadores
+
+
+class Command(BaseCommand):
+    help = 'Incorpora os slots dos contadores fragmentados em Opcao.votos.'
+
+    def handle(self, *args, **kwargs):
+        contagens = consolidar_contadores()
+        total = sum(contagens.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total} votos consolidados em {len(contagens)} opções.'
+        ))
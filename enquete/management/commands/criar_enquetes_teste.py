@@ -1,7 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from datetime import timedelta
-from enquete.models import Enquete, Opcao
+from enquete.serializers import EnqueteSerializer
 
 
 class Command(BaseCommand):
@@ -28,20 +27,17 @@ class Command(BaseCommand):
             },
         ]
 
-        for dados in enquetes:
-            expires_at = agora + timedelta(hours=dados["duracao_horas"])
-            delete_at = expires_at + timedelta(hours=72)
-
-            enquete = Enquete.objects.create(
-                titulo=dados["titulo"],
-                data_criacao=agora,
-                expires_at=expires_at,
-                delete_at=delete_at
-            )
-
-            for texto in dados["opcoes"]:
-                Opcao.objects.create(enquete=enquete, texto_opcao=texto)
-
+        criadas = EnqueteSerializer.criar_em_lote([
+            {
+                "titulo": dados["titulo"],
+                "data_criacao": agora,
+                "duracao_horas": dados["duracao_horas"],
+                "opcoes_input": dados["opcoes"],
+            }
+            for dados in enquetes
+        ])
+
+        for enquete in criadas:
             self.stdout.write(self.style.SUCCESS(f'✔️ Enquete criada: "{enquete.titulo}"'))
 
         self.stdout.write(self.style.SUCCESS("✅ Enquetes de teste criadas com sucesso."))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from enquete.expurgo import MotorExpurgo, iniciar_execucao
+from enquete.models import ExecucaoExpurgo
+
+
+class Command(BaseCommand):
+    """
+    Remove as enquetes cujo delete_at já passou, em lotes e com limite de tempo.
+    Feito para rodar agendado (cron); uma execução que não terminou
+    (interrompida pelo limite, com falha ou com o processo encerrado no meio)
+    pode ser retomada com --retomar. Não inicia com outra em andamento.
+    """
+    help = 'Expurga enquetes expiradas em lotes, com orçamento de tempo e progresso retomável.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orcamento', type=float, default=None,
+                            help='Tempo máximo de execução, em segundos. Padrão: sem limite.')
+        parser.add_argument('--tamanho-lote', type=int, default=None,
+                            help='Enquetes por lote.')
+        parser.add_argument('--tamanho-lote-votos', type=int, default=None,
+                            help='Votos apagados por transação.')
+        parser.add_argument('--retomar', action='store_true',
+                            help='Continua a última execução que não terminou, com o mesmo corte.')
+
+    def handle(self, *args, **options):
+        antes = timezone.now()
+        execucao, iniciada = iniciar_execucao(retomar=options['retomar'])
+        if not iniciada:
+            raise CommandError(f'Já existe um expurgo em andamento (execução {execucao.pk}).')
+        if options['retomar'] and execucao.iniciada_em >= antes:
+            self.stdout.write(self.style.WARNING('Nenhuma execução para retomar; iniciando uma nova.'))
+
+        motor = MotorExpurgo(
+            tamanho_lote=options['tamanho_lote'],
+            tamanho_lote_votos=options['tamanho_lote_votos'],
+            orcamento_segundos=options['orcamento']
+        )
+        inicio_lotes = len(execucao.lotes)
+        execucao = motor.executar(execucao)
+
+        for numero, lote in enumerate(execucao.lotes[inicio_lotes:], start=inicio_lotes + 1):
+            self.stdout.write(
+                f'Lote {numero}: {lote["enquetes"]} enquetes, {lote["opcoes"]} opções, '
+                f'{lote["votos"]} votos em {lote["segundos"]:.3f}s'
+            )
+
+        estilo = self.style.SUCCESS if execucao.status == ExecucaoExpurgo.CONCLUIDA else self.style.WARNING
+        self.stdout.write(estilo(
+            f'{execucao.get_status_display()}: {execucao.enquetes_removidas} enquetes, '
+            f'{execucao.opcoes_removidas} opções e {execucao.votos_removidos} votos removidos.'
+        ))
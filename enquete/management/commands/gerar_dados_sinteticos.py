@@ -0,0 +1,130 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from enquete.models import Enquete, Opcao, Voto
+
+
+class Command(BaseCommand):
+    """
+    Popula o banco com dados em escala de produção para testes de carga.
+
+    Os votos seguem uma distribuição de Zipf: poucas enquetes "quentes"
+    concentram a maior parte deles, e o mesmo vale para as opções dentro de
+    cada enquete. Os participantes vêm de um conjunto comum, então o mesmo
+    participante vota em várias enquetes (nunca duas vezes na mesma).
+    Tudo é inserido com bulk_create, em lotes.
+    """
+    help = 'Gera enquetes, opções e votos sintéticos em massa, com votos concentrados em poucas enquetes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enquetes', type=int, default=1000, help='Quantidade de enquetes.')
+        parser.add_argument('--opcoes', type=int, default=4, help='Opções por enquete.')
+        parser.add_argument('--votos', type=int, default=100000, help='Total de votos.')
+        parser.add_argument('--assimetria', type=float, default=1.1,
+                            help='Expoente de Zipf: quanto maior, mais os votos se concentram.')
+        parser.add_argument('--participantes', type=int, default=None,
+                            help='Tamanho do conjunto de participantes. Padrão: o necessário para a enquete mais votada.')
+        parser.add_argument('--encerradas', type=float, default=0.3,
+                            help='Fração de enquetes já encerradas.')
+        parser.add_argument('--para-deletar', type=float, default=0.05,
+                            help='Fração de enquetes com delete_at já vencido.')
+        parser.add_argument('--lote', type=int, default=5000, help='Linhas por bulk_create.')
+        parser.add_argument('--semente', type=int, default=None, help='Semente para repetir a mesma massa.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['semente'])
+        total_enquetes = options['enquetes']
+        if total_enquetes < 1 or options['opcoes'] < 1:
+            raise CommandError('São necessárias ao menos uma enquete e uma opção.')
+
+        votos_por_enquete = self.distribuir(options['votos'], total_enquetes, options['assimetria'], rng)
+        participantes = options['participantes'] or max(max(votos_por_enquete), 1)
+        if participantes < max(votos_por_enquete):
+            raise CommandError(
+                f'--participantes deve ser ao menos {max(votos_por_enquete)} '
+                '(votos da enquete mais votada).'
+            )
+
+        inicio = time.perf_counter()
+        agora = timezone.now()
+        criadas = votos = 0
+
+        for deslocamento in range(0, total_enquetes, options['lote']):
+            fatia = votos_por_enquete[deslocamento:deslocamento + options['lote']]
+            with transaction.atomic():
+                votos += self.criar_lote(fatia, deslocamento, agora, participantes, options, rng)
+            criadas += len(fatia)
+            self.stdout.write(f'{criadas}/{total_enquetes} enquetes, {votos} votos...')
+
+        duracao = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {criadas} enquetes e {votos} votos criados em {duracao:.1f}s '
+            f'({votos / duracao:.0f} votos/s).'
+        ))
+
+    @staticmethod
+    def distribuir(total, partes, assimetria, rng):
+        """Reparte ``total`` em ``partes`` com pesos de Zipf, em ordem aleatória."""
+        pesos = [1 / (posicao ** assimetria) for posicao in range(1, partes + 1)]
+        rng.shuffle(pesos)
+        soma = sum(pesos)
+
+        quantidades = [int(total * peso / soma) for peso in pesos]
+        for indice in rng.choices(range(partes), weights=pesos, k=total - sum(quantidades)):
+            quantidades[indice] += 1
+        return quantidades
+
+    def criar_lote(self, votos_por_enquete, deslocamento, agora, participantes, options, rng):
+        enquetes = []
+        for numero in range(len(votos_por_enquete)):
+            criada = agora - timedelta(minutes=rng.randint(60, 60 * 24 * 30))
+            sorteio = rng.random()
+            if sorteio < options['para_deletar']:
+                expires_at = agora - timedelta(hours=rng.randint(73, 200))
+            elif sorteio < options['encerradas']:
+                expires_at = agora - timedelta(hours=rng.randint(1, 72))
+            else:
+                expires_at = agora + timedelta(hours=rng.randint(1, 24 * 7))
+            enquetes.append(Enquete(
+                titulo=f'Enquete sintética {deslocamento + numero + 1}',
+                data_criacao=min(criada, expires_at),
+                expires_at=expires_at,
+                delete_at=expires_at + timedelta(hours=72)
+            ))
+        Enquete.objects.bulk_create(enquetes, batch_size=options['lote'])
+
+        # Votos de cada opção definidos antes, para gravar Opcao.votos já consistente
+        opcoes = []
+        for enquete, votos in zip(enquetes, votos_por_enquete):
+            por_opcao = self.distribuir(votos, options['opcoes'], options['assimetria'], rng)
+            opcoes.extend(
+                Opcao(enquete=enquete, texto_opcao=f'Opção {indice + 1}', votos=quantidade)
+                for indice, quantidade in enumerate(por_opcao)
+            )
+        Opcao.objects.bulk_create(opcoes, batch_size=options['lote'])
+
+        pendentes = []
+        total = 0
+        opcoes_por_enquete = iter(opcoes)
+        for enquete, votos in zip(enquetes, votos_por_enquete):
+            escolhidos = iter(rng.sample(range(participantes), votos))
+            for _ in range(options['opcoes']):
+                opcao = next(opcoes_por_enquete)
+                for _ in range(opcao.votos):
+                    pendentes.append(Voto(
+                        enquete=enquete,
+                        opcao_escolhida=opcao,
+                        id_participante=f'sintetico_{next(escolhidos)}'
+                    ))
+                if len(pendentes) >= options['lote']:
+                    Voto.objects.bulk_create(pendentes, batch_size=options['lote'])
+                    total += len(pendentes)
+                    pendentes = []
+
+        Voto.objects.bulk_create(pendentes, batch_size=options['lote'])
+        return total + len(pendentes)
@@ -0,0 +1,40 @@
+import gzip
+
+from django.core.management.base import BaseCommand, CommandError
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.validation import validate_schema
+
+from enquete.documentacao import ARQUIVOS, caminho_do_schema
+
+
+class Command(BaseCommand):
+    """
+    Gera o schema OpenAPI uma vez, no build, em ``STATIC_ROOT/openapi/``
+    (YAML e JSON, cada um também em .gz), para o WhiteNoise servir sem que os
+    workers percorram a API a cada ``/api/schema/``. Rode depois do
+    ``collectstatic``, que com ``--clear`` apagaria os arquivos.
+    """
+    help = 'Gera o schema OpenAPI em arquivos estáticos (STATIC_ROOT/openapi/) servidos pelo WhiteNoise.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--validar', action='store_true', help='Valida o schema antes de gravar.')
+
+    def handle(self, *args, **options):
+        schema = spectacular_settings.DEFAULT_GENERATOR_CLASS().get_schema(request=None, public=True)
+        if options['validar']:
+            try:
+                validate_schema(schema)
+            except Exception as erro:
+                raise CommandError(f'Schema inválido: {erro}')
+
+        renderizadores = {'yaml': OpenApiYamlRenderer(), 'json': OpenApiJsonRenderer()}
+        for formato in ARQUIVOS:
+            conteudo = renderizadores[formato].render(schema, renderer_context={})
+            caminho = caminho_do_schema(formato)
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            caminho.write_bytes(conteudo)
+            caminho.with_name(caminho.name + '.gz').write_bytes(gzip.compress(conteudo, mtime=0))
+            self.stdout.write(f'{caminho} ({len(conteudo) / 1024:.1f} KiB)')
+
+        self.stdout.write(self.style.SUCCESS('✅ Schema OpenAPI gerado.'))
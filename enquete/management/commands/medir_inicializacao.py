@@ -0,0 +1,108 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from enquete.documentacao import caminho_do_schema
+
+# Roda em um interpretador novo: mede a partida a frio de um worker
+SCRIPT = r'''
+import json, sys, time
+inicio = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter() - inicio
+
+from django.conf import settings
+from django.test import Client, override_settings
+from django.urls import resolve
+
+inicio = time.perf_counter()
+resolve('/api/')
+urls = time.perf_counter() - inicio
+carregado = 'drf_spectacular.views' in sys.modules
+
+resultado = {'setup': setup, 'urls': urls, 'spectacular_na_partida': carregado}
+with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+    cliente = Client()
+    for nome, caminho in (('api', '/api/enquetes/?limit=1'), ('schema', '/api/schema/'), ('swagger', '/api/swagger/')):
+        inicio = time.perf_counter()
+        resposta = cliente.get(caminho, follow=True)
+        if resposta.streaming:
+            b''.join(resposta.streaming_content)
+        resultado[nome] = time.perf_counter() - inicio
+        resultado[nome + '_status'] = resposta.status_code
+print(json.dumps(resultado))
+'''
+
+ETAPAS = (
+    ('setup', 'django.setup()'),
+    ('urls', 'carregar as URLs'),
+    ('api', '1ª requisição à API'),
+    ('schema', '1ª requisição ao schema'),
+    ('swagger', '1ª requisição ao Swagger'),
+)
+
+
+class Command(BaseCommand):
+    """
+    Mede a partida a frio de um worker: ``django.setup()``, carga das URLs e
+    a primeira requisição à API, ao schema e ao Swagger, cada rodada em um
+    processo novo. Compara o schema gerado na hora (como antes) com o
+    pré-gerado por ``gerar_schema`` e mostra se o drf-spectacular ainda é
+    importado na partida.
+    """
+    help = 'Mede o tempo de inicialização e da primeira requisição, com o schema gerado na hora e pré-gerado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=5, help='Processos por modo (vale a mediana).')
+
+    def handle(self, *args, **options):
+        if not caminho_do_schema('yaml').exists():
+            raise CommandError('Schema pré-gerado não encontrado. Rode antes o gerar_schema.')
+
+        modos = {'na hora': '0', 'pré-gerado': '1'}
+        medianas = {}
+        for modo, estatico in modos.items():
+            rodadas = [self.rodada(estatico) for _ in range(options['repeticoes'])]
+            medianas[modo] = {
+                etapa: statistics.median(rodada[etapa] for rodada in rodadas) * 1000 for etapa, _ in ETAPAS
+            }
+            medianas[modo]['spectacular_na_partida'] = rodadas[0]['spectacular_na_partida']
+            if any(rodada[etapa + '_status'] != 200 for rodada in rodadas for etapa in ('api', 'schema', 'swagger')):
+                raise CommandError(f'Requisição sem sucesso no modo "{modo}": {rodadas[0]}')
+
+        self.stdout.write(
+            f'Mediana de {options["repeticoes"]} processos por modo (ms).\n'
+            f'{"etapa":<34}' + ''.join(f'{modo:>14}' for modo in modos)
+        )
+        for etapa, descricao in ETAPAS:
+            self.stdout.write(f'{descricao:<34}' + ''.join(f'{medianas[modo][etapa]:14.1f}' for modo in modos))
+        carregado = ''.join(
+            f'{"sim" if medianas[modo]["spectacular_na_partida"] else "não":>14}' for modo in modos
+        )
+        self.stdout.write(f'{"drf_spectacular.views na partida":<34}' + carregado)
+
+        antes, depois = medianas['na hora']['schema'], medianas['pré-gerado']['schema']
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Primeira requisição ao schema {antes / depois:.1f}x mais rápida com o arquivo pré-gerado.'
+        ))
+
+    @staticmethod
+    def rodada(estatico):
+        ambiente = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'DjangoEnquete.settings'),
+            'ENQUETE_SCHEMA_ESTATICO': estatico,
+            'PYTHONPATH': os.pathsep.join(filter(None, [str(settings.BASE_DIR), os.environ.get('PYTHONPATH')])),
+        }
+        processo = subprocess.run(
+            [sys.executable, '-c', SCRIPT], env=ambiente, capture_output=True, text=True, check=False
+        )
+        if processo.returncode:
+            raise CommandError(processo.stderr[-2000:])
+        return json.loads(processo.stdout.strip().splitlines()[-1])
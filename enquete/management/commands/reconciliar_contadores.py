@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from enquete.reconciliacao import reconciliar
+
+
+class Command(BaseCommand):
+    """
+    Confere os contadores das opções com a contagem dos votos e corrige as
+    divergências. Barato o bastante para rodar a cada minuto: só as enquetes
+    com votos novos desde a marca d'água, ou alteradas pelo admin, são
+    conferidas. Agende também uma execução com ``--completo`` (por exemplo
+    diária), que encontra contadores alterados direto no banco.
+    """
+    help = 'Reconcilia os contadores das opções (Opcao.votos e slots) com a tabela de votos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Só relata as divergências, sem corrigir nem avançar a marca d\'água.')
+        parser.add_argument('--completo', action='store_true',
+                            help='Confere todas as enquetes não arquivadas, não só as com votos novos.')
+        parser.add_argument('--lote', type=int, default=None, help='Enquetes conferidas por transação.')
+        parser.add_argument('--atraso', type=int, default=None,
+                            help='Idade mínima (segundos) de um voto para a marca d\'água passar dele.')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        corrigir = not options['dry_run']
+        resultado = reconciliar(
+            lote=options['lote'], atraso=options['atraso'], corrigir=corrigir, completo=options['completo']
+        )
+
+        for divergencia in resultado['divergencias']:
+            diferenca = divergencia['votos'] - divergencia['contador']
+            self.stdout.write(
+                f'Enquete {divergencia["id_enquete"]}, opção {divergencia["id_opcao"]}: '
+                f'contador {divergencia["contador"]}, votos {divergencia["votos"]} ({diferenca:+d})'
+            )
+
+        acao = 'corrigidas' if corrigir else 'encontradas (dry-run, nada foi alterado)'
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {resultado["enquetes"]} enquetes conferidas, {len(resultado["divergencias"])} divergências '
+            f'{acao} em {time.perf_counter() - inicio:.1f}s.'
+        ))
@@ -0,0 +1,327 @@
+"""
+Métricas por rota das requisições, no formato texto do Prometheus.
+
+O ``MetricasMiddleware`` mede cada requisição e acumula, por rota (nome da
+URL, como ``enquete-list``), método e status: histograma de latência,
+histograma de consultas SQL, tempo total gasto no banco e bytes da resposta.
+
+As consultas são contadas por um ``execute_wrapper`` instalado em cada
+conexão (sinal ``connection_created``) que soma na medição da requisição
+corrente, guardada em uma ``ContextVar``; assim também contam as consultas
+feitas dentro de ``sync_to_async`` nas views assíncronas.
+
+Com vários workers (gunicorn), cada processo grava seu acumulado em
+``settings.ENQUETE_METRICAS_DIR`` por uma thread de fundo, a cada
+``ENQUETE_METRICAS_INTERVALO_GRAVACAO`` segundos (nunca na requisição), e
+``/api/metrics/`` soma os arquivos de todos os processos. O arquivo leva o
+pid do dono: o de um processo que já não existe (worker reciclado) é
+apagado na soma. Sem o diretório, o endpoint mostra apenas o processo que o
+atendeu.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+logger_lentas = logging.getLogger('enquete.lentas')
+
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100)
+ROTA_NAO_RESOLVIDA = 'nao_resolvida'
+
+_medicao_atual = ContextVar('enquete_medicao_atual', default=None)
+
+
+class Medicao:
+    """
+    Consultas e tempo de SQL de uma requisição (e o SQL, se o log de lentas
+    estiver ligado). Medições aninhadas também somam na externa.
+    """
+    __slots__ = ('consultas', 'sql_segundos', 'sqls', 'externa')
+
+    def __init__(self, guardar_sql=False, externa=None):
+        self.consultas = 0
+        self.sql_segundos = 0.0
+        self.sqls = [] if guardar_sql else None
+        self.externa = externa
+
+    def registrar_sql(self, sql, segundos):
+        self.consultas += 1
+        self.sql_segundos += segundos
+        if self.sqls is not None and len(self.sqls) < settings.ENQUETE_LOG_LENTAS_MAX_SQL:
+            self.sqls.append((round(segundos * 1000, 2), sql))
+        if self.externa is not None:
+            self.externa.registrar_sql(sql, segundos)
+
+
+@contextmanager
+def medir_consultas(guardar_sql=False):
+    """
+    Mede as consultas feitas no bloco, inclusive as de ``sync_to_async`` e
+    de outras conexões, desde que no mesmo contexto (não vale para threads
+    iniciadas dentro dele).
+    """
+    medicao = Medicao(guardar_sql, externa=_medicao_atual.get())
+    token = _medicao_atual.set(medicao)
+    try:
+        yield medicao
+    finally:
+        _medicao_atual.reset(token)
+
+
+def medir_sql(execute, sql, params, many, context):
+    medicao = _medicao_atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.registrar_sql(sql, time.perf_counter() - inicio)
+
+
+def instalar_medidor(sender, connection, **kwargs):
+    """Receptor de ``connection_created``: instala o medidor uma vez por conexão."""
+    if medir_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_sql)
+
+
+def _nova_serie():
+    return {
+        'contagem': 0,
+        'segundos': 0.0,
+        'latencia': [0] * len(LIMITES_LATENCIA),
+        'consultas': 0,
+        'consultas_faixas': [0] * len(LIMITES_CONSULTAS),
+        'sql_segundos': 0.0,
+        'bytes': 0,
+    }
+
+
+def _faixa(limites, valor):
+    """Índice da primeira faixa que comporta o valor, ou ``None`` (só entra em +Inf)."""
+    for indice, limite in enumerate(limites):
+        if valor <= limite:
+            return indice
+    return None
+
+
+class RegistroMetricas:
+    """Acumulado das métricas do processo, por ``(rota, método, status)``."""
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+        self._pid_da_thread = None
+
+    def registrar(self, rota, metodo, status, segundos, medicao, tamanho):
+        chave = (rota, metodo, str(status))
+        with self._lock:
+            if settings.ENQUETE_METRICAS_DIR and self._pid_da_thread != os.getpid():
+                # Uma thread por processo: depois de um fork, o worker inicia a sua
+                self._pid_da_thread = os.getpid()
+                threading.Thread(target=self._gravar_periodicamente, name='metricas', daemon=True).start()
+            serie = self._series.setdefault(chave, _nova_serie())
+            serie['contagem'] += 1
+            serie['segundos'] += segundos
+            serie['consultas'] += medicao.consultas
+            serie['sql_segundos'] += medicao.sql_segundos
+            serie['bytes'] += tamanho
+            faixa = _faixa(LIMITES_LATENCIA, segundos)
+            if faixa is not None:
+                serie['latencia'][faixa] += 1
+            faixa = _faixa(LIMITES_CONSULTAS, medicao.consultas)
+            if faixa is not None:
+                serie['consultas_faixas'][faixa] += 1
+
+    def instantaneo(self):
+        with self._lock:
+            return {
+                '|'.join(chave): {campo: list(v) if isinstance(v, list) else v for campo, v in serie.items()}
+                for chave, serie in self._series.items()
+            }
+
+    def limpar(self):
+        with self._lock:
+            self._series.clear()
+
+    def _gravar_periodicamente(self):
+        while True:
+            time.sleep(settings.ENQUETE_METRICAS_INTERVALO_GRAVACAO)
+            self.gravar()
+
+    @staticmethod
+    def _arquivo():
+        return f'metricas_{os.getpid()}.json'
+
+    def gravar(self):
+        """Grava o acumulado deste processo no diretório compartilhado."""
+        diretorio = settings.ENQUETE_METRICAS_DIR
+        if not diretorio:
+            return
+        caminho = Path(diretorio) / self._arquivo()
+        temporario = caminho.with_suffix('.tmp')
+        try:
+            caminho.parent.mkdir(parents=True, exist_ok=True)
+            temporario.write_text(json.dumps(self.instantaneo()))
+            # Troca atômica: quem lê nunca vê um arquivo pela metade
+            os.replace(temporario, caminho)
+        except OSError:
+            logger.exception('Falha ao gravar métricas em %s.', caminho)
+
+    def agregado(self):
+        """Soma das séries de todos os processos vivos (ou só deste, sem diretório)."""
+        if not settings.ENQUETE_METRICAS_DIR:
+            return self.instantaneo()
+
+        self.gravar()
+        total = {}
+        for caminho in Path(settings.ENQUETE_METRICAS_DIR).glob('metricas_*.json'):
+            if not _dono_vivo(caminho):
+                caminho.unlink(missing_ok=True)
+                continue
+            try:
+                series = json.loads(caminho.read_text())
+            except (OSError, ValueError):
+                continue
+            for chave, serie in series.items():
+                acumulada = total.setdefault(chave, _nova_serie())
+                for campo, valor in serie.items():
+                    if isinstance(valor, list):
+                        acumulada[campo] = [a + b for a, b in zip(acumulada[campo], valor)]
+                    else:
+                        acumulada[campo] += valor
+        return total
+
+
+def _dono_vivo(caminho):
+    """Se o processo do pid no nome do arquivo (``metricas_<pid>.json``) ainda existe."""
+    try:
+        pid = int(caminho.stem.split('_')[1])
+    except (IndexError, ValueError):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Existe, só é de outro usuário
+    return True
+
+
+registro = RegistroMetricas()
+
+
+def _escapar(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(chave, **extras):
+    rota, metodo, status = chave.split('|')
+    pares = [('rota', rota), ('metodo', metodo), ('status', status)] + list(extras.items())
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + '}'
+
+
+def _histograma(linhas, nome, limites, chave, faixas, soma, contagem):
+    acumulado = 0
+    for limite, quantidade in zip(limites, faixas):
+        acumulado += quantidade
+        linhas.append(f'{nome}_bucket{_rotulos(chave, le=str(limite))} {acumulado}')
+    linhas.append(f'{nome}_bucket{_rotulos(chave, le="+Inf")} {contagem}')
+    linhas.append(f'{nome}_sum{_rotulos(chave)} {soma}')
+    linhas.append(f'{nome}_count{_rotulos(chave)} {contagem}')
+
+
+def formatar_prometheus(series):
+    """Texto de exposição do Prometheus (versão 0.0.4) das séries agregadas."""
+    chaves = sorted(series)
+    linhas = [
+        '# HELP enquete_requisicao_segundos Latência das requisições, por rota.',
+        '# TYPE enquete_requisicao_segundos histogram',
+    ]
+    for chave in chaves:
+        serie = series[chave]
+        _histograma(linhas, 'enquete_requisicao_segundos', LIMITES_LATENCIA, chave,
+                    serie['latencia'], serie['segundos'], serie['contagem'])
+
+    linhas += [
+        '# HELP enquete_requisicao_consultas Consultas SQL por requisição, por rota.',
+        '# TYPE enquete_requisicao_consultas histogram',
+    ]
+    for chave in chaves:
+        serie = series[chave]
+        _histograma(linhas, 'enquete_requisicao_consultas', LIMITES_CONSULTAS, chave,
+                    serie['consultas_faixas'], serie['consultas'], serie['contagem'])
+
+    linhas += [
+        '# HELP enquete_requisicao_sql_segundos_total Tempo gasto em SQL, por rota.',
+        '# TYPE enquete_requisicao_sql_segundos_total counter',
+    ]
+    linhas += [f"enquete_requisicao_sql_segundos_total{_rotulos(c)} {series[c]['sql_segundos']}" for c in chaves]
+
+    linhas += [
+        '# HELP enquete_resposta_bytes_total Bytes enviados nas respostas, por rota.',
+        '# TYPE enquete_resposta_bytes_total counter',
+    ]
+    linhas += [f"enquete_resposta_bytes_total{_rotulos(c)} {series[c]['bytes']}" for c in chaves]
+    return '\n'.join(linhas) + '\n'
+
+
+class MetricasMiddleware:
+    """Mede cada requisição e registra em ``registro``; desligado com ``ENQUETE_METRICAS`` falso."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.ENQUETE_METRICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        with medir_consultas(guardar_sql=bool(settings.ENQUETE_LOG_LENTAS_MS)) as medicao:
+            response = self.get_response(request)
+        self.finalizar(request, response, medicao, time.perf_counter() - inicio)
+        return response
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        with medir_consultas(guardar_sql=bool(settings.ENQUETE_LOG_LENTAS_MS)) as medicao:
+            response = await self.get_response(request)
+        self.finalizar(request, response, medicao, time.perf_counter() - inicio)
+        return response
+
+    @staticmethod
+    def finalizar(request, response, medicao, segundos):
+        resolver_match = getattr(request, 'resolver_match', None)
+        rota = (resolver_match and resolver_match.url_name) or ROTA_NAO_RESOLVIDA
+        if response.streaming:
+            # Respostas em fluxo (SSE): mede-se até o início do envio
+            tamanho = int(response.get('Content-Length') or 0)
+        else:
+            tamanho = len(response.content)
+
+        registro.registrar(rota, request.method, response.status_code, segundos, medicao, tamanho)
+
+        limite = settings.ENQUETE_LOG_LENTAS_MS
+        if limite and segundos * 1000 >= limite:
+            logger_lentas.warning(
+                'Requisição lenta: %s %s (%s) em %.1fms, %d consultas, %.1fms em SQL.\n%s',
+                request.method, request.get_full_path(), rota, segundos * 1000,
+                medicao.consultas, medicao.sql_segundos * 1000,
+                '\n'.join(f'  [{ms}ms] {sql}' for ms, sql in medicao.sqls)
+            )
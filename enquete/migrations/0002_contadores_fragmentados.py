@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquete', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enquete',
+            name='slots_contador',
+            field=models.PositiveSmallIntegerField(blank=True, help_text='Quantidade de slots do contador de votos por opção. Vazio usa o padrão global.', null=True),
+        ),
+        migrations.CreateModel(
+            name='ContadorOpcao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('votos', models.IntegerField(default=0)),
+                ('opcao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contadores', to='enquete.opcao')),
+            ],
+            options={
+                'verbose_name': 'Contador de opção',
+                'verbose_name_plural': 'Contadores de opção',
+                'unique_together': {('opcao', 'slot')},
+            },
+        ),
+    ]
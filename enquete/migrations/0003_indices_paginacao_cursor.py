@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquete', '0002_contadores_fragmentados'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enquete',
+            index=models.Index(fields=['expires_at', '-data_criacao'], name='enquete_expira_criacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enquete',
+            index=models.Index(fields=['-data_criacao', '-id'], name='enquete_criacao_id_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquete', '0003_indices_paginacao_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecucaoExpurgo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('corte', models.DateTimeField(help_text='Enquetes com delete_at até este instante são removidas.')),
+                ('status', models.CharField(choices=[('executando', 'Executando'), ('concluida', 'Concluída'), ('interrompida', 'Interrompida'), ('falhou', 'Falhou')], default='executando', max_length=20)),
+                ('iniciada_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('atualizada_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finalizada_em', models.DateTimeField(blank=True, null=True)),
+                ('enquetes_removidas', models.PositiveIntegerField(default=0)),
+                ('opcoes_removidas', models.PositiveIntegerField(default=0)),
+                ('votos_removidos', models.PositiveBigIntegerField(default=0)),
+                ('lotes', models.JSONField(blank=True, default=list)),
+                ('erro', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Execução de expurgo',
+                'verbose_name_plural': 'Execuções de expurgo',
+                'ordering': ['-iniciada_em'],
+            },
+        ),
+    ]
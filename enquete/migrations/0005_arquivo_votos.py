@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:18
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquete', '0004_execucao_expurgo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enquete',
+            name='arquivada_em',
+            field=models.DateTimeField(blank=True, help_text='Quando os votos individuais foram movidos para o arquivo compacto.', null=True),
+        ),
+        migrations.CreateModel(
+            name='ArquivoVotos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_votos', models.PositiveIntegerField(default=0)),
+                ('conteudo', models.BinaryField()),
+                ('bytes_liberados', models.PositiveBigIntegerField(default=0, help_text='Estimativa do espaço que os votos ocupavam na tabela de votos.')),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('enquete', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='arquivo_votos', to='enquete.enquete')),
+            ],
+            options={
+                'verbose_name': 'Arquivo de votos',
+                'verbose_name_plural': 'Arquivos de votos',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquete', '0005_arquivo_votos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enquete',
+            name='atualizada_em',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Instante do último voto ou edição (Last-Modified).'),
+        ),
+        migrations.AddField(
+            model_name='enquete',
+            name='versao',
+            field=models.PositiveBigIntegerField(default=1, help_text='Incrementada a cada voto ou edição; base do ETag da enquete.'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquete', '0006_versao_enquete'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enquete',
+            index=models.Index(fields=['delete_at'], name='enquete_delete_at_idx'),
+        ),
+    ]
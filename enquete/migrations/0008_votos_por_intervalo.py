@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquete', '0007_indice_delete_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaDagua',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=50, unique=True)),
+                ('ultimo_id', models.PositiveBigIntegerField(default=0)),
+                ('atualizada_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': "Marca d'água",
+                'verbose_name_plural': "Marcas d'água",
+            },
+        ),
+        migrations.CreateModel(
+            name='VotosPorIntervalo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inicio', models.DateTimeField()),
+                ('votos', models.PositiveIntegerField(default=0)),
+                ('enquete', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votos_por_intervalo', to='enquete.enquete')),
+                ('opcao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votos_por_intervalo', to='enquete.opcao')),
+            ],
+            options={
+                'verbose_name': 'Votos por intervalo',
+                'verbose_name_plural': 'Votos por intervalo',
+                'indexes': [models.Index(fields=['enquete', 'inicio'], name='intervalo_enquete_inicio_idx')],
+                'unique_together': {('opcao', 'inicio')},
+            },
+        ),
+    ]
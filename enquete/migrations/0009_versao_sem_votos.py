@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquete', '0008_votos_por_intervalo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enquete',
+            name='atualizada_em',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Instante da última edição (Last-Modified das enquetes encerradas).'),
+        ),
+        migrations.AlterField(
+            model_name='enquete',
+            name='versao',
+            field=models.PositiveBigIntegerField(default=1, help_text='Incrementada a cada edição ou correção de votos; com o total de votos, base do ETag.'),
+        ),
+    ]
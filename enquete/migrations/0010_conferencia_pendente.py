@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquete', '0009_versao_sem_votos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConferenciaPendente',
+            fields=[
+                ('enquete', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='enquete.enquete')),
+                ('marcada_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Conferência pendente',
+                'verbose_name_plural': 'Conferências pendentes',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquete', '0010_conferencia_pendente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marcadagua',
+            name='lacunas',
+            field=models.JSONField(blank=True, default=list, help_text='Ids abaixo da marca ainda não vistos, como [id, instante em que a marca passou dele].'),
+        ),
+    ]
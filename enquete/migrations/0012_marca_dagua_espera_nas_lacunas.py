@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquete', '0011_lacunas_marca_dagua'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='marcadagua',
+            name='lacunas',
+        ),
+        migrations.AddField(
+            model_name='marcadagua',
+            name='lacunas_ate',
+            field=models.PositiveBigIntegerField(default=0, help_text='Maior id visto quando a marca parou na lacuna mais antiga ainda em espera.'),
+        ),
+        migrations.AddField(
+            model_name='marcadagua',
+            name='lacunas_desde',
+            field=models.DateTimeField(blank=True, help_text='Quando a marca parou nessa lacuna; vazio se não há espera.', null=True),
+        ),
+    ]
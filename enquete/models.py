@@ -1,11 +1,77 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, Q
 from django.utils import timezone
 
+ABERTA = 'Aberta'
+ENCERRADA = 'Encerrada'
+PARA_DELETAR = 'Para Deletar'
+STATUS_ENQUETE = (ABERTA, ENCERRADA, PARA_DELETAR)
+
+
+def calcular_status(expires_at, delete_at, agora):
+    """
+    Status da enquete no instante ``agora``. É a única regra de status: o
+    modelo, o serializer, o caminho rápido de leitura e o admin usam esta.
+    """
+    if agora < expires_at:
+        return ABERTA
+    if delete_at and agora >= delete_at:
+        return PARA_DELETAR
+    return ENCERRADA
+
+
+def filtro_status(status, agora):
+    """A mesma regra como predicado de faixa sobre ``expires_at``/``delete_at``, servido por índice."""
+    if status == ABERTA:
+        return Q(expires_at__gt=agora)
+    if status == PARA_DELETAR:
+        return Q(expires_at__lte=agora, delete_at__lte=agora)
+    return Q(expires_at__lte=agora) & (Q(delete_at__isnull=True) | Q(delete_at__gt=agora))
+
+
+def contagem_por_status(queryset, agora=None):
+    """Quantidade de enquetes de ``queryset`` em cada status e o total, em uma consulta."""
+    agora = agora or timezone.now()
+    return queryset.aggregate(
+        aberta=Count('pk', filter=filtro_status(ABERTA, agora)),
+        encerrada=Count('pk', filter=filtro_status(ENCERRADA, agora)),
+        para_deletar=Count('pk', filter=filtro_status(PARA_DELETAR, agora)),
+        total=Count('pk'),
+    )
+
+
 class Enquete(models.Model):
     titulo = models.CharField(max_length=255)
     data_criacao = models.DateTimeField(default=timezone.now)
     expires_at = models.DateTimeField(default=timezone.now)
     delete_at = models.DateTimeField(null=True, blank=True)
+    slots_contador = models.PositiveSmallIntegerField(
+        null=True, blank=True,
+        help_text="Quantidade de slots do contador de votos por opção. Vazio usa o padrão global."
+    )
+    arquivada_em = models.DateTimeField(
+        null=True, blank=True,
+        help_text="Quando os votos individuais foram movidos para o arquivo compacto."
+    )
+    versao = models.PositiveBigIntegerField(
+        default=1,
+        help_text="Incrementada a cada edição ou correção de votos; com o total de votos, base do ETag."
+    )
+    atualizada_em = models.DateTimeField(
+        default=timezone.now,
+        help_text="Instante da última edição (Last-Modified das enquetes encerradas)."
+    )
+
+    class Meta:
+        indexes = [
+            # Paginação por cursor: faixa das abertas (expires_at > agora) e
+            # percurso das encerradas da mais nova para a mais antiga
+            models.Index(fields=['expires_at', '-data_criacao'], name='enquete_expira_criacao_idx'),
+            models.Index(fields=['-data_criacao', '-id'], name='enquete_criacao_id_idx'),
+            # Filtro por status (Encerrada / Para Deletar) e seleção do expurgo
+            models.Index(fields=['delete_at'], name='enquete_delete_at_idx'),
+        ]
 
     def __str__(self):
         return self.titulo
@@ -13,13 +79,7 @@ class Enquete(models.Model):
     @property
     def status(self):
         """Retorna o status baseado no tempo atual."""
-        now = timezone.now()
-        if now < self.expires_at:
-            return "Aberta"
-        elif self.delete_at and now >= self.delete_at:
-            return "Para Deletar"
-        else:
-            return "Encerrada"
+        return calcular_status(self.expires_at, self.delete_at, timezone.now())
 
 class Opcao(models.Model):
     enquete = models.ForeignKey(Enquete, on_delete=models.CASCADE, related_name='opcoes')
@@ -35,6 +95,26 @@ class Opcao(models.Model):
     def __str__(self):
         return self.texto_opcao
 
+    @property
+    def total_votos(self):
+        """Votos consolidados mais os que ainda estão nos slots (se anotados)."""
+        return self.votos + getattr(self, 'votos_pendentes', 0)
+
+
+class ContadorOpcao(models.Model):
+    """
+    Slot de contador de uma opção. Com vários slots, votos simultâneos na
+    mesma opção atualizam linhas diferentes em vez de disputar a da Opcao.
+    """
+    opcao = models.ForeignKey(Opcao, on_delete=models.CASCADE, related_name='contadores')
+    slot = models.PositiveSmallIntegerField()
+    votos = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('opcao', 'slot')
+        verbose_name = 'Contador de opção'
+        verbose_name_plural = 'Contadores de opção'
+
 class Voto(models.Model):
     id_participante = models.CharField(max_length=100)
     enquete = models.ForeignKey(Enquete, on_delete=models.CASCADE, related_name='votos')
@@ -42,4 +122,162 @@ class Voto(models.Model):
     data_voto = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ('id_participante', 'enquete')
\ No newline at end of file
+        unique_together = ('id_participante', 'enquete')
+
+class ArquivoVotos(models.Model):
+    """
+    Votos individuais de uma enquete encerrada, compactados (CSV com zlib)
+    fora da tabela de votos. Os totais por opção ficam congelados em
+    ``Opcao.votos`` no momento do arquivamento.
+    """
+    enquete = models.OneToOneField(Enquete, on_delete=models.CASCADE, related_name='arquivo_votos')
+    total_votos = models.PositiveIntegerField(default=0)
+    conteudo = models.BinaryField()
+    bytes_liberados = models.PositiveBigIntegerField(
+        default=0, help_text="Estimativa do espaço que os votos ocupavam na tabela de votos."
+    )
+    criado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Arquivo de votos'
+        verbose_name_plural = 'Arquivos de votos'
+
+    def __str__(self):
+        return f'Votos arquivados de "{self.enquete}"'
+
+
+class ExecucaoExpurgo(models.Model):
+    """
+    Registro de uma execução do expurgo de enquetes expiradas, com o progresso
+    acumulado e o tempo de cada lote. Uma execução interrompida pelo limite de
+    tempo pode ser retomada com o mesmo ponto de corte.
+    """
+    EXECUTANDO = 'executando'
+    CONCLUIDA = 'concluida'
+    INTERROMPIDA = 'interrompida'
+    FALHOU = 'falhou'
+    STATUS_CHOICES = [
+        (EXECUTANDO, 'Executando'),
+        (CONCLUIDA, 'Concluída'),
+        (INTERROMPIDA, 'Interrompida'),
+        (FALHOU, 'Falhou'),
+    ]
+
+    corte = models.DateTimeField(help_text="Enquetes com delete_at até este instante são removidas.")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=EXECUTANDO)
+    iniciada_em = models.DateTimeField(default=timezone.now)
+    atualizada_em = models.DateTimeField(default=timezone.now)
+    finalizada_em = models.DateTimeField(null=True, blank=True)
+    enquetes_removidas = models.PositiveIntegerField(default=0)
+    opcoes_removidas = models.PositiveIntegerField(default=0)
+    votos_removidos = models.PositiveBigIntegerField(default=0)
+    lotes = models.JSONField(default=list, blank=True)
+    erro = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-iniciada_em']
+        verbose_name = 'Execução de expurgo'
+        verbose_name_plural = 'Execuções de expurgo'
+
+    def __str__(self):
+        return f'Expurgo de {self.iniciada_em:%d/%m/%Y %H:%M} ({self.get_status_display()})'
+
+
+class VotosPorIntervalo(models.Model):
+    """
+    Votos de uma opção em um minuto (``inicio``, em UTC). Mantido
+    incrementalmente a partir dos votos, atrás da ``MarcaDagua``
+    ``votos_por_intervalo``; base da linha do tempo da enquete.
+    """
+    enquete = models.ForeignKey(Enquete, on_delete=models.CASCADE, related_name='votos_por_intervalo')
+    opcao = models.ForeignKey(Opcao, on_delete=models.CASCADE, related_name='votos_por_intervalo')
+    inicio = models.DateTimeField()
+    votos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('opcao', 'inicio')
+        indexes = [
+            models.Index(fields=['enquete', 'inicio'], name='intervalo_enquete_inicio_idx'),
+        ]
+        verbose_name = 'Votos por intervalo'
+        verbose_name_plural = 'Votos por intervalo'
+
+
+class MarcaDagua(models.Model):
+    """
+    Até onde um processamento incremental já leu uma tabela: o maior ``id``
+    incorporado. A linha é travada durante o processamento, então duas
+    execuções simultâneas nunca incorporam o mesmo registro.
+
+    Um id abaixo da marca pode aparecer depois dela: ids são reservados no
+    início da transação e ficam visíveis no commit, fora de ordem. Por isso a
+    marca não passa de um id que falta (uma lacuna) enquanto ele pode
+    aparecer. Ao parar numa lacuna, ela anota o maior id já visto
+    (``lacunas_ate``) e o instante (``lacunas_desde``): as lacunas até ele
+    foram reservadas antes disso e, passados ``ENQUETE_MARCA_LACUNA_VALIDADE``
+    segundos, são dadas como perdidas (a maioria nunca aparece, como os ids de
+    inserções desfeitas). Nenhum id pulado é guardado.
+    """
+    nome = models.CharField(max_length=50, unique=True)
+    ultimo_id = models.PositiveBigIntegerField(default=0)
+    lacunas_ate = models.PositiveBigIntegerField(
+        default=0, help_text="Maior id visto quando a marca parou na lacuna mais antiga ainda em espera."
+    )
+    lacunas_desde = models.DateTimeField(
+        null=True, blank=True, help_text="Quando a marca parou nessa lacuna; vazio se não há espera."
+    )
+    atualizada_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Marca d\'água'
+        verbose_name_plural = 'Marcas d\'água'
+
+    def __str__(self):
+        return f'{self.nome} (até {self.ultimo_id})'
+
+    @classmethod
+    def travar(cls, nome):
+        """A marca ``nome`` (criada se preciso) travada até o fim da transação corrente."""
+        cls.objects.get_or_create(nome=nome)
+        return cls.objects.select_for_update().get(nome=nome)
+
+    def avancar(self, ids):
+        """
+        Avança a marca pelos ``ids`` lidos acima dela (em ordem), parando antes
+        da primeira lacuna que ainda pode aparecer. Retorna quantos dos ``ids``
+        ela passou: os seguintes continuam acima da marca. Não salva.
+        """
+        agora = timezone.now()
+        vencidas = (
+            self.lacunas_desde is not None
+            and (agora - self.lacunas_desde).total_seconds() >= settings.ENQUETE_MARCA_LACUNA_VALIDADE
+        )
+        anterior = self.ultimo_id
+        passados = 0
+        for id_ in ids:
+            if id_ != anterior + 1 and not (vencidas and id_ - 1 <= self.lacunas_ate):
+                break
+            anterior = id_
+            passados += 1
+
+        if anterior >= self.lacunas_ate:
+            # A espera anterior acabou: se parou de novo, começa outra
+            parou = passados < len(ids)
+            self.lacunas_ate = ids[-1] if parou else anterior
+            self.lacunas_desde = agora if parou else None
+        self.ultimo_id = anterior
+        self.atualizada_em = agora
+        return passados
+
+
+class ConferenciaPendente(models.Model):
+    """
+    Enquete cujos votos ou contadores mudaram fora do caminho do voto (pelo
+    admin): a próxima reconciliação a confere mesmo sem votos novos.
+    """
+    enquete = models.OneToOneField(Enquete, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    marcada_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Conferência pendente'
+        verbose_name_plural = 'Conferências pendentes'
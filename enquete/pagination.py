@@ -0,0 +1,118 @@
+"""
+Paginação da lista de enquetes.
+
+O modo padrão continua sendo ``LimitOffsetPagination``. O modo cursor
+(``?paginacao=cursor``, ou qualquer requisição com ``?cursor=``) troca a
+ordenação por prioridade em duas varreduras por faixa, cada uma servida por
+índice: primeiro as enquetes abertas, depois as encerradas, ambas da mais
+nova para a mais antiga. Não há ``COUNT(*)`` e o cursor guarda o instante
+da primeira página, então enquetes criadas ou encerradas no meio da
+navegação não deslocam as páginas seguintes.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+ABERTAS, ENCERRADAS = 0, 1
+
+
+class EnquetePagination(LimitOffsetPagination):
+    cursor_query_param = 'cursor'
+    modo_query_param = 'paginacao'
+    cursor_invalido = 'Cursor inválido.'
+
+    def usar_cursor(self, request):
+        if self.cursor_query_param in request.query_params:
+            return True
+        modo = request.query_params.get(self.modo_query_param, settings.ENQUETE_PAGINACAO)
+        return modo == 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.modo_cursor = self.usar_cursor(request)
+        if not self.modo_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.limit = self.get_limit(request) or settings.ENQUETE_PAGINA_CURSOR_TAMANHO
+        fase, posicao, agora = self.decodificar_cursor(request)
+
+        itens = []
+        while fase <= ENCERRADAS:
+            faltam = self.limit + 1 - len(itens)
+            lote = list(self.varredura(queryset, fase, agora, posicao)[:faltam])
+            itens.extend((fase, enquete) for enquete in lote)
+            if len(lote) == faltam:
+                break
+            fase, posicao = fase + 1, None
+
+        self.proximo = None
+        if len(itens) > self.limit:
+            fase, ultima = itens[self.limit - 1]
+            self.proximo = (fase, (ultima.data_criacao, ultima.pk), agora)
+
+        return [enquete for _, enquete in itens[:self.limit]]
+
+    @staticmethod
+    def varredura(queryset, fase, agora, posicao):
+        """Uma das duas faixas, a partir da posição do cursor, mais nova primeiro."""
+        if fase == ABERTAS:
+            queryset = queryset.filter(expires_at__gt=agora)
+        else:
+            queryset = queryset.filter(expires_at__lte=agora)
+
+        if posicao:
+            data_criacao, pk = posicao
+            queryset = queryset.filter(
+                Q(data_criacao__lt=data_criacao) | Q(data_criacao=data_criacao, pk__lt=pk)
+            )
+        return queryset.order_by('-data_criacao', '-pk')
+
+    def decodificar_cursor(self, request):
+        codificado = request.query_params.get(self.cursor_query_param)
+        if not codificado:
+            return ABERTAS, None, timezone.now()
+
+        try:
+            dados = json.loads(base64.urlsafe_b64decode(codificado.encode()))
+            posicao = (parse_datetime(dados['d']), int(dados['i']))
+            agora = parse_datetime(dados['a'])
+            fase = int(dados['f'])
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise NotFound(self.cursor_invalido)
+
+        if None in (posicao[0], agora) or fase not in (ABERTAS, ENCERRADAS):
+            raise NotFound(self.cursor_invalido)
+        return fase, posicao, agora
+
+    def codificar_cursor(self, fase, posicao, agora):
+        dados = {'f': fase, 'd': posicao[0].isoformat(), 'i': posicao[1], 'a': agora.isoformat()}
+        return base64.urlsafe_b64encode(json.dumps(dados).encode()).decode()
+
+    def get_next_link(self):
+        if not self.modo_cursor:
+            return super().get_next_link()
+        if self.proximo is None:
+            return None
+
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.offset_query_param)
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.cursor_query_param, self.codificar_cursor(*self.proximo))
+
+    def get_paginated_response(self, data):
+        if not self.modo_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,192 @@
+"""
+Filtro em memória de participantes que já votaram, por enquete.
+
+Em rajadas de repetição (duplo clique, clientes refazendo a requisição) a
+maior parte dos votos é de quem já votou, e cada um custa uma transação que
+trava a linha da opção até o ``IntegrityError``. Com o filtro ligado
+(``ENQUETE_FILTRO_PARTICIPANTES``), o participante conhecido recebe o 409
+sem ir ao banco.
+
+O filtro só responde "já votou" quando é certo: o conjunto de cada enquete é
+aquecido com os votos gravados e recebe apenas votos confirmados (depois do
+commit) ou duplicados detectados pelo banco. Fora dele a resposta é
+"incerto" e a decisão continua com a restrição ``unique_together``. Por
+isso é um conjunto exato e não um filtro de Bloom: um falso positivo
+recusaria um voto legítimo.
+
+A memória é limitada pelo total de participantes guardados: as enquetes
+usadas há mais tempo saem primeiro, e cada enquete guarda no máximo os
+participantes mais recentes. Cada conjunto é reaquecido depois de
+``ENQUETE_FILTRO_PARTICIPANTES_TTL`` segundos, o que limita por quanto tempo
+um voto apagado em outro processo ainda é lembrado neste.
+
+O aquecimento (até ``ENQUETE_FILTRO_PARTICIPANTES_MAX_POR_ENQUETE`` ids)
+roda em uma thread de fundo, fora da requisição que o pediu: até ele
+terminar, a enquete responde "incerto" (ou, no reaquecimento, com o
+conjunto anterior) e o voto segue para o banco, sem esperar a leitura.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import Voto
+
+logger = logging.getLogger(__name__)
+
+
+class FiltroParticipantes:
+    """Participantes que já votaram, por enquete, em LRU com limite de entradas."""
+
+    def __init__(self, max_entradas, max_por_enquete, ttl):
+        self.max_entradas = max_entradas
+        self.max_por_enquete = max_por_enquete
+        self.ttl = ttl
+
+        self._enquetes = OrderedDict()  # id_enquete -> (aquecido_em, OrderedDict de participantes)
+        self._entradas = 0
+        self._aquecendo = set()  # enquetes com aquecimento agendado ou em andamento
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='filtro-participantes')
+
+        self.acertos = 0
+        self.falhas = 0
+        self.aquecimentos = 0
+        self.enquetes_descartadas = 0
+
+    def ja_votou(self, id_enquete, id_participante):
+        """``True`` só quando é certo que o participante já votou; ``False`` é "incerto"."""
+        participantes = self._participantes(id_enquete)
+        with self._lock:
+            if participantes is not None and id_participante in participantes:
+                participantes.move_to_end(id_participante)
+                self.acertos += 1
+                return True
+            self.falhas += 1
+            return False
+
+    def registrar(self, id_enquete, *ids_participante):
+        """Acrescenta votos confirmados, se a enquete estiver no filtro."""
+        with self._lock:
+            item = self._enquetes.get(id_enquete)
+            if item is None:
+                return
+            participantes = item[1]
+            for id_participante in ids_participante:
+                if id_participante not in participantes:
+                    participantes[id_participante] = None
+                    self._entradas += 1
+            self._aparar(participantes)
+
+    def esquecer(self, *ids_enquete):
+        with self._lock:
+            for id_enquete in ids_enquete:
+                item = self._enquetes.pop(id_enquete, None)
+                if item is not None:
+                    self._entradas -= len(item[1])
+
+    def limpar(self):
+        with self._lock:
+            self._enquetes.clear()
+            self._entradas = 0
+            self.acertos = self.falhas = self.aquecimentos = self.enquetes_descartadas = 0
+
+    def _participantes(self, id_enquete):
+        """
+        Conjunto da enquete; se faltar ou tiver vencido, agenda o aquecimento e
+        devolve o que houver agora (o conjunto anterior ou ``None``).
+        """
+        with self._lock:
+            item = self._enquetes.get(id_enquete)
+            if item is not None and time.monotonic() - item[0] < self.ttl:
+                self._enquetes.move_to_end(id_enquete)
+                return item[1]
+            agendar = id_enquete not in self._aquecendo
+            self._aquecendo.add(id_enquete)
+
+        if agendar:
+            self._executor.submit(self._aquecer_em_segundo_plano, id_enquete)
+        with self._lock:
+            item = self._enquetes.get(id_enquete)
+            return item[1] if item is not None else None
+
+    def _aquecer_em_segundo_plano(self, id_enquete):
+        close_old_connections()
+        try:
+            self.aquecer(id_enquete)
+        except Exception:
+            logger.exception('Falha ao aquecer o filtro de participantes da enquete %s.', id_enquete)
+
+    def aquecer(self, id_enquete):
+        """Lê do banco os participantes da enquete e troca o conjunto dela."""
+        try:
+            participantes = OrderedDict.fromkeys(reversed(self._ler_participantes(id_enquete)))
+            with self._lock:
+                anterior = self._enquetes.pop(id_enquete, None)
+                if anterior is not None:
+                    self._entradas -= len(anterior[1])
+                self._enquetes[id_enquete] = (time.monotonic(), participantes)
+                self._entradas += len(participantes)
+                self.aquecimentos += 1
+                self._aparar(participantes)
+        finally:
+            with self._lock:
+                self._aquecendo.discard(id_enquete)
+
+    def _ler_participantes(self, id_enquete):
+        """Participantes da enquete no banco, os mais recentes primeiro, até o limite da enquete."""
+        return list(
+            Voto.objects.filter(enquete_id=id_enquete)
+            .order_by('-id')
+            .values_list('id_participante', flat=True)[:self.max_por_enquete]
+        )
+
+    def _aparar(self, participantes):
+        """Respeita os limites (com o lock): mais antigos da enquete, depois enquetes menos usadas."""
+        while len(participantes) > self.max_por_enquete:
+            participantes.popitem(last=False)
+            self._entradas -= 1
+        while self._entradas > self.max_entradas and len(self._enquetes) > 1:
+            _, (_, descartados) = self._enquetes.popitem(last=False)
+            self._entradas -= len(descartados)
+            self.enquetes_descartadas += 1
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'ativo': True,
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / consultas, 4) if consultas else None,
+                'aquecimentos': self.aquecimentos,
+                'enquetes': len(self._enquetes),
+                'enquetes_descartadas': self.enquetes_descartadas,
+                'entradas': self._entradas,
+                'max_entradas': self.max_entradas,
+                'max_por_enquete': self.max_por_enquete,
+                'ttl_segundos': self.ttl,
+            }
+
+
+_filtro = None
+_filtro_lock = threading.Lock()
+
+
+def obter_filtro():
+    """Filtro do processo, criado na primeira utilização; ``None`` se estiver desligado."""
+    global _filtro
+    if not settings.ENQUETE_FILTRO_PARTICIPANTES:
+        return None
+    with _filtro_lock:
+        if _filtro is None:
+            _filtro = FiltroParticipantes(
+                max_entradas=settings.ENQUETE_FILTRO_PARTICIPANTES_MAX_ENTRADAS,
+                max_por_enquete=settings.ENQUETE_FILTRO_PARTICIPANTES_MAX_POR_ENQUETE,
+                ttl=settings.ENQUETE_FILTRO_PARTICIPANTES_TTL
+            )
+    return _filtro
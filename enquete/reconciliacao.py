@@ -0,0 +1,172 @@
+"""
+Reconciliação dos contadores das opções com a tabela de votos.
+
+O total de uma opção (``Opcao.votos`` mais os slots de ``ContadorOpcao``) é
+mantido à parte dos votos e pode divergir deles: um voto criado ou apagado
+pelo admin, uma edição manual do contador, uma falha fora da transação do
+voto. ``reconciliar`` compara os contadores com a contagem de ``Voto`` por
+opção (uma agregação por lote de enquetes, não uma consulta por opção) e
+corrige o que divergir.
+
+Só são conferidas as enquetes com votos acima da marca d'água e as marcadas
+em ``ConferenciaPendente`` (o admin marca as que altera), então rodar a cada
+minuto não percorre as enquetes paradas. Como em ``linha_do_tempo``, a marca
+só avança até antes do primeiro voto com menos de
+``ENQUETE_RECONCILIACAO_ATRASO`` segundos e espera nas lacunas de ids:
+um voto que aparece depois ainda está acima da marca e a sua enquete é
+conferida. Um contador alterado direto no banco não deixa marca: agende também uma execução com ``completo`` (todas as
+enquetes não arquivadas; as arquivadas já não têm votos individuais), por
+exemplo uma vez por dia.
+
+A comparação roda sem travas. Só as opções que divergirem são conferidas de
+novo, em uma transação que trava a enquete, as opções e os slots antes de
+contar: votos em andamento terminam antes da contagem e os que chegarem
+depois esperam a correção, então nada é contado pela metade, e os votos nas
+opções em dia nunca esperam pela reconciliação.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .contadores import opcoes_com_total
+from .models import ConferenciaPendente, ContadorOpcao, Enquete, MarcaDagua, Opcao, Voto
+from .versoes import incrementar_versao
+from .votacao import votos_alterados
+
+MARCA = 'reconciliacao_contadores'
+
+
+def enquetes_com_votos_novos(marca, atraso):
+    """
+    Ids das enquetes com votos acima da ``marca`` e os ids dos votos até onde
+    ela pode avançar (os anteriores ao primeiro com menos de ``atraso`` segundos).
+    """
+    corte = timezone.now() - timedelta(seconds=atraso)
+    novos = Voto.objects.filter(id__gt=marca.ultimo_id).order_by()
+    recente = novos.filter(data_voto__gt=corte).aggregate(id=Min('id'))['id']
+    if recente is not None:
+        novos = novos.filter(id__lt=recente)
+
+    prontos = list(novos.order_by('id').values_list('id', 'enquete_id'))
+    ids = sorted({id_enquete for _, id_enquete in prontos})
+    return ids, [id_voto for id_voto, _ in prontos]
+
+
+def marcar_para_conferir(*ids_enquete):
+    """Marca as enquetes para a próxima reconciliação; remarcar atualiza o instante."""
+    ConferenciaPendente.objects.bulk_create(
+        [ConferenciaPendente(enquete_id=i) for i in ids_enquete],
+        update_conflicts=True, unique_fields=['enquete'], update_fields=['marcada_em']
+    )
+
+
+def _comparar(opcoes):
+    """
+    Divergências das ``opcoes`` (queryset de ``Opcao``): o total de cada uma
+    (com os slots) contra a contagem dos seus votos, uma agregação para cada lado.
+    """
+    lidas = list(opcoes_com_total().filter(pk__in=opcoes.values('pk')).values_list(
+        'id', 'enquete_id', 'votos', 'votos_pendentes'
+    ))
+    contagens = dict(
+        Voto.objects.filter(opcao_escolhida_id__in=[id_opcao for id_opcao, *_ in lidas])
+        .order_by()
+        .values('opcao_escolhida_id')
+        .annotate(votos=Count('id'))
+        .values_list('opcao_escolhida_id', 'votos')
+    )
+    divergencias = []
+    for id_opcao, id_enquete, votos, pendentes in lidas:
+        if votos + pendentes != contagens.get(id_opcao, 0):
+            divergencias.append({
+                'id_enquete': id_enquete, 'id_opcao': id_opcao,
+                'contador': votos + pendentes, 'votos': contagens.get(id_opcao, 0),
+            })
+    return divergencias
+
+
+def conferir(ids_enquete, corrigir=True):
+    """
+    Compara o total de cada opção das enquetes com a contagem dos seus votos
+    e confere de novo, com as linhas travadas, só as que divergirem. Com
+    ``corrigir``, a opção divergente passa a ter ``Opcao.votos`` igual à
+    contagem e os slots zerados; sem, nada é travado e as divergências são
+    as da primeira leitura. Retorna as divergências confirmadas:
+    ``{'id_enquete', 'id_opcao', 'contador', 'votos'}``.
+    """
+    suspeitas = _comparar(
+        Opcao.objects.filter(enquete_id__in=ids_enquete, enquete__arquivada_em__isnull=True)
+    )
+    if not suspeitas or not corrigir:
+        # Sem correção não há o que proteger: o relatório sai da leitura sem travas
+        return suspeitas
+
+    with transaction.atomic():
+        # A enquete travada também impede um arquivamento no meio da conferência
+        abertas = list(
+            Enquete.objects.select_for_update()
+            .filter(id__in={d['id_enquete'] for d in suspeitas}, arquivada_em__isnull=True)
+            .order_by('id')
+            .values_list('id', flat=True)
+        )
+        ids_opcoes = [d['id_opcao'] for d in suspeitas]
+        opcoes = Opcao.objects.filter(id__in=ids_opcoes, enquete_id__in=abertas)
+        list(opcoes.select_for_update().order_by('id').values_list('id'))
+        list(ContadorOpcao.objects.select_for_update().filter(opcao__in=opcoes).order_by('id').values_list('id'))
+
+        # Entre a primeira leitura e as travas, votos em andamento podem ter acertado a diferença
+        divergencias = _comparar(opcoes)
+        if divergencias:
+            Opcao.objects.bulk_update(
+                [Opcao(id=d['id_opcao'], votos=d['votos']) for d in divergencias], ['votos']
+            )
+            ContadorOpcao.objects.filter(opcao_id__in=[d['id_opcao'] for d in divergencias]).update(votos=0)
+            ids_alterados = sorted({d['id_enquete'] for d in divergencias})
+            # O total pode diminuir: só a versão nova garante um ETag nunca usado
+            incrementar_versao(*ids_alterados)
+            transaction.on_commit(lambda: votos_alterados(*ids_alterados))
+
+    return divergencias
+
+
+def reconciliar(lote=None, atraso=None, corrigir=True, completo=False):
+    """
+    Confere as enquetes com votos novos desde a marca d'água e as marcadas
+    para conferência (ou todas as não arquivadas, com ``completo``), ``lote``
+    enquetes por vez, e avança a marca. Sem ``corrigir``, só relata: nada é
+    gravado, e a marca e as marcações ficam onde estão. Retorna
+    ``{'enquetes', 'divergencias', 'ultimo_id'}``, com a marca ao final.
+    """
+    lote = lote or settings.ENQUETE_RECONCILIACAO_LOTE
+    atraso = settings.ENQUETE_RECONCILIACAO_ATRASO if atraso is None else atraso
+
+    marca = MarcaDagua.objects.filter(nome=MARCA).first() or MarcaDagua(nome=MARCA)
+    ids, prontos = enquetes_com_votos_novos(marca, atraso)
+    lidas_em = timezone.now()
+    pendentes = set(ConferenciaPendente.objects.values_list('enquete_id', flat=True))
+    if completo:
+        ids = list(Enquete.objects.filter(arquivada_em__isnull=True).order_by('id').values_list('id', flat=True))
+    else:
+        ids = sorted(set(ids) | pendentes)
+
+    divergencias = []
+    for inicio in range(0, len(ids), lote):
+        ids_lote = ids[inicio:inicio + lote]
+        divergencias.extend(conferir(ids_lote, corrigir=corrigir))
+        if corrigir and pendentes.intersection(ids_lote):
+            # Só as marcações lidas: uma remarcação durante a conferência fica para a próxima
+            ConferenciaPendente.objects.filter(enquete_id__in=ids_lote, marcada_em__lte=lidas_em).delete()
+
+    if corrigir and prontos:
+        with transaction.atomic():
+            travada = MarcaDagua.travar(MARCA)
+            # Outra execução pode ter movido a marca enquanto esta conferia: a dela vale
+            if travada.ultimo_id == marca.ultimo_id:
+                travada.avancar(prontos)
+                travada.save(update_fields=['ultimo_id', 'lacunas_ate', 'lacunas_desde', 'atualizada_em'])
+            marca = travada
+
+    return {'enquetes': len(ids), 'divergencias': divergencias, 'ultimo_id': marca.ultimo_id}
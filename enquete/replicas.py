@@ -0,0 +1,157 @@
+"""
+Leituras em réplicas do banco, com fixação no primário depois de escrever.
+
+Com ``DATABASE_REPLICA_URLS`` configurado, as ações de leitura da
+``EnqueteViewSet`` (``ACOES_DE_LEITURA``, e as views assíncronas de
+``list``/``retrieve``) consultam uma das réplicas; o resto (votos, criação,
+edição, expurgo, comandos) continua no primário. A escolha vale só dentro da
+view marcada, por um ``ContextVar`` lido por ``RoteadorReplicas``: uma
+leitura fora dela nunca vai para uma réplica, e essas ações não abrem
+transações.
+
+Depois de uma escrita bem-sucedida, o ``FixacaoPrimarioMiddleware`` manda um
+cookie que mantém as leituras daquele cliente no primário por
+``ENQUETE_REPLICA_FIXACAO`` segundos, para que ele veja o próprio voto
+apesar do atraso de replicação. Com o frontend em outro site, o cookie sai
+com ``SameSite=None; Secure`` (``ENQUETE_REPLICA_COOKIE_SAMESITE``), senão o
+navegador não o mandaria nas leituras seguintes.
+
+Uma réplica que falha (erro de conexão ou de consulta) fica de fora por
+``ENQUETE_REPLICA_ESPERA`` segundos neste processo e a view é executada de
+novo no primário. Payloads lidos de uma réplica entram no cache sob a chave
+do estado lido na mesma réplica (ver ``cache``), então um atraso de
+replicação nunca deixa um placar velho sob uma chave nova.
+"""
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, InterfaceError, OperationalError
+
+logger = logging.getLogger(__name__)
+
+ACOES_DE_LEITURA = frozenset({
+    'list', 'retrieve', 'resultados', 'resultados_em_lote', 'linha_do_tempo', 'contagem_status'
+})
+COOKIE_FIXACAO = 'enquete_primario'
+
+_replica_atual = ContextVar('enquete_replica_atual', default=None)
+_indisponiveis = {}  # alias -> instante (monotonic) em que volta a ser tentada
+_lock = threading.Lock()
+
+
+class RoteadorReplicas:
+    """Leituras na réplica escolhida para a view em andamento; todo o resto no primário."""
+
+    def db_for_read(self, model, **hints):
+        return _replica_atual.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas têm os mesmos dados do primário
+        return True
+
+
+def fixado_no_primario(request):
+    return COOKIE_FIXACAO in request.COOKIES
+
+
+def escolher_replica(request):
+    """Alias de uma réplica disponível para esta requisição, ou ``None`` (primário)."""
+    if not settings.ENQUETE_REPLICAS or fixado_no_primario(request):
+        return None
+    agora = time.monotonic()
+    with _lock:
+        disponiveis = [
+            alias for alias in settings.ENQUETE_REPLICAS if _indisponiveis.get(alias, 0) <= agora
+        ]
+    return random.choice(disponiveis) if disponiveis else None
+
+
+def marcar_indisponivel(alias):
+    logger.warning(
+        'Réplica %s indisponível; leituras no primário por %ss.', alias, settings.ENQUETE_REPLICA_ESPERA
+    )
+    with _lock:
+        _indisponiveis[alias] = time.monotonic() + settings.ENQUETE_REPLICA_ESPERA
+
+
+def em_replica(view):
+    """
+    Executa a view (síncrona ou assíncrona) com as leituras em uma réplica;
+    se a réplica falhar, marca-a como indisponível e executa de novo no primário.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def envolvida(request, *args, **kwargs):
+            alias = escolher_replica(request)
+            if alias is None:
+                return await view(request, *args, **kwargs)
+            token = _replica_atual.set(alias)
+            try:
+                return await view(request, *args, **kwargs)
+            except (OperationalError, InterfaceError):
+                marcar_indisponivel(alias)
+                _replica_atual.set(None)
+                return await view(request, *args, **kwargs)
+            finally:
+                _replica_atual.reset(token)
+        return envolvida
+
+    @wraps(view)
+    def envolvida(request, *args, **kwargs):
+        alias = escolher_replica(request)
+        if alias is None:
+            return view(request, *args, **kwargs)
+        token = _replica_atual.set(alias)
+        try:
+            return view(request, *args, **kwargs)
+        except (OperationalError, InterfaceError):
+            marcar_indisponivel(alias)
+            _replica_atual.set(None)
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_atual.reset(token)
+    return envolvida
+
+
+class FixacaoPrimarioMiddleware:
+    """Depois de uma escrita bem-sucedida, fixa as leituras do cliente no primário."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        return self.fixar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.fixar(request, await self.get_response(request))
+
+    @staticmethod
+    def fixar(request, response):
+        if (
+            settings.ENQUETE_REPLICAS
+            and request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+            and response.status_code < 400
+        ):
+            samesite = settings.ENQUETE_REPLICA_COOKIE_SAMESITE
+            response.set_cookie(
+                COOKIE_FIXACAO, '1', max_age=settings.ENQUETE_REPLICA_FIXACAO,
+                httponly=True, samesite=samesite, secure=samesite == 'None' or request.is_secure()
+            )
+        return response
@@ -0,0 +1,54 @@
+"""
+Resultados das enquetes: total de votos, percentual de cada opção e líder.
+
+Sai dos contadores já mantidos a cada voto (``Opcao.votos`` mais os slots
+pendentes), nunca de uma agregação sobre ``Voto``: duas consultas para
+qualquer quantidade de enquetes, com custo proporcional às opções pedidas
+e não aos votos recebidos.
+"""
+from django.utils import timezone
+
+from .leitura import consultas
+from .models import calcular_status
+
+
+def _resultado(enquete, opcoes, agora):
+    total = sum(opcao['votos'] for opcao in opcoes)
+    for opcao in opcoes:
+        opcao['percentual'] = round(100 * opcao['votos'] / total, 2) if total else 0.0
+
+    lider = None
+    maximo = max((opcao['votos'] for opcao in opcoes), default=0)
+    empatadas = [opcao['id'] for opcao in opcoes if opcao['votos'] == maximo]
+    if maximo and len(empatadas) == 1:
+        lider = empatadas[0]
+
+    return {
+        'id': enquete.id,
+        'titulo': enquete.titulo,
+        'status': calcular_status(enquete.expires_at, enquete.delete_at, agora),
+        'total_votos': total,
+        'lider': lider,
+        'empate': bool(maximo) and len(empatadas) > 1,
+        'opcoes': opcoes,
+    }
+
+
+def resultados_das_enquetes(ids):
+    """Resultados das enquetes ``ids``, na mesma ordem; as inexistentes ficam de fora."""
+    enquetes, opcoes = consultas(ids)
+    por_id = {enquete.id: enquete for enquete in enquetes}
+    if not por_id:
+        return []
+
+    opcoes_por_enquete = {}
+    for id_enquete, id_opcao, texto_opcao, votos, pendentes in opcoes:
+        opcoes_por_enquete.setdefault(id_enquete, []).append(
+            {'id': id_opcao, 'texto_opcao': texto_opcao, 'votos': votos + pendentes}
+        )
+
+    agora = timezone.now()
+    return [
+        _resultado(por_id[i], opcoes_por_enquete.get(i, []), agora)
+        for i in ids if i in por_id
+    ]
@@ -1,16 +1,29 @@
 from rest_framework import serializers
-from .models import Enquete, Opcao
+from .models import STATUS_ENQUETE, Enquete, ExecucaoExpurgo, Opcao
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 from drf_spectacular.utils import extend_schema_field, extend_schema_serializer, OpenApiExample
 
 
 class OpcaoSerializer(serializers.ModelSerializer):
+    # Inclui os votos ainda não consolidados dos slots do contador
+    votos = serializers.IntegerField(source='total_votos', read_only=True)
+
     class Meta:
         model = Opcao
         fields = ['id', 'texto_opcao', 'votos']
         read_only_fields = ['id', 'votos']
 
+class EnqueteListSerializer(serializers.ListSerializer):
+    """
+    Criação em lote: cada item é validado individualmente (os erros voltam
+    na posição do item) e, se todos forem válidos, tudo é inserido de uma vez.
+    """
+
+    def create(self, validated_data):
+        return EnqueteSerializer.criar_em_lote(validated_data)
+
 @extend_schema_serializer(
     examples=[
         OpenApiExample(
@@ -44,7 +57,7 @@ class EnqueteSerializer(serializers.ModelSerializer):
 
     # Saída: status calculado dinamicamente
     status = serializers.SerializerMethodField(
-        help_text="Status dinâmico da enquete: 'Aberta' ou 'Encerrada'."
+        help_text="Status dinâmico da enquete: 'Aberta', 'Encerrada' ou 'Para Deletar'."
     )
 
     class Meta:
@@ -55,6 +68,7 @@ class EnqueteSerializer(serializers.ModelSerializer):
             'opcoes', 'opcoes_input', 'duracao_horas'
         ]
         read_only_fields = ['expires_at', 'delete_at', 'data_criacao']
+        list_serializer_class = EnqueteListSerializer
         examples = [
             OpenApiExample(
                 "Exemplo de criação de enquete",
@@ -68,34 +82,46 @@ class EnqueteSerializer(serializers.ModelSerializer):
             )
         ]
 
-    @extend_schema_field(serializers.CharField())
+    @extend_schema_field(serializers.ChoiceField(choices=STATUS_ENQUETE))
     def get_status(self, obj) -> str:
-        return "Aberta" if obj.expires_at > timezone.now() else "Encerrada"
+        return obj.status
 
 
     def create(self, validated_data):
         """
         Criação customizada da Enquete com suas opções e datas calculadas.
         """
+        return self.criar_em_lote([validated_data])[0]
 
-        opcoes_data = validated_data.pop('opcoes_input')
-        duracao_horas = validated_data.pop('duracao_horas')
-
+    @staticmethod
+    def criar_em_lote(itens):
+        """
+        Cria várias enquetes e suas opções com dois ``bulk_create`` em uma transação.
+        """
         now = timezone.now()
-        expires_at = now + timedelta(hours=duracao_horas)
-        delete_at = expires_at + timedelta(hours=72)  # 3 dias após expiração
+        enquetes = []
+        opcoes_por_enquete = []
+
+        for dados in itens:
+            dados = dict(dados)
+            opcoes_por_enquete.append(dados.pop('opcoes_input'))
+            duracao_horas = dados.pop('duracao_horas')
 
-        validated_data['expires_at'] = expires_at
-        validated_data['delete_at'] = delete_at
+            expires_at = now + timedelta(hours=duracao_horas)
+            delete_at = expires_at + timedelta(hours=72)  # 3 dias após expiração
+            enquetes.append(Enquete(**dados, expires_at=expires_at, delete_at=delete_at))
 
-        # Cria o objeto Enquete principal
-        enquete = Enquete.objects.create(**validated_data)
+        with transaction.atomic():
+            # O bulk_create preenche os ids (PostgreSQL e SQLite), usados pelas opções
+            Enquete.objects.bulk_create(enquetes)
+            Opcao.objects.bulk_create([
+                Opcao(enquete=enquete, texto_opcao=texto_opcao)
+                for enquete, textos in zip(enquetes, opcoes_por_enquete)
+                for texto_opcao in textos
+            ])
 
-        # Itera sobre os textos das opções e cria cada objeto Opcao
-        for texto_opcao in opcoes_data:
-            Opcao.objects.create(enquete=enquete, texto_opcao=texto_opcao)
+        return enquetes
 
-        return enquete
 
 @extend_schema_serializer(
     examples=[
@@ -138,4 +164,103 @@ class VotoInputSerializer(serializers.Serializer):
                 },
                 request_only=True
             )
-        ]
\ No newline at end of file
+        ]
+
+
+class PlacarOpcaoSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    votos = serializers.IntegerField()
+
+
+class PlacarSerializer(serializers.Serializer):
+    """
+    Resposta compacta do voto: apenas os votos por opção e o total da enquete.
+    """
+    id = serializers.IntegerField(help_text="ID da enquete.")
+    total_votos = serializers.IntegerField(help_text="Soma dos votos de todas as opções.")
+    opcoes = PlacarOpcaoSerializer(many=True)
+
+
+class ResultadoOpcaoSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    texto_opcao = serializers.CharField()
+    votos = serializers.IntegerField()
+    percentual = serializers.FloatField(help_text="Percentual dos votos da enquete, com duas casas.")
+
+
+class ResultadosEnqueteSerializer(serializers.Serializer):
+    """
+    Resultado consolidado de uma enquete, calculado a partir dos contadores.
+    """
+    id = serializers.IntegerField(help_text="ID da enquete.")
+    titulo = serializers.CharField()
+    status = serializers.ChoiceField(choices=STATUS_ENQUETE)
+    total_votos = serializers.IntegerField(help_text="Soma dos votos de todas as opções.")
+    lider = serializers.IntegerField(
+        allow_null=True, help_text="ID da opção mais votada; nulo sem votos ou em caso de empate."
+    )
+    empate = serializers.BooleanField(help_text="Mais de uma opção com o maior número de votos.")
+    opcoes = ResultadoOpcaoSerializer(many=True)
+
+
+class IntervaloSerializer(serializers.Serializer):
+    inicio = serializers.DateTimeField(help_text="Início do intervalo, em UTC.")
+    total = serializers.IntegerField()
+    votos = serializers.DictField(
+        child=serializers.IntegerField(), help_text="Votos no intervalo por ID de opção."
+    )
+
+
+class LinhaDoTempoOpcaoSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    texto_opcao = serializers.CharField()
+
+
+class LinhaDoTempoSerializer(serializers.Serializer):
+    """
+    Votos da enquete por minuto ou por hora; só aparecem os intervalos com votos.
+    """
+    id = serializers.IntegerField(help_text="ID da enquete.")
+    resolucao = serializers.ChoiceField(choices=['minuto', 'hora'])
+    inicio = serializers.DateTimeField()
+    fim = serializers.DateTimeField()
+    opcoes = LinhaDoTempoOpcaoSerializer(many=True)
+    intervalos = IntervaloSerializer(many=True)
+
+
+class ResultadoVotoSerializer(serializers.Serializer):
+    indice = serializers.IntegerField(help_text="Posição do voto no lote enviado.")
+    resultado = serializers.ChoiceField(choices=['aceito', 'duplicado', 'invalido'])
+    erro = serializers.JSONField(
+        required=False, help_text="Motivo da recusa: mensagem ou erros de validação do item."
+    )
+
+
+class ResultadoLoteVotosSerializer(serializers.Serializer):
+    """
+    Resposta do voto em lote: os totais e o resultado de cada voto, na ordem enviada.
+    """
+    aceitos = serializers.IntegerField()
+    duplicados = serializers.IntegerField()
+    invalidos = serializers.IntegerField()
+    resultados = ResultadoVotoSerializer(many=True)
+
+
+class ContagemStatusSerializer(serializers.Serializer):
+    """
+    Quantidade de enquetes em cada status, no mesmo instante.
+    """
+    aberta = serializers.IntegerField()
+    encerrada = serializers.IntegerField()
+    para_deletar = serializers.IntegerField()
+    total = serializers.IntegerField()
+
+
+class ExecucaoExpurgoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExecucaoExpurgo
+        fields = [
+            'id', 'status', 'corte', 'iniciada_em', 'atualizada_em', 'finalizada_em',
+            'enquetes_removidas', 'opcoes_removidas', 'votos_removidos', 'lotes', 'erro'
+        ]
+        read_only_fields = fields
@@ -0,0 +1,260 @@
+"""
+Transmissão dos resultados ao vivo (Server-Sent Events).
+
+O caminho do voto publica apenas um aviso "a enquete X mudou" no broker.
+Em cada processo, um ``Difusor`` mantém uma única assinatura por enquete,
+agrupa os avisos de uma rajada em uma leitura do placar por intervalo e
+repassa esse placar a todas as conexões SSE locais daquela enquete.
+
+O broker é plugável (``settings.ENQUETE_BROKER``): ``BrokerEmProcesso``
+atende um processo só (testes, runserver); ``BrokerRedis`` distribui os
+avisos entre vários workers.
+
+O fluxo precisa de um servidor ASGI. Sob WSGI a conexão ocuparia um worker
+para sempre, então a view responde só o placar atual, com um ``retry:`` que
+faz o ``EventSource`` voltar a cada ``ENQUETE_STREAM_HEARTBEAT`` segundos.
+"""
+import asyncio
+import json
+import logging
+import threading
+import weakref
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from .contadores import placar
+
+logger = logging.getLogger(__name__)
+
+
+def _canal(id_enquete):
+    return f'enquete:{id_enquete}'
+
+
+class BrokerEmProcesso:
+    """Broker em memória: entrega os avisos apenas às assinaturas deste processo."""
+
+    def __init__(self):
+        self._assinantes = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publicar(self, canal, mensagem):
+        with self._lock:
+            assinantes = list(self._assinantes[canal])
+        for loop, fila in assinantes:
+            try:
+                loop.call_soon_threadsafe(fila.put_nowait, mensagem)
+            except RuntimeError:
+                # Loop já encerrado; a assinatura some no finally de assinar()
+                pass
+
+    async def assinar(self, canal, ao_inscrever):
+        assinatura = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._assinantes[canal].add(assinatura)
+        ao_inscrever()
+        try:
+            while True:
+                yield await assinatura[1].get()
+        finally:
+            with self._lock:
+                self._assinantes[canal].discard(assinatura)
+                if not self._assinantes[canal]:
+                    del self._assinantes[canal]
+
+
+class BrokerRedis:
+    """Broker sobre o Pub/Sub do Redis (``settings.REDIS_URL``), compartilhado entre workers."""
+
+    def __init__(self):
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as erro:
+            raise ImproperlyConfigured("BrokerRedis requer o pacote 'redis'.") from erro
+        if not settings.REDIS_URL:
+            raise ImproperlyConfigured('BrokerRedis requer REDIS_URL.')
+
+        self._redis_async = redis.asyncio
+        self._cliente = redis.Redis.from_url(settings.REDIS_URL)
+
+    def publicar(self, canal, mensagem):
+        self._cliente.publish(canal, mensagem)
+
+    async def assinar(self, canal, ao_inscrever):
+        cliente = self._redis_async.Redis.from_url(settings.REDIS_URL)
+        pubsub = cliente.pubsub()
+        await pubsub.subscribe(canal)
+        try:
+            async for mensagem in pubsub.listen():
+                # A confirmação do SUBSCRIBE garante que o servidor já entrega as publicações
+                if mensagem['type'] == 'subscribe':
+                    ao_inscrever()
+                elif mensagem['type'] == 'message':
+                    yield mensagem['data']
+        finally:
+            await pubsub.unsubscribe(canal)
+            await cliente.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def obter_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.ENQUETE_BROKER)()
+    return _broker
+
+
+def notificar_votos(*ids_enquete):
+    """Avisa os assinantes de que os votos das enquetes mudaram."""
+    broker = obter_broker()
+    for id_enquete in ids_enquete:
+        try:
+            broker.publicar(_canal(id_enquete), 'votos')
+        except Exception:
+            # A transmissão é um extra: falha no broker não pode derrubar o voto
+            logger.exception('Falha ao publicar atualização da enquete %s.', id_enquete)
+
+
+class _Acompanhamento:
+    """Estado de uma enquete acompanhada pelo ``Difusor`` neste processo."""
+
+    def __init__(self):
+        self.inscrita = asyncio.Event()  # assinatura no broker confirmada
+        self.mudou = asyncio.Event()     # aviso pendente de leitura do placar
+        self.servida = False             # algum placar já foi lido para as conexões
+        self.tarefa = None
+
+
+class Difusor:
+    """
+    Fan-out local das atualizações: uma assinatura no broker por enquete,
+    no máximo uma leitura do placar por intervalo, qualquer número de conexões.
+
+    Uma falha do broker ou do banco não encerra o acompanhamento: a assinatura
+    é refeita (e o placar relido, pelos avisos perdidos na queda) e a leitura
+    que falhou é tentada de novo no intervalo seguinte.
+    """
+
+    def __init__(self, broker, intervalo):
+        self.broker = broker
+        self.intervalo = intervalo
+        self._ouvintes = defaultdict(set)
+        self._acompanhamentos = {}
+
+    async def assinar(self, id_enquete, heartbeat):
+        """
+        Gera o placar atual e depois o placar a cada atualização, ou ``None``
+        após ``heartbeat`` segundos sem novidades.
+        """
+        # maxsize=1: uma conexão lenta recebe só o placar mais recente
+        fila = asyncio.Queue(maxsize=1)
+        self._ouvintes[id_enquete].add(fila)
+        acompanhamento = self._acompanhamentos.get(id_enquete)
+        if acompanhamento is None or acompanhamento.tarefa.done():
+            acompanhamento = self._acompanhamentos[id_enquete] = _Acompanhamento()
+            acompanhamento.tarefa = asyncio.create_task(self._acompanhar(id_enquete, acompanhamento))
+
+        try:
+            # O placar inicial só é lido com a assinatura confirmada, para não
+            # perder votos entre os dois; se ela demorar, a confirmação relê
+            try:
+                await asyncio.wait_for(acompanhamento.inscrita.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                logger.warning('Assinatura da enquete %s ainda não confirmada pelo broker.', id_enquete)
+            acompanhamento.servida = True
+            yield await sync_to_async(placar)(id_enquete)
+            while True:
+                try:
+                    yield await asyncio.wait_for(fila.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self._ouvintes[id_enquete].discard(fila)
+            if not self._ouvintes[id_enquete]:
+                del self._ouvintes[id_enquete]
+                self._acompanhamentos.pop(id_enquete).tarefa.cancel()
+
+    async def _acompanhar(self, id_enquete, acompanhamento):
+        mudou = acompanhamento.mudou
+        leitor = asyncio.create_task(self._ler_avisos(id_enquete, acompanhamento))
+        loop = asyncio.get_running_loop()
+        ultima = -self.intervalo
+
+        try:
+            while True:
+                await mudou.wait()
+                espera = ultima + self.intervalo - loop.time()
+                if espera > 0:
+                    # Avisos que chegarem durante a espera entram nesta mesma leitura
+                    await asyncio.sleep(espera)
+                mudou.clear()
+                ultima = loop.time()
+
+                try:
+                    dados = await sync_to_async(placar)(id_enquete)
+                except Exception:
+                    logger.exception('Falha ao ler o placar da enquete %s; nova tentativa no próximo intervalo.',
+                                     id_enquete)
+                    mudou.set()
+                    continue
+                for fila in list(self._ouvintes.get(id_enquete, ())):
+                    if fila.full():
+                        fila.get_nowait()
+                    fila.put_nowait(dados)
+        finally:
+            leitor.cancel()
+
+    async def _ler_avisos(self, id_enquete, acompanhamento):
+        def ao_inscrever():
+            # Reinscrição (ou confirmação tardia): avisos do intervalo se perderam
+            if acompanhamento.servida:
+                acompanhamento.mudou.set()
+            acompanhamento.inscrita.set()
+
+        while True:
+            try:
+                async for _ in self.broker.assinar(_canal(id_enquete), ao_inscrever):
+                    acompanhamento.mudou.set()
+            except Exception:
+                logger.exception('Assinatura da enquete %s caiu; refazendo.', id_enquete)
+            await asyncio.sleep(max(self.intervalo, 1))
+
+
+_difusores = weakref.WeakKeyDictionary()
+
+
+def obter_difusor():
+    """Difusor do event loop atual (um por processo ASGI)."""
+    loop = asyncio.get_running_loop()
+    if loop not in _difusores:
+        _difusores[loop] = Difusor(obter_broker(), settings.ENQUETE_STREAM_INTERVALO)
+    return _difusores[loop]
+
+
+def formatar_evento(dados):
+    """Formata um placar como evento SSE; ``None`` vira um comentário de keep-alive."""
+    if dados is None:
+        return ': keep-alive\n\n'
+    return f'event: placar\ndata: {json.dumps(dados, cls=DjangoJSONEncoder)}\n\n'
+
+
+def evento_unico(id_enquete):
+    """Placar atual como um único evento SSE, para quando não há fluxo (WSGI)."""
+    espera = int(settings.ENQUETE_STREAM_HEARTBEAT * 1000)
+    return f'retry: {espera}\n\n' + formatar_evento(placar(id_enquete))
+
+
+async def eventos_enquete(id_enquete):
+    """Fluxo SSE de uma enquete: o placar atual e depois cada atualização agrupada."""
+    async for dados in obter_difusor().assinar(id_enquete, settings.ENQUETE_STREAM_HEARTBEAT):
+        yield formatar_evento(dados)
@@ -1,3 +1,1508 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections
+from django.db.models import Count, F
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import assincrono, cache as cache_enquetes, reconciliacao, replicas, votacao
+from .buffer import BufferVotos
+from .participantes import FiltroParticipantes, obter_filtro
+from .streaming import BrokerEmProcesso, Difusor, _canal
+from .votacao import EnqueteEncerrada, VotoDuplicado, registrar_voto
+from .arquivamento import arquivar_enquete, enquetes_para_arquivar, ler_votos_arquivados
+from .contadores import consolidar_contadores, incrementar_slot, placar, prefetch_opcoes
+from .leitura import RenderizadorJSON, ler_enquetes
+from .exportacao import TAMANHO_BLOCO, aceita_gzip
+from .expurgo import (
+    MotorExpurgo, dependentes_das_enquetes, dependentes_das_opcoes, disparar_em_segundo_plano, iniciar_execucao
+)
+from .metricas import registro as registro_metricas
+from .linha_do_tempo import MARCA as MARCA_INTERVALOS, atualizar_intervalos, linha_do_tempo
+from .models import (
+    ArquivoVotos, ConferenciaPendente, ContadorOpcao, Enquete, ExecucaoExpurgo, MarcaDagua, Opcao, Voto,
+    VotosPorIntervalo
+)
+from .serializers import EnqueteSerializer
+
+# Segundo banco dos testes de réplica, definido em DjangoEnquete.settings_testes
+REPLICA_TESTE = 'replica_teste'
+COM_REPLICA_TESTE = REPLICA_TESTE in settings.DATABASES
+
+
+def criar_enquete(titulo='Enquete de teste', opcoes=('A', 'B', 'C'), horas=24):
+    agora = timezone.now()
+    enquete = Enquete.objects.create(
+        titulo=titulo,
+        expires_at=agora + timedelta(hours=horas),
+        delete_at=agora + timedelta(hours=horas + 72)
+    )
+    for texto in opcoes:
+        Opcao.objects.create(enquete=enquete, texto_opcao=texto)
+    return enquete
+
+
+class VotarTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.enquete = criar_enquete()
+        self.opcao = self.enquete.opcoes.first()
+        self.url = reverse('enquete:enquete-votar', args=[self.enquete.pk])
+
+    def votar(self, id_opcao, id_participante='participante_1'):
+        return self.client.post(
+            self.url, {'id_opcao': id_opcao, 'id_participante': id_participante}, format='json'
+        )
+
+    def test_voto_valido_incrementa_contador(self):
+        resposta = self.votar(self.opcao.id)
+
+        self.assertEqual(resposta.status_code, 200)
+        self.opcao.refresh_from_db()
+        self.assertEqual(self.opcao.votos, 1)
+        votos = {o['id']: o['votos'] for o in resposta.data['opcoes']}
+        self.assertEqual(votos[self.opcao.id], 1)
+
+    def test_voto_duplicado_retorna_409_sem_incrementar(self):
+        self.votar(self.opcao.id)
+        resposta = self.votar(self.opcao.id)
+
+        self.assertEqual(resposta.status_code, 409)
+        self.opcao.refresh_from_db()
+        self.assertEqual(self.opcao.votos, 1)
+        self.assertEqual(Voto.objects.count(), 1)
+
+    def test_opcao_de_outra_enquete_retorna_400(self):
+        outra = criar_enquete(titulo='Outra')
+
+        resposta = self.votar(outra.opcoes.first().id)
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(Voto.objects.exists())
+
+    def test_resposta_compacta_traz_apenas_o_placar(self):
+        resposta = self.client.post(
+            self.url + '?resposta=compacta',
+            {'id_opcao': self.opcao.id, 'id_participante': 'p1'}, format='json'
+        )
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(set(resposta.data), {'id', 'total_votos', 'opcoes'})
+        self.assertEqual(resposta.data['total_votos'], 1)
+        self.assertIn({'id': self.opcao.id, 'votos': 1}, resposta.data['opcoes'])
+
+    def test_enquete_encerrada_retorna_403(self):
+        Enquete.objects.filter(pk=self.enquete.pk).update(expires_at=timezone.now())
+
+        resposta = self.votar(self.opcao.id)
+
+        self.assertEqual(resposta.status_code, 403)
+        self.assertFalse(Voto.objects.exists())
+
+
+class ExecutorNaHora:
+    """
+    No lugar do executor de fundo do filtro: aquece na hora, na conexão (e na
+    transação) do teste, sem a troca de conexões da thread de fundo.
+    """
+
+    def __init__(self, filtro):
+        self.filtro = filtro
+
+    def submit(self, funcao, id_enquete):
+        self.filtro.aquecer(id_enquete)
+
+
+@override_settings(ENQUETE_FILTRO_PARTICIPANTES=True)
+class FiltroParticipantesTests(TestCase):
+    def setUp(self):
+        self.filtro = obter_filtro()
+        self.filtro.limpar()
+        self.addCleanup(self.filtro.limpar)
+        aquecimento = mock.patch.object(self.filtro, '_executor', ExecutorNaHora(self.filtro))
+        aquecimento.start()
+        self.addCleanup(aquecimento.stop)
+        self.enquete = criar_enquete()
+        self.opcao = self.enquete.opcoes.first()
+
+    def votar(self, id_participante):
+        with self.captureOnCommitCallbacks(execute=True):
+            return registrar_voto(self.enquete, self.opcao.id, id_participante)
+
+    def test_duplicado_conhecido_e_recusado_sem_consultas(self):
+        Voto.objects.create(enquete=self.enquete, opcao_escolhida=self.opcao, id_participante='antigo')
+        self.votar('novo')  # aquece o filtro com 'antigo' e registra 'novo' depois do commit
+
+        for participante in ('antigo', 'novo'):
+            with self.assertNumQueries(0), self.assertRaises(VotoDuplicado):
+                registrar_voto(self.enquete, self.opcao.id, participante)
+
+        self.opcao.refresh_from_db()
+        self.assertEqual(self.opcao.votos, 1)
+        estatisticas = self.client.get(reverse('enquete:enquete-filtro-participantes')).data
+        self.assertEqual((estatisticas['acertos'], estatisticas['falhas']), (2, 1))
+        self.assertEqual(estatisticas['aquecimentos'], 1)
+
+    def test_participante_desconhecido_segue_para_o_banco(self):
+        self.votar('p1')
+        self.assertTrue(Voto.objects.filter(id_participante='p1').exists())
+
+        # Gravado por outro processo, fora do filtro: o banco recusa e o filtro aprende
+        Voto.objects.create(enquete=self.enquete, opcao_escolhida=self.opcao, id_participante='p3')
+        with self.assertRaises(VotoDuplicado):
+            self.votar('p3')
+        self.assertTrue(self.filtro.ja_votou(self.enquete.id, 'p3'))
+
+    def test_limites_de_memoria(self):
+        filtro = FiltroParticipantes(max_entradas=5, max_por_enquete=3, ttl=60)
+        filtro._executor = ExecutorNaHora(filtro)
+        outra = criar_enquete(titulo='Outra')
+        filtro.ja_votou(self.enquete.id, 'x')
+        filtro.registrar(self.enquete.id, 'p1', 'p2', 'p3', 'p4')
+        self.assertEqual(filtro.estatisticas()['entradas'], 3)
+        self.assertFalse(filtro.ja_votou(self.enquete.id, 'p1'))
+
+        filtro.ja_votou(outra.id, 'x')
+        filtro.registrar(outra.id, 'q1', 'q2', 'q3')
+        estatisticas = filtro.estatisticas()
+        self.assertEqual((estatisticas['enquetes'], estatisticas['entradas']), (1, 3))
+        self.assertEqual(estatisticas['enquetes_descartadas'], 1)
+
+
+    def test_aquecimento_em_segundo_plano_sem_esperar(self):
+        filtro = FiltroParticipantes(max_entradas=100, max_por_enquete=10, ttl=60)
+        leituras = []
+        liberar = threading.Event()
+
+        def ler_devagar(id_enquete):
+            leituras.append(id_enquete)
+            liberar.wait(5)
+            return ['p1']
+
+        with mock.patch.object(filtro, '_ler_participantes', side_effect=ler_devagar):
+            # Enquanto a enquete aquece, todos respondem "incerto" na hora, e a leitura é uma só
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                respostas = list(executor.map(lambda _: filtro.ja_votou(self.enquete.id, 'p1'), range(8)))
+            self.assertEqual(respostas, [False] * 8)
+
+            liberar.set()
+            filtro._executor.submit(lambda: None).result()
+            self.assertEqual(leituras, [self.enquete.id])
+            self.assertTrue(filtro.ja_votou(self.enquete.id, 'p1'))
+        self.assertEqual(filtro.estatisticas()['aquecimentos'], 1)
+
+
+class ContadorFragmentadoTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.enquete = criar_enquete()
+        Enquete.objects.filter(pk=self.enquete.pk).update(slots_contador=8)
+        self.opcao = self.enquete.opcoes.first()
+        self.url = reverse('enquete:enquete-votar', args=[self.enquete.pk])
+
+    def test_votos_vao_para_os_slots_e_somam_no_total(self):
+        for i in range(20):
+            resposta = self.client.post(
+                self.url, {'id_opcao': self.opcao.id, 'id_participante': f'p{i}'}, format='json'
+            )
+            self.assertEqual(resposta.status_code, 200)
+
+        self.opcao.refresh_from_db()
+        self.assertEqual(self.opcao.votos, 0)
+        self.assertEqual(ContadorOpcao.objects.filter(opcao=self.opcao).count(), 8)
+
+        detalhe = self.client.get(reverse('enquete:enquete-detail', args=[self.enquete.pk]))
+        votos = {o['id']: o['votos'] for o in detalhe.data['opcoes']}
+        self.assertEqual(votos[self.opcao.id], 20)
+
+    def test_consolidacao_incorpora_slots_em_opcao_votos(self):
+        for i in range(5):
+            self.client.post(self.url, {'id_opcao': self.opcao.id, 'id_participante': f'p{i}'}, format='json')
+
+        self.assertEqual(consolidar_contadores(), {self.opcao.id: 5})
+
+        self.opcao.refresh_from_db()
+        self.assertEqual(self.opcao.votos, 5)
+        self.assertFalse(ContadorOpcao.objects.filter(votos__gt=0).exists())
+
+
+@skipUnless(COM_REPLICA_TESTE, 'rode com --settings=DjangoEnquete.settings_testes')
+@override_settings(ENQUETE_REPLICAS=[REPLICA_TESTE])
+class ReplicasTests(TestCase):
+    """Primário e réplica em dois bancos, com dados diferentes para saber quem respondeu."""
+    # O executor cria os bancos de todas as classes, inclusive as puladas
+    databases = {DEFAULT_DB_ALIAS, REPLICA_TESTE} if COM_REPLICA_TESTE else {DEFAULT_DB_ALIAS}
+
+    def setUp(self):
+        replicas._indisponiveis.clear()
+        self.client = APIClient()
+        self.enquete = criar_enquete(titulo='No primário')
+        copia = Enquete.objects.using(REPLICA_TESTE).create(
+            id=self.enquete.id, titulo='Na réplica',
+            expires_at=self.enquete.expires_at, delete_at=self.enquete.delete_at
+        )
+        for opcao in self.enquete.opcoes.all():
+            Opcao.objects.using(REPLICA_TESTE).create(id=opcao.id, enquete=copia, texto_opcao=opcao.texto_opcao)
+        self.url = reverse('enquete:enquete-detail', args=[self.enquete.pk])
+
+    def test_leituras_vao_para_a_replica(self):
+        self.assertEqual(self.client.get(self.url).data['titulo'], 'Na réplica')
+        self.assertEqual([e['titulo'] for e in self.client.get(reverse('enquete:enquete-list')).data], ['Na réplica'])
+        resultados = self.client.get(reverse('enquete:enquete-resultados', args=[self.enquete.pk]))
+        self.assertEqual(resultados.data['titulo'], 'Na réplica')
+
+    def test_depois_de_votar_o_participante_le_do_primario(self):
+        opcao = self.enquete.opcoes.first()
+        resposta = self.client.post(
+            reverse('enquete:enquete-votar', args=[self.enquete.pk]),
+            {'id_opcao': opcao.id, 'id_participante': 'p1'}, format='json'
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.cookies[replicas.COOKIE_FIXACAO]['samesite'], 'Lax')
+
+        detalhe = self.client.get(self.url).data
+        self.assertEqual(detalhe['titulo'], 'No primário')
+        self.assertEqual(sum(o['votos'] for o in detalhe['opcoes']), 1)
+        # Outro cliente, sem o cookie, continua na réplica
+        self.assertEqual(APIClient().get(self.url).data['titulo'], 'Na réplica')
+
+    @override_settings(ENQUETE_REPLICA_COOKIE_SAMESITE='None')
+    def test_cookie_de_fixacao_vale_para_o_frontend_em_outro_site(self):
+        resposta = self.client.post(
+            reverse('enquete:enquete-votar', args=[self.enquete.pk]),
+            {'id_opcao': self.enquete.opcoes.first().id, 'id_participante': 'p1'}, format='json'
+        )
+        cookie = resposta.cookies[replicas.COOKIE_FIXACAO]
+        self.assertEqual((cookie['samesite'], cookie['secure']), ('None', True))
+
+    def test_replica_com_falha_cai_para_o_primario(self):
+        falha = OperationalError('could not connect to server')
+        with (
+            mock.patch.object(connections[REPLICA_TESTE], 'ensure_connection', side_effect=falha),
+            self.assertLogs('enquete.replicas', 'WARNING')
+        ):
+            resposta = self.client.get(self.url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data['titulo'], 'No primário')
+
+        # Fica fora da escolha: a próxima leitura vai direto ao primário
+        with self.assertNoLogs('enquete.replicas', 'WARNING'):
+            self.assertEqual(self.client.get(self.url).data['titulo'], 'No primário')
+
+
+class LeituraRapidaTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        aberta = criar_enquete(titulo='Ação\u2028"citação" 🗳️', opcoes=('Sim', 'Não'))
+        incrementar_slot(aberta.opcoes.first().id, 4)
+        encerrada = criar_enquete(titulo='Encerrada', horas=-2)
+        Enquete.objects.filter(pk=encerrada.pk).update(delete_at=None)
+        sem_opcoes = criar_enquete(titulo='Sem opções', opcoes=())
+        self.ids = [sem_opcoes.pk, aberta.pk, encerrada.pk]
+
+    def test_saida_identica_a_do_serializer_byte_a_byte(self):
+        enquetes = Enquete.objects.prefetch_related(prefetch_opcoes()).in_bulk(self.ids)
+        for fuso in ('America/Manaus', 'UTC'):
+            with timezone.override(fuso):
+                esperado = JSONRenderer().render(
+                    EnqueteSerializer([enquetes[i] for i in self.ids], many=True).data
+                )
+                linhas, payloads = ler_enquetes(self.ids + [999999])
+
+            self.assertEqual([linha.id for linha in linhas], self.ids)
+            self.assertEqual(RenderizadorJSON().render(payloads), esperado)
+            self.assertIn(b'\\u2028', esperado)
+        self.assertIn(b'Z"', esperado)
+
+    def test_respostas_da_api_iguais_com_e_sem_o_caminho_rapido(self):
+        urls = [reverse('enquete:enquete-list'), reverse('enquete:enquete-detail', args=[self.ids[1]])]
+        with override_settings(ENQUETE_LEITURA_RAPIDA=False):
+            esperadas = [self.client.get(url) for url in urls]
+
+        for url, esperada in zip(urls, esperadas):
+            resposta = self.client.get(url)
+            self.assertEqual(resposta.content, esperada.content)
+            self.assertEqual(resposta['ETag'], esperada['ETag'])
+
+
+class StatusEnqueteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        agora = timezone.now()
+        self.aberta = criar_enquete(titulo='Aberta')
+        self.encerrada = criar_enquete(titulo='Encerrada', horas=-1)
+        self.sem_exclusao = criar_enquete(titulo='Sem exclusão', horas=-1)
+        Enquete.objects.filter(pk=self.sem_exclusao.pk).update(delete_at=None)
+        self.para_deletar = criar_enquete(titulo='Para deletar', horas=-100)
+        Enquete.objects.filter(pk=self.para_deletar.pk).update(delete_at=agora - timedelta(hours=1))
+        self.url = reverse('enquete:enquete-list')
+
+    def test_filtro_por_status_bate_com_o_status_de_cada_enquete(self):
+        esperado = {
+            'Aberta': {self.aberta.pk},
+            'Encerrada': {self.encerrada.pk, self.sem_exclusao.pk},
+            'Para Deletar': {self.para_deletar.pk},
+        }
+        for status, ids in esperado.items():
+            resposta = self.client.get(self.url, {'status': status})
+
+            self.assertEqual(resposta.status_code, 200)
+            self.assertEqual({e['id'] for e in resposta.data}, ids)
+            self.assertEqual({e['status'] for e in resposta.data}, {status})
+            self.assertEqual({Enquete.objects.get(pk=i).status for i in ids}, {status})
+
+        self.assertEqual(self.client.get(self.url, {'status': 'Arquivada'}).status_code, 400)
+
+    def test_contagem_por_status_em_uma_consulta(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(reverse('enquete:enquete-contagem-status'))
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data, {'aberta': 1, 'encerrada': 2, 'para_deletar': 1, 'total': 4})
+        self.assertEqual(len(consultas), 1)
+
+
+class ResultadosTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.enquete = criar_enquete()
+        self.a, self.b, self.c = self.enquete.opcoes.all()
+        for i, opcao in enumerate([self.a, self.a, self.b]):
+            registrar_voto(self.enquete, opcao.id, f'p{i}')
+        incrementar_slot(self.a.id, 4)
+
+    def test_total_percentuais_e_lider_sem_ler_votos(self):
+        url = reverse('enquete:enquete-resultados', args=[self.enquete.pk])
+
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data['total_votos'], 4)
+        self.assertEqual(resposta.data['lider'], self.a.id)
+        self.assertFalse(resposta.data['empate'])
+        self.assertEqual([o['percentual'] for o in resposta.data['opcoes']], [75.0, 25.0, 0.0])
+        self.assertEqual(len(consultas), 2)
+        self.assertFalse(any('enquete_voto' in c['sql'] for c in consultas.captured_queries))
+
+    def test_resultados_em_lote_na_ordem_pedida(self):
+        empatada = criar_enquete(titulo='Empatada', opcoes=('X', 'Y'))
+        x, y = empatada.opcoes.all()
+        registrar_voto(empatada, x.id, 'p1')
+        registrar_voto(empatada, y.id, 'p2')
+        sem_votos = criar_enquete(titulo='Sem votos')
+        url = reverse('enquete:enquete-resultados-em-lote')
+
+        resposta = self.client.get(url, {'ids': f'{sem_votos.pk},999999,{empatada.pk},{self.enquete.pk}'})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([r['id'] for r in resposta.data], [sem_votos.pk, empatada.pk, self.enquete.pk])
+        self.assertEqual((resposta.data[0]['lider'], resposta.data[0]['empate']), (None, False))
+        self.assertEqual((resposta.data[1]['lider'], resposta.data[1]['empate']), (None, True))
+        self.assertEqual(self.client.get(url, {'ids': '1,abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(reverse('enquete:enquete-resultados', args=[999999])).status_code, 404)
+
+
+class LinhaDoTempoTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.enquete = criar_enquete()
+        self.a, self.b, _ = self.enquete.opcoes.all()
+        self.t0 = timezone.now().replace(second=0, microsecond=0) - timedelta(hours=2, minutes=30)
+        self.url = reverse('enquete:enquete-linha-do-tempo', args=[self.enquete.pk])
+
+    def votar(self, opcao, participante, instante):
+        voto, _ = registrar_voto(self.enquete, opcao.id, participante)
+        Voto.objects.filter(pk=voto.pk).update(data_voto=instante)
+
+    def test_intervalos_incorporados_somados_a_cauda(self):
+        self.votar(self.a, 'p1', self.t0 + timedelta(seconds=5))
+        self.votar(self.a, 'p2', self.t0 + timedelta(seconds=50))
+        self.votar(self.b, 'p3', self.t0 + timedelta(seconds=59))
+        self.votar(self.a, 'p4', self.t0 + timedelta(minutes=1, seconds=1))
+
+        self.assertEqual(atualizar_intervalos(atraso=0), 4)
+        self.assertEqual(atualizar_intervalos(atraso=0), 0)
+        self.assertEqual(VotosPorIntervalo.objects.count(), 3)
+        # Cauda: ainda não incorporado, mas já aparece
+        self.votar(self.b, 'p5', self.t0 + timedelta(minutes=1, seconds=30))
+
+        inicio = (self.t0 - timedelta(minutes=5)).isoformat()
+        resposta = self.client.get(self.url, {'inicio': inicio})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(
+            [(i['inicio'], i['total'], i['votos']) for i in resposta.data['intervalos']],
+            [(self.t0, 3, {self.a.id: 2, self.b.id: 1}),
+             (self.t0 + timedelta(minutes=1), 2, {self.a.id: 1, self.b.id: 1})]
+        )
+
+        por_hora = self.client.get(self.url, {'resolucao': 'hora', 'inicio': inicio})
+        self.assertEqual(sum(i['total'] for i in por_hora.data['intervalos']), 5)
+        self.assertEqual(self.client.get(self.url, {'resolucao': 'segundo'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'inicio': 'ontem'}).status_code, 400)
+
+    def test_voto_que_aparece_depois_da_marca_e_incorporado(self):
+        self.votar(self.a, 'p1', self.t0)
+        self.votar(self.b, 'p2', self.t0)
+        self.votar(self.a, 'p3', self.t0)
+        # O voto do meio simula uma transação que só termina depois da marca passar por ele
+        atrasado = Voto.objects.get(id_participante='p2')
+        Voto.objects.filter(pk=atrasado.pk).delete()
+
+        # A marca espera na lacuna, sem guardar o id
+        self.assertEqual(atualizar_intervalos(atraso=0), 1)
+        marca = MarcaDagua.objects.get(nome=MARCA_INTERVALOS)
+        self.assertEqual(marca.ultimo_id, Voto.objects.get(id_participante='p1').id)
+        self.assertEqual(marca.lacunas_ate, Voto.objects.latest('id').id)
+
+        atrasado.save(force_insert=True)
+        Voto.objects.filter(pk=atrasado.pk).update(data_voto=self.t0)
+        inicio = self.t0 - timedelta(minutes=5)
+        # Antes de incorporado, o voto já entra pela cauda
+        self.assertEqual(linha_do_tempo(self.enquete.pk, inicio, timezone.now())[0]['total'], 3)
+
+        self.assertEqual(atualizar_intervalos(atraso=0), 2)
+        marca = MarcaDagua.objects.get(nome=MARCA_INTERVALOS)
+        self.assertEqual((marca.ultimo_id, marca.lacunas_desde), (Voto.objects.latest('id').id, None))
+        self.assertEqual(linha_do_tempo(self.enquete.pk, inicio, timezone.now())[0]['votos'], {
+            self.a.id: 2, self.b.id: 1
+        })
+
+        # Uma lacuna que nunca aparece vence, e a marca passa dela
+        self.votar(self.a, 'p4', self.t0)
+        self.votar(self.b, 'p5', self.t0)
+        Voto.objects.filter(id_participante='p4').delete()
+        self.assertEqual(atualizar_intervalos(atraso=0), 0)
+        with override_settings(ENQUETE_MARCA_LACUNA_VALIDADE=0):
+            self.assertEqual(atualizar_intervalos(atraso=0), 1)
+        marca = MarcaDagua.objects.get(nome=MARCA_INTERVALOS)
+        self.assertEqual((marca.ultimo_id, marca.lacunas_desde), (Voto.objects.latest('id').id, None))
+
+    def test_arquivamento_e_expurgo_cuidam_dos_intervalos(self):
+        self.votar(self.a, 'p1', self.t0)
+        self.votar(self.b, 'p2', self.t0)
+        Enquete.objects.filter(pk=self.enquete.pk).update(expires_at=self.t0 + timedelta(hours=1))
+
+        arquivar_enquete(self.enquete.pk)
+
+        self.assertFalse(Voto.objects.exists())
+        self.assertEqual(sum(VotosPorIntervalo.objects.values_list('votos', flat=True)), 2)
+
+        Enquete.objects.filter(pk=self.enquete.pk).update(delete_at=self.t0)
+        MotorExpurgo().executar()
+
+        self.assertFalse(VotosPorIntervalo.objects.exists())
+
+
+@override_settings(ENQUETE_CACHE_PAYLOADS=True)
+class CachePayloadsTests(TestCase):
+    def setUp(self):
+        # Contagens de outros testes, ainda na memória do processo, não entram nestes
+        cache_enquetes.contadores.descarregar()
+        cache.clear()
+        self.client = APIClient()
+        self.enquete = criar_enquete()
+        self.opcao = self.enquete.opcoes.first()
+        self.url = reverse('enquete:enquete-detail', args=[self.enquete.pk])
+
+    def test_retrieve_servido_do_cache_lendo_so_o_estado(self):
+        self.client.get(self.url)
+
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(self.url)
+
+        self.assertEqual(len(consultas.captured_queries), 1)
+        self.assertNotIn('texto_opcao', consultas.captured_queries[0]['sql'])
+
+        self.assertEqual(resposta.data['titulo'], self.enquete.titulo)
+        # As contagens ficam na memória do processo até a descarga
+        self.assertIsNone(cache.get(cache_enquetes.CHAVE_ACERTOS))
+        estatisticas = cache_enquetes.estatisticas()
+        self.assertEqual((estatisticas['acertos'], estatisticas['falhas']), (1, 1))
+
+    def test_list_busca_apenas_os_ids_quando_tudo_esta_em_cache(self):
+        criar_enquete(titulo='Segunda')
+        lista = reverse('enquete:enquete-list')
+        primeira = self.client.get(lista).data
+
+        with self.assertNumQueries(1):
+            segunda = self.client.get(lista).data
+
+        self.assertEqual(primeira, segunda)
+
+    def test_voto_invalida_o_payload(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('enquete:enquete-votar', args=[self.enquete.pk]),
+                {'id_opcao': self.opcao.id, 'id_participante': 'p1'}, format='json'
+            )
+
+        votos = {o['id']: o['votos'] for o in self.client.get(self.url).data['opcoes']}
+        self.assertEqual(votos[self.opcao.id], 1)
+
+    def test_voto_entre_a_leitura_e_o_set_nao_deixa_payload_velho(self):
+        guardar_payloads = cache_enquetes.guardar_payloads
+
+        def concorrente(*args):
+            # O voto é confirmado depois de o payload ser lido, antes do set
+            registrar_voto(self.enquete, self.opcao.id, 'p1')
+            guardar_payloads(*args)
+
+        with mock.patch.object(cache_enquetes, 'guardar_payloads', side_effect=concorrente):
+            self.client.get(self.url)
+
+        votos = {o['id']: o['votos'] for o in self.client.get(self.url).data['opcoes']}
+        self.assertEqual(votos[self.opcao.id], 1)
+
+    def test_edicao_invalida_o_payload(self):
+        self.client.get(self.url)
+        self.client.patch(self.url, {'titulo': 'Novo título'}, format='json')
+
+        self.assertEqual(self.client.get(self.url).data['titulo'], 'Novo título')
+
+
+class RequisicaoCondicionalTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.enquete = criar_enquete()
+        self.opcao = self.enquete.opcoes.first()
+        self.url = reverse('enquete:enquete-detail', args=[self.enquete.pk])
+
+    def test_retrieve_responde_304_lendo_so_a_versao(self):
+        resposta = self.client.get(self.url)
+        # Aberta: sem instante do último voto, só o ETag revalida
+        self.assertNotIn('Last-Modified', resposta)
+
+        with self.assertNumQueries(1):
+            condicional = self.client.get(self.url, HTTP_IF_NONE_MATCH=resposta['ETag'])
+
+        self.assertEqual(condicional.status_code, 304)
+        self.assertEqual(condicional['ETag'], resposta['ETag'])
+        self.assertEqual(condicional.content, b'')
+
+    def test_voto_e_edicao_trocam_o_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('enquete:enquete-votar', args=[self.enquete.pk]),
+                {'id_opcao': self.opcao.id, 'id_participante': 'p1'}, format='json'
+            )
+        # O voto não escreve na linha da enquete: o ETag muda pelo total de votos
+        self.assertFalse(any(c['sql'].startswith('UPDATE "enquete_enquete"') for c in consultas.captured_queries))
+
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        # A versão fica nos validadores, fora do corpo
+        self.assertNotIn('versao', resposta.data)
+        self.assertNotIn('atualizada_em', resposta.data)
+
+        self.client.patch(self.url, {'titulo': 'Novo título'}, format='json')
+        self.assertEqual(Enquete.objects.get(pk=self.enquete.pk).versao, 2)
+        self.assertNotEqual(self.client.get(self.url)['ETag'], resposta['ETag'])
+
+    def test_encerrada_tem_last_modified(self):
+        Enquete.objects.filter(pk=self.enquete.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        resposta = self.client.get(self.url)
+
+        condicional = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=resposta['Last-Modified'])
+        self.assertEqual(condicional.status_code, 304)
+
+    def test_lista_responde_304_sem_buscar_opcoes(self):
+        lista = reverse('enquete:enquete-list') + '?limit=10'
+        etag = self.client.get(lista)['ETag']
+
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(lista, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resposta.status_code, 304)
+        self.assertFalse(any('texto_opcao' in c['sql'] for c in consultas.captured_queries))
+
+        criar_enquete(titulo='Nova')
+        self.assertEqual(self.client.get(lista, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class StreamingTests(TestCase):
+    def setUp(self):
+        self.enquete = criar_enquete()
+        self.opcao = self.enquete.opcoes.first()
+
+    async def test_rajada_de_votos_gera_uma_atualizacao_por_intervalo(self):
+        broker = BrokerEmProcesso()
+        difusor = Difusor(broker, intervalo=0.2)
+        fluxo = difusor.assinar(self.enquete.id, heartbeat=5)
+        inicial = await fluxo.__anext__()
+        self.assertEqual(inicial['total_votos'], 0)
+
+        await sync_to_async(registrar_voto)(self.enquete, self.opcao.id, 'p1')
+        for _ in range(50):
+            broker.publicar(_canal(self.enquete.id), 'votos')
+
+        placar = await asyncio.wait_for(fluxo.__anext__(), 1)
+        self.assertEqual(placar['total_votos'], 1)
+
+        # A rajada inteira foi agrupada em uma leitura: não há segunda atualização
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(fluxo.__anext__(), 0.5)
+        await fluxo.aclose()
+        self.assertFalse(difusor._acompanhamentos)
+
+    async def test_placar_inicial_lido_depois_da_inscricao(self):
+        class BrokerLento(BrokerEmProcesso):
+            async def assinar(self, canal, ao_inscrever):
+                await asyncio.sleep(0.3)
+                async for mensagem in super().assinar(canal, ao_inscrever):
+                    yield mensagem
+
+        broker = BrokerLento()
+        fluxo = Difusor(broker, intervalo=0.1).assinar(self.enquete.id, heartbeat=5)
+        inicial = asyncio.ensure_future(fluxo.__anext__())
+
+        # Voto publicado antes de a assinatura existir: o aviso se perde
+        await asyncio.sleep(0.1)
+        await sync_to_async(registrar_voto)(self.enquete, self.opcao.id, 'p1')
+        broker.publicar(_canal(self.enquete.id), 'votos')
+
+        self.assertEqual((await asyncio.wait_for(inicial, 2))['total_votos'], 1)
+        await fluxo.aclose()
+
+    async def test_falha_ao_ler_o_placar_nao_encerra_o_acompanhamento(self):
+        broker = BrokerEmProcesso()
+        fluxo = Difusor(broker, intervalo=0.1).assinar(self.enquete.id, heartbeat=5)
+        await fluxo.__anext__()
+
+        falhas = [OperationalError('conexão perdida')]
+
+        def placar_instavel(id_enquete):
+            if falhas:
+                raise falhas.pop()
+            return placar(id_enquete)
+
+        await sync_to_async(registrar_voto)(self.enquete, self.opcao.id, 'p1')
+        with mock.patch('enquete.streaming.placar', side_effect=placar_instavel):
+            with self.assertLogs('enquete.streaming', 'ERROR'):
+                broker.publicar(_canal(self.enquete.id), 'votos')
+                atualizado = await asyncio.wait_for(fluxo.__anext__(), 2)
+
+        self.assertEqual(atualizado['total_votos'], 1)
+        await fluxo.aclose()
+
+    def test_sob_wsgi_responde_so_o_placar_atual(self):
+        resposta = self.client.get(reverse('enquete:enquete-stream', args=[self.enquete.id]))
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertFalse(resposta.streaming)
+        self.assertTrue(resposta.content.startswith(b'retry: '))
+        self.assertIn(b'event: placar', resposta.content)
+
+    async def test_stream_de_enquete_inexistente_retorna_404(self):
+        resposta = await self.async_client.get(
+            reverse('enquete:enquete-stream', args=[self.enquete.id + 1000])
+        )
+        self.assertEqual(resposta.status_code, 404)
+
+
+class ViewsAssincronasTests(TestCase):
+    def setUp(self):
+        self.enquete = criar_enquete()
+        criar_enquete(titulo='Segunda')
+        criar_enquete(titulo='Terceira')
+        self.opcao = self.enquete.opcoes.first()
+        self.fabrica = AsyncRequestFactory()
+
+    async def test_leituras_iguais_as_da_viewset(self):
+        detalhe = reverse('enquete:enquete-detail', args=[self.enquete.pk])
+        lista = reverse('enquete:enquete-list') + '?limit=2'
+        sincrono_detalhe = await sync_to_async(APIClient().get)(detalhe)
+        sincrono_lista = await sync_to_async(APIClient().get)(lista)
+
+        resposta = await assincrono.detalhar_enquete(self.fabrica.get(detalhe), pk=self.enquete.pk)
+        self.assertEqual(resposta.content, sincrono_detalhe.content)
+        self.assertEqual(resposta['ETag'], sincrono_detalhe['ETag'])
+
+        resposta = await assincrono.listar_enquetes(self.fabrica.get(lista))
+        self.assertEqual(resposta.content, sincrono_lista.content)
+
+        condicional = self.fabrica.get(lista, headers={'If-None-Match': resposta['ETag']})
+        self.assertEqual((await assincrono.listar_enquetes(condicional)).status_code, 304)
+
+    async def test_voto_com_mesmos_status_da_viewset(self):
+        url = reverse('enquete:enquete-votar', args=[self.enquete.pk])
+
+        async def votar(dados):
+            requisicao = self.fabrica.post(url, dados, content_type='application/json')
+            return await assincrono.votar_enquete(requisicao, pk=self.enquete.pk)
+
+        resposta = await votar({'id_opcao': self.opcao.id, 'id_participante': 'p1'})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(json.loads(resposta.content)['opcoes'][0]['votos'], 1)
+
+        self.assertEqual((await votar({'id_opcao': self.opcao.id, 'id_participante': 'p1'})).status_code, 409)
+        self.assertEqual((await votar({'id_participante': 'p2'})).status_code, 400)
+        self.assertEqual((await votar({'id_opcao': 0, 'id_participante': 'p2'})).status_code, 400)
+
+
+    def test_cadeia_de_middlewares_sem_adaptacao_sob_asgi(self):
+        from django.conf import settings
+        from django.core.handlers.asgi import ASGIHandler
+        # Como no asgi.py: sem o middleware do WhiteNoise, nenhum middleware é
+        # adaptado e a requisição não passa por uma thread (o Django só
+        # registra a adaptação com DEBUG)
+        sem_whitenoise = [m for m in settings.MIDDLEWARE if not m.startswith('whitenoise.')]
+        with override_settings(DEBUG=True, MIDDLEWARE=sem_whitenoise), self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+        with override_settings(DEBUG=True, MIDDLEWARE=['whitenoise.middleware.WhiteNoiseMiddleware', *sem_whitenoise]), \
+                self.assertLogs('django.request', 'DEBUG') as logs:
+            ASGIHandler()
+        self.assertIn('adapted for middleware whitenoise', logs.output[0])
+
+class PaginacaoCursorTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        agora = timezone.now()
+        self.abertas = [criar_enquete(titulo=f'Aberta {i}') for i in range(3)]
+        self.encerradas = [criar_enquete(titulo=f'Encerrada {i}', horas=-1) for i in range(3)]
+        for i, enquete in enumerate(self.abertas + self.encerradas):
+            Enquete.objects.filter(pk=enquete.pk).update(data_criacao=agora - timedelta(minutes=i))
+
+    def paginas(self, url):
+        ids = []
+        while url:
+            resposta = self.client.get(url)
+            self.assertNotIn('count', resposta.data)
+            ids += [enquete['id'] for enquete in resposta.data['results']]
+            url = resposta.data['next']
+            if len(ids) == 2:
+                criar_enquete(titulo='Criada no meio da navegação')
+        return ids
+
+    def test_abertas_primeiro_sem_repetir_nem_pular(self):
+        ids = self.paginas(reverse('enquete:enquete-list') + '?paginacao=cursor&limit=2')
+
+        esperados = [e.pk for e in self.abertas + self.encerradas]
+        self.assertEqual(ids, esperados)
+
+    def test_pagina_sem_consulta_de_contagem(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('enquete:enquete-list') + '?paginacao=cursor&limit=2')
+
+        self.assertFalse(any('COUNT(' in c['sql'].upper() for c in consultas.captured_queries))
+
+    def test_cursor_invalido_retorna_404(self):
+        resposta = self.client.get(reverse('enquete:enquete-list') + '?cursor=invalido')
+        self.assertEqual(resposta.status_code, 404)
+
+
+class CriacaoEmLoteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('enquete:enquete-criar-em-lote')
+
+    def item(self, titulo, opcoes=('Sim', 'Não')):
+        return {'titulo': titulo, 'duracao_horas': 24, 'opcoes_input': list(opcoes)}
+
+    def test_cria_todas_as_enquetes_e_opcoes(self):
+        itens = [self.item(f'Enquete {i}', opcoes=('A', 'B', 'C')) for i in range(20)]
+
+        resposta = self.client.post(self.url, itens, format='json')
+
+        self.assertEqual(resposta.status_code, 201)
+        self.assertEqual(len(resposta.data), 20)
+        self.assertEqual(Enquete.objects.count(), 20)
+        self.assertEqual(Opcao.objects.count(), 60)
+        self.assertEqual([o['texto_opcao'] for o in resposta.data[0]['opcoes']], ['A', 'B', 'C'])
+
+    def test_item_invalido_nao_cria_nada_e_aponta_o_erro(self):
+        itens = [self.item('Válida'), {'titulo': 'Sem duração', 'opcoes_input': ['A']}]
+
+        resposta = self.client.post(self.url, itens, format='json')
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(resposta.data[0], {})
+        self.assertIn('duracao_horas', resposta.data[1])
+        self.assertFalse(Enquete.objects.exists())
+
+    def test_criacao_individual_insere_opcoes_de_uma_vez(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.post(
+                reverse('enquete:enquete-list'), self.item('Única', opcoes='ABCDEF'), format='json'
+            )
+
+        self.assertEqual(resposta.status_code, 201)
+        inserts = [c for c in consultas.captured_queries if c['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+
+
+class VotoEmLoteTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('enquete:enquete-votar-em-lote')
+        self.enquete = criar_enquete()
+        self.outra = criar_enquete(titulo='Outra', opcoes=('X', 'Y'))
+        self.a, self.b, _ = self.enquete.opcoes.all()
+        self.x = self.outra.opcoes.first()
+
+    def test_resultado_por_item_e_contadores_agregados(self):
+        registrar_voto(self.enquete, self.a.id, 'ja_votou')
+        encerrada = criar_enquete(titulo='Encerrada', horas=-1)
+        itens = [
+            {'id_opcao': self.a.id, 'id_participante': 'p1'},
+            {'id_opcao': self.b.id, 'id_participante': 'p2'},
+            {'id_opcao': self.x.id, 'id_participante': 'p1'},
+            {'id_opcao': self.b.id, 'id_participante': 'p1'},
+            {'id_opcao': self.a.id, 'id_participante': 'ja_votou'},
+            {'id_opcao': 999999, 'id_participante': 'p3'},
+            {'id_opcao': encerrada.opcoes.first().id, 'id_participante': 'p4'},
+            {'id_participante': 'p5'},
+        ]
+
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True):
+            resposta = self.client.post(self.url, itens, format='json')
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(
+            [r['resultado'] for r in resposta.data['resultados']],
+            ['aceito', 'aceito', 'aceito', 'duplicado', 'duplicado', 'invalido', 'invalido', 'invalido']
+        )
+        self.assertEqual(
+            (resposta.data['aceitos'], resposta.data['duplicados'], resposta.data['invalidos']), (3, 2, 3)
+        )
+        self.assertIn('id_opcao', resposta.data['resultados'][7]['erro'])
+        self.assertEqual(Voto.objects.count(), 4)
+        self.assertEqual(
+            dict(Opcao.objects.filter(votos__gt=0).values_list('id', 'votos')),
+            {self.a.id: 2, self.b.id: 1, self.x.id: 1}
+        )
+        updates = [c for c in consultas.captured_queries if c['sql'].startswith('UPDATE "enquete_opcao"')]
+        self.assertEqual(len(updates), 1)
+        self.enquete.refresh_from_db()
+        self.assertEqual(self.enquete.versao, 1)
+
+    def test_participante_gravado_durante_o_lote_vira_duplicado(self):
+        # Outro voto do mesmo participante entra entre a conferência e o INSERT
+        Voto.objects.create(enquete=self.enquete, opcao_escolhida=self.b, id_participante='p1')
+        conferencia = [Voto.objects.none()]
+        votos_existentes = votacao._votos_existentes
+
+        def antes_do_concorrente(chaves):
+            return conferencia.pop() if conferencia else votos_existentes(chaves)
+
+        with mock.patch.object(votacao, '_votos_existentes', side_effect=antes_do_concorrente):
+            resposta = self.client.post(self.url, [
+                {'id_opcao': self.a.id, 'id_participante': 'p1'},
+                {'id_opcao': self.a.id, 'id_participante': 'p2'},
+            ], format='json')
+
+        self.assertEqual([r['resultado'] for r in resposta.data['resultados']], ['duplicado', 'aceito'])
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.votos, 1)
+
+    @override_settings(ENQUETE_LOTE_VOTOS_MAXIMO=2)
+    def test_lote_acima_do_limite_ou_fora_de_lista_retorna_400(self):
+        item = {'id_opcao': self.a.id, 'id_participante': 'p1'}
+
+        self.assertEqual(self.client.post(self.url, [item] * 3, format='json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, item, format='json').status_code, 400)
+        self.assertFalse(Voto.objects.exists())
+
+
+class ExportacaoTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client = APIClient()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        self.enquete = criar_enquete()
+        self.a, self.b, _ = self.enquete.opcoes.all()
+        for i in range(30):
+            registrar_voto(self.enquete, (self.a, self.b)[i % 2].id, f'participante "{i}"')
+        self.url = reverse('enquete:enquete-exportar', args=[self.enquete.pk])
+
+    def baixar(self, url, **extra):
+        resposta = self.client.get(url, **extra)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.streaming)
+        conteudo = b''.join(resposta.streaming_content)
+        if resposta.get('Content-Encoding') == 'gzip':
+            conteudo = gzip.decompress(conteudo)
+        return resposta, conteudo.decode()
+
+    def test_votos_em_csv_e_ndjson(self):
+        _, texto = self.baixar(self.url)
+        linhas = list(csv.reader(texto.splitlines()))
+        self.assertEqual(linhas[0], ['id_participante', 'id_opcao', 'texto_opcao', 'data_voto'])
+        self.assertEqual(len(linhas), 31)
+        self.assertEqual(linhas[1][:3], ['participante "0"', str(self.a.id), 'A'])
+
+        resposta, texto = self.baixar(self.url + '?formato=ndjson', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(resposta['Content-Encoding'], 'gzip')
+        votos = [json.loads(linha) for linha in texto.splitlines()]
+        self.assertEqual(len(votos), 30)
+        self.assertEqual(votos[-1]['id_participante'], 'participante "29"')
+        self.assertEqual(votos[-1]['texto_opcao'], 'B')
+
+        self.assertEqual(self.client.get(self.url + '?formato=xml').status_code, 400)
+
+    def test_so_administradores_exportam(self):
+        from django.contrib.auth.models import User
+        anonimo = APIClient()
+        self.assertEqual(anonimo.get(self.url).status_code, 403)
+        self.assertEqual(anonimo.get(reverse('enquete:enquete-exportar-resultados')).status_code, 403)
+
+        anonimo.force_login(User.objects.create_user('eleitor', 'eleitor@exemplo.com', 'senha'))
+        self.assertEqual(anonimo.get(self.url).status_code, 403)
+
+    def test_gzip_recusado_com_q_zero(self):
+        resposta, texto = self.baixar(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', resposta)
+        self.assertEqual(len(texto.splitlines()), 31)
+
+        self.assertTrue(aceita_gzip('br, *;q=0.5'))
+        self.assertFalse(aceita_gzip('*, gzip; q=0'))
+        self.assertTrue(aceita_gzip('GZIP;Q=0.1'))
+        self.assertFalse(aceita_gzip(''))
+
+    def test_saida_em_blocos_e_enquete_arquivada(self):
+        for i in range(30, 2000):
+            Voto.objects.create(enquete=self.enquete, opcao_escolhida=self.a, id_participante=f'p{i:05d}' * 8)
+        Enquete.objects.filter(pk=self.enquete.pk).update(expires_at=timezone.now() - timedelta(hours=1))
+        arquivar_enquete(self.enquete.pk)
+
+        resposta = self.client.get(self.url)
+        blocos = list(resposta.streaming_content)
+        self.assertGreater(len(blocos), 1)
+        self.assertTrue(all(len(bloco) < 2 * TAMANHO_BLOCO for bloco in blocos))
+        linhas = b''.join(blocos).decode().splitlines()
+        self.assertEqual(len(linhas), 2001)
+        self.assertTrue(linhas[1].startswith('"participante ""0"""'))
+
+    def test_resumo_de_varias_enquetes(self):
+        outra = criar_enquete(titulo='Outra', opcoes=('X',))
+        criar_enquete(titulo='Encerrada', horas=-1)
+
+        _, texto = self.baixar(reverse('enquete:enquete-exportar-resultados') + '?status=Aberta&formato=ndjson')
+        linhas = [json.loads(linha) for linha in texto.splitlines()]
+        self.assertEqual(
+            [(linha['id_enquete'], linha['texto_opcao'], linha['votos']) for linha in linhas],
+            [(self.enquete.id, 'A', 15), (self.enquete.id, 'B', 15), (self.enquete.id, 'C', 0), (outra.id, 'X', 0)]
+        )
+
+        _, texto = self.baixar(reverse('enquete:enquete-exportar-resultados') + f'?ids={outra.id}')
+        self.assertEqual(texto.splitlines(), [
+            'id_enquete,titulo,id_opcao,texto_opcao,votos', f'{outra.id},Outra,{outra.opcoes.get().id},X,0'
+        ])
+
+
+class ExpurgoTests(TestCase):
+    def setUp(self):
+        self.expiradas = [criar_enquete(titulo=f'Expirada {i}') for i in range(3)]
+        self.ativa = criar_enquete(titulo='Ativa')
+        for enquete in self.expiradas + [self.ativa]:
+            opcao = enquete.opcoes.first()
+            Voto.objects.bulk_create([
+                Voto(enquete=enquete, opcao_escolhida=opcao, id_participante=f'p{i}') for i in range(5)
+            ])
+        Enquete.objects.filter(pk__in=[e.pk for e in self.expiradas]).update(
+            delete_at=timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_expurga_em_lotes_e_registra_cada_lote(self):
+        execucao = MotorExpurgo(tamanho_lote=2, tamanho_lote_votos=3).executar()
+
+        self.assertEqual(execucao.status, ExecucaoExpurgo.CONCLUIDA)
+        self.assertEqual(list(Enquete.objects.values_list('pk', flat=True)), [self.ativa.pk])
+        self.assertEqual(Voto.objects.count(), 5)
+        self.assertEqual(Opcao.objects.count(), 3)
+        self.assertEqual(
+            (execucao.enquetes_removidas, execucao.opcoes_removidas, execucao.votos_removidos),
+            (3, 9, 15)
+        )
+        self.assertEqual([lote['enquetes'] for lote in execucao.lotes], [2, 1])
+
+    def test_cada_fatia_de_votos_renova_o_sinal_de_vida(self):
+        execucao = ExecucaoExpurgo.objects.create(corte=timezone.now())
+        motor = MotorExpurgo(tamanho_lote_votos=3)
+        motor._inicio = time.monotonic()
+
+        with CaptureQueriesContext(connection) as consultas:
+            motor.expurgar_lote(execucao, [self.expiradas[0].pk])
+        # Duas fatias (3 + 2 votos), cada uma com o seu sinal de vida, e o registro do lote
+        atualizacoes = [c for c in consultas.captured_queries if c['sql'].startswith('UPDATE "enquete_execucaoexpurgo"')]
+        self.assertEqual(len(atualizacoes), 3)
+
+    def test_dependentes_lidos_do_meta(self):
+        self.assertEqual(
+            {modelo for modelo, _ in dependentes_das_enquetes()},
+            {ArquivoVotos, ConferenciaPendente, VotosPorIntervalo}
+        )
+        self.assertEqual({modelo for modelo, _ in dependentes_das_opcoes()}, {ContadorOpcao, VotosPorIntervalo})
+
+    def test_orcamento_esgotado_interrompe_e_permite_retomar(self):
+        execucao = MotorExpurgo(orcamento_segundos=0).executar()
+
+        self.assertEqual(execucao.status, ExecucaoExpurgo.INTERROMPIDA)
+        self.assertEqual(Enquete.objects.count(), 4)
+
+        execucao = MotorExpurgo().executar(execucao)
+        self.assertEqual(execucao.status, ExecucaoExpurgo.CONCLUIDA)
+        self.assertEqual(execucao.enquetes_removidas, 3)
+
+    def test_retomar_continua_execucao_com_falha_ou_abandonada(self):
+        falhou = ExecucaoExpurgo.objects.create(corte=timezone.now(), status=ExecucaoExpurgo.FALHOU, erro='x')
+        call_command('expurgar_enquetes', '--retomar', stdout=StringIO())
+
+        falhou.refresh_from_db()
+        self.assertEqual((falhou.status, falhou.erro, falhou.enquetes_removidas), (ExecucaoExpurgo.CONCLUIDA, '', 3))
+        self.assertEqual(ExecucaoExpurgo.objects.count(), 1)
+
+        # Processo encerrado no meio: continua "executando", mas sem progresso há tempo demais
+        abandonada = ExecucaoExpurgo.objects.create(
+            corte=timezone.now(), atualizada_em=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(iniciar_execucao(retomar=True), (abandonada, True))
+
+    def test_nao_inicia_com_outra_em_andamento(self):
+        andamento = ExecucaoExpurgo.objects.create(corte=timezone.now())
+
+        self.assertEqual(disparar_em_segundo_plano(), (andamento, False))
+        with self.assertRaises(CommandError):
+            call_command('expurgar_enquetes', stdout=StringIO())
+        self.assertEqual(ExecucaoExpurgo.objects.count(), 1)
+        self.assertEqual(Enquete.objects.count(), 4)
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+        self.enquete = criar_enquete(titulo='Eleição do grêmio')
+        self.outra = criar_enquete(titulo='Outra')
+
+    def votar(self, quantidade, enquete=None):
+        enquete = enquete or self.enquete
+        opcao = enquete.opcoes.first()
+        Voto.objects.bulk_create(
+            Voto(enquete=enquete, opcao_escolhida=opcao, id_participante=f'{enquete.id}-{i}')
+            for i in range(Voto.objects.filter(enquete=enquete).count(), quantidade)
+        )
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta, len(consultas)
+
+    def test_changelists_com_consultas_limitadas(self):
+        urls = (
+            reverse('admin:enquete_voto_changelist'),
+            reverse('admin:enquete_voto_changelist') + f'?enquete={self.enquete.id}',
+            reverse('admin:enquete_voto_changelist') + '?enquete=grêmio&q=1-3',
+            reverse('admin:enquete_opcao_changelist'),
+        )
+        self.votar(5)
+        antes = [self.consultas(url)[1] for url in urls]
+        self.votar(60)
+        self.votar(30, self.outra)
+        for url, quantidade in zip(urls, antes):
+            self.assertEqual(self.consultas(url)[1], quantidade, url)
+
+    def test_filtro_por_enquete_busca_sem_listar_todas(self):
+        self.votar(3)
+        self.votar(2, self.outra)
+
+        resposta, _ = self.consultas(reverse('admin:enquete_voto_changelist') + '?enquete=grêmio')
+        self.assertEqual(resposta.context['cl'].result_count, 3)
+        self.assertContains(resposta, f'#{self.enquete.id} Eleição do grêmio')
+        self.assertNotContains(resposta, f'#{self.outra.id} Outra')
+
+        busca = self.client.get(reverse('admin:enquete_voto_changelist') + f'?q={self.outra.id}-1')
+        self.assertEqual(busca.context['cl'].result_count, 1)
+
+    @override_settings(ENQUETE_ADMIN_CONTAGEM_MAXIMA=4)
+    def test_contagem_limitada(self):
+        self.votar(10)
+
+        resposta, _ = self.consultas(reverse('admin:enquete_voto_changelist'))
+        self.assertEqual(resposta.context['cl'].result_count, 4)
+
+
+class ArquivamentoTests(TestCase):
+    def setUp(self):
+        self.enquete = criar_enquete()
+        self.opcoes = list(self.enquete.opcoes.all())
+        for i in range(10):
+            registrar_voto(self.enquete, self.opcoes[i % 2].id, f'participante,{i}')
+        Enquete.objects.filter(pk=self.enquete.pk).update(expires_at=timezone.now() - timedelta(hours=1))
+
+    def test_move_votos_para_o_arquivo_e_congela_totais(self):
+        self.assertEqual(list(enquetes_para_arquivar()), [self.enquete])
+
+        arquivo = arquivar_enquete(self.enquete.pk)
+
+        self.assertEqual(Enquete.objects.get(pk=self.enquete.pk).versao, self.enquete.versao + 1)
+        self.assertEqual(arquivo.total_votos, 10)
+        self.assertGreater(arquivo.bytes_liberados, 0)
+        self.assertFalse(Voto.objects.filter(enquete=self.enquete).exists())
+        self.assertEqual([o.votos for o in Opcao.objects.filter(enquete=self.enquete)], [5, 5, 0])
+
+        votos = list(ler_votos_arquivados(arquivo, tamanho_pedaco=16))
+        self.assertEqual(len(votos), 10)
+        self.assertEqual(votos[0][:2], ('participante,0', self.opcoes[0].id))
+        self.assertIsNone(arquivar_enquete(self.enquete.pk))
+
+    def test_votos_apagados_em_fatias_fora_da_transacao_do_arquivo(self):
+        with CaptureQueriesContext(connection) as consultas:
+            arquivo = arquivar_enquete(self.enquete.pk, tamanho_fatia=3)
+
+        self.assertEqual(arquivo.total_votos, 10)
+        self.assertFalse(Voto.objects.filter(enquete=self.enquete).exists())
+        apagados = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('DELETE FROM "enquete_voto"')]
+        # A cauda ainda não incorporada pela linha do tempo (toda, aqui) sai com o arquivo; nada sobra para as fatias
+        self.assertEqual(len(apagados), 1)
+
+        # Uma execução interrompida depois do arquivo deixa votos: a seguinte os apaga, sem outro arquivo
+        outra = criar_enquete()
+        for i in range(7):
+            registrar_voto(outra, outra.opcoes.first().id, f'p{i}')
+        Enquete.objects.filter(pk=outra.pk).update(arquivada_em=timezone.now())
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertIsNone(arquivar_enquete(outra.pk, tamanho_fatia=3))
+        self.assertFalse(Voto.objects.filter(enquete=outra).exists())
+        apagados = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith('DELETE FROM "enquete_voto"')]
+        self.assertEqual(len(apagados), 3)
+
+    def test_enquete_arquivada_recusa_voto_sem_consultar_votos(self):
+        arquivar_enquete(self.enquete.pk)
+        Enquete.objects.filter(pk=self.enquete.pk).update(expires_at=timezone.now() + timedelta(hours=1))
+        self.enquete.refresh_from_db()
+
+        with self.assertNumQueries(0), self.assertRaises(EnqueteEncerrada):
+            registrar_voto(self.enquete, self.opcoes[0].id, 'participante,0')
+
+
+class ReconciliacaoTests(TestCase):
+    def setUp(self):
+        self.enquete = criar_enquete()
+        self.opcoes = list(self.enquete.opcoes.all())
+        for i in range(6):
+            registrar_voto(self.enquete, self.opcoes[i % 2].id, f'participante{i}')
+        self.outra = criar_enquete(titulo='Outra')
+        registrar_voto(self.outra, self.outra.opcoes.first().id, 'participante0')
+        Opcao.objects.filter(pk=self.opcoes[0].pk).update(votos=7)
+        ContadorOpcao.objects.create(opcao=self.opcoes[1], slot=0, votos=2)
+
+    def reconciliar(self, *args, **opcoes):
+        saida = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconciliar_contadores', *args, atraso=0, stdout=saida, **opcoes)
+        return saida.getvalue()
+
+    def test_dry_run_relata_sem_alterar(self):
+        saida = self.reconciliar('--dry-run')
+
+        self.assertIn(f'opção {self.opcoes[0].id}: contador 7, votos 3 (-4)', saida)
+        self.assertIn(f'opção {self.opcoes[1].id}: contador 5, votos 3 (-2)', saida)
+        self.assertEqual(Opcao.objects.get(pk=self.opcoes[0].pk).votos, 7)
+        self.assertFalse(MarcaDagua.objects.filter(nome=reconciliacao.MARCA).exists())
+
+        # Só relatar não abre transação nem trava linhas: as duas leituras da comparação bastam
+        with self.assertNumQueries(2):
+            divergencias = reconciliacao.conferir([self.enquete.id], corrigir=False)
+        self.assertEqual(len(divergencias), 2)
+
+    def test_corrige_divergencias_e_avanca_a_marca(self):
+        saida = self.reconciliar()
+
+        self.assertIn('2 enquetes conferidas, 2 divergências corrigidas', saida)
+        self.assertEqual([o.votos for o in Opcao.objects.filter(enquete=self.enquete)], [3, 3, 0])
+        self.assertFalse(ContadorOpcao.objects.filter(votos__gt=0).exists())
+        self.assertEqual(MarcaDagua.objects.get(nome=reconciliacao.MARCA).ultimo_id, Voto.objects.latest('id').id)
+
+        # Sem votos novos nem marcações, nenhuma enquete é conferida
+        with self.assertNumQueries(4):
+            resultado = reconciliacao.reconciliar(atraso=0)
+        self.assertEqual(resultado['enquetes'], 0)
+
+        # Contador alterado direto no banco não deixa marca: só a execução completa o encontra
+        Opcao.objects.filter(pk=self.opcoes[2].pk).update(votos=1)
+        resultado = reconciliacao.reconciliar(atraso=0, completo=True)
+        self.assertEqual([d['id_opcao'] for d in resultado['divergencias']], [self.opcoes[2].id])
+
+    def test_enquetes_em_dia_conferidas_sem_transacao(self):
+        reconciliacao.reconciliar(atraso=0)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(reconciliacao.conferir([self.enquete.id, self.outra.id]), [])
+
+    def test_voto_apagado_pelo_admin_e_conferido_sem_votos_novos(self):
+        from django.contrib.auth.models import User
+        reconciliacao.reconciliar(atraso=0)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@exemplo.com', 'senha'))
+
+        voto = Voto.objects.filter(enquete=self.enquete).first()
+        self.client.post(reverse('admin:enquete_voto_delete', args=[voto.pk]), {'post': 'yes'})
+        self.assertTrue(ConferenciaPendente.objects.filter(enquete=self.enquete).exists())
+
+        resultado = reconciliacao.reconciliar(atraso=0)
+        self.assertEqual(resultado['enquetes'], 1)
+        self.assertEqual([d['id_opcao'] for d in resultado['divergencias']], [voto.opcao_escolhida_id])
+        self.assertFalse(ConferenciaPendente.objects.exists())
+
+    def test_voto_que_aparece_depois_da_marca_e_conferido(self):
+        # O voto do meio simula uma transação que só termina depois da marca chegar nele
+        registrar_voto(self.enquete, self.opcoes[0].id, 'atrasado')
+        registrar_voto(self.outra, self.outra.opcoes.first().id, 'participante1')
+        atrasado = Voto.objects.get(id_participante='atrasado')
+        Voto.objects.filter(pk=atrasado.pk).delete()
+        self.assertEqual(reconciliacao.reconciliar(atraso=0)['enquetes'], 2)
+
+        # O contador chega com o voto, na mesma transação
+        atrasado.save(force_insert=True)
+        Opcao.objects.filter(pk=self.opcoes[0].pk).update(votos=F('votos') + 1)
+        # A marca esperou na lacuna: as duas enquetes acima dela são conferidas de novo
+        resultado = reconciliacao.reconciliar(atraso=0)
+        self.assertEqual(resultado['enquetes'], 2)
+        self.assertEqual(resultado['divergencias'], [])
+        self.assertEqual(MarcaDagua.objects.get(nome=reconciliacao.MARCA).ultimo_id, Voto.objects.latest('id').id)
+
+    def test_ignora_enquetes_arquivadas_e_votos_recentes(self):
+        Enquete.objects.filter(pk=self.enquete.pk).update(expires_at=timezone.now() - timedelta(hours=1))
+        arquivar_enquete(self.enquete.pk)
+
+        resultado = reconciliacao.reconciliar(atraso=0)
+        self.assertEqual(resultado['divergencias'], [])
+
+        registrar_voto(self.outra, self.outra.opcoes.first().id, 'participante1')
+        resultado = reconciliacao.reconciliar(atraso=60)
+        self.assertEqual(resultado['enquetes'], 0)
+
+
+class DocumentacaoTests(TestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(STATIC_ROOT=diretorio.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def test_schema_pre_gerado_servido_como_estatico(self):
+        call_command('gerar_schema', stdout=StringIO())
+        cliente = APIClient()
+
+        resposta = cliente.get(reverse('schema'))
+        self.assertRedirects(resposta, '/static/openapi/schema.yaml', fetch_redirect_response=False)
+        estatico = cliente.get('/static/openapi/schema.json')
+        self.assertEqual(estatico.status_code, 200)
+        schema = json.loads(b''.join(estatico.streaming_content))
+        self.assertIn('/api/enquetes/{id}/votar/', schema['paths'])
+        self.assertContains(cliente.get(reverse('swagger-ui')), '/static/openapi/schema.yaml')
+
+    def test_sem_arquivo_gera_na_hora(self):
+        resposta = APIClient().get(reverse('schema'))
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn(b'/api/enquetes/{id}/votar/', resposta.content)
+
+
+class DadosSinteticosTests(TestCase):
+    def test_gera_votos_consistentes_com_os_contadores(self):
+        call_command(
+            'gerar_dados_sinteticos', enquetes=20, opcoes=3, votos=500, lote=100, semente=1, stdout=StringIO()
+        )
+
+        self.assertEqual(Enquete.objects.count(), 20)
+        self.assertEqual(Voto.objects.count(), 500)
+        self.assertEqual(sum(Opcao.objects.values_list('votos', flat=True)), 500)
+        por_opcao = dict(Voto.objects.values_list('opcao_escolhida').annotate(total=Count('id')))
+        for opcao in Opcao.objects.all():
+            self.assertEqual(por_opcao.get(opcao.id, 0), opcao.votos)
+        # Com viés: a enquete mais votada concentra bem mais que a média
+        mais_votada = Voto.objects.values('enquete').annotate(total=Count('id')).order_by('-total')[0]
+        self.assertGreater(mais_votada['total'], 3 * 500 / 20)
+
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        registro_metricas.limpar()
+        self.enquete = criar_enquete()
+        self.client = APIClient()
+
+    def test_registra_latencia_consultas_e_bytes_por_rota(self):
+        resposta = self.client.get(reverse('enquete:enquete-detail', args=[self.enquete.pk]))
+        metricas = self.client.get(reverse('enquete:metricas')).content.decode()
+
+        rotulos = '{rota="enquete-detail",metodo="GET",status="200"}'
+        self.assertIn(f'enquete_requisicao_segundos_count{rotulos} 1', metricas)
+        self.assertIn(f'enquete_requisicao_consultas_sum{rotulos} 2', metricas)
+        self.assertIn(f'enquete_resposta_bytes_total{rotulos} {len(resposta.content)}', metricas)
+
+    def test_soma_os_arquivos_dos_outros_workers(self):
+        with tempfile.TemporaryDirectory() as diretorio, \
+                override_settings(ENQUETE_METRICAS_DIR=diretorio):
+            self.client.get(reverse('enquete:enquete-detail', args=[self.enquete.pk]))
+            outro = registro_metricas.agregado()
+            Path(diretorio, 'metricas_1.json').write_text(json.dumps(outro))
+            # O de um worker que já saiu não soma e é apagado
+            encerrado = subprocess.Popen([sys.executable, '-c', ''])
+            encerrado.wait()
+            morto = Path(diretorio, f'metricas_{encerrado.pid}.json')
+            morto.write_text(json.dumps(outro))
+
+            series = registro_metricas.agregado()
+            self.assertFalse(morto.exists())
+
+        self.assertEqual(series['enquete-detail|GET|200']['contagem'], 2)
+
+    def test_requisicao_nao_grava_o_arquivo(self):
+        with tempfile.TemporaryDirectory() as diretorio, \
+                override_settings(ENQUETE_METRICAS_DIR=diretorio, ENQUETE_METRICAS_INTERVALO_GRAVACAO=3600):
+            self.client.get(reverse('enquete:enquete-detail', args=[self.enquete.pk]))
+            # Só a thread de fundo (ou a leitura das métricas) grava
+            self.assertEqual(list(Path(diretorio).iterdir()), [])
+
+    @override_settings(ENQUETE_LOG_LENTAS_MS=0.001)
+    def test_log_de_lentas_inclui_o_sql(self):
+        with self.assertLogs('enquete.lentas', 'WARNING') as logs:
+            self.client.get(reverse('enquete:enquete-detail', args=[self.enquete.pk]))
+        self.assertIn('SELECT', logs.output[0])
+
+
+class VotacaoConcorrenteTests(TransactionTestCase):
+    """Dispara milhares de votos em paralelo e confere os contadores."""
+
+    TOTAL_VOTOS = 2000
+    REPETIDOS = 200
+    THREADS = 16
+
+    def test_contadores_batem_com_votos_registrados(self):
+        enquete = criar_enquete(opcoes=('A', 'B', 'C', 'D'))
+        opcoes = list(enquete.opcoes.values_list('id', flat=True))
+        url = reverse('enquete:enquete-votar', args=[enquete.pk])
+
+        # Os primeiros participantes tentam votar de novo para exercitar o 409
+        tentativas = [(f'p{i}', opcoes[i % len(opcoes)]) for i in range(self.TOTAL_VOTOS)]
+        tentativas += [(f'p{i}', opcoes[(i + 1) % len(opcoes)]) for i in range(self.REPETIDOS)]
+
+        def votar(tentativa):
+            id_participante, id_opcao = tentativa
+            try:
+                return APIClient().post(
+                    url, {'id_opcao': id_opcao, 'id_participante': id_participante}, format='json'
+                ).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            codigos = list(executor.map(votar, tentativas))
+
+        self.assertEqual(codigos.count(200), self.TOTAL_VOTOS)
+        self.assertEqual(codigos.count(409), self.REPETIDOS)
+
+        contados = dict(
+            Voto.objects.filter(enquete=enquete)
+            .values_list('opcao_escolhida')
+            .annotate(total=Count('id'))
+        )
+        for opcao in Opcao.objects.filter(enquete=enquete):
+            self.assertEqual(opcao.votos, contados.get(opcao.id, 0))
+        self.assertEqual(sum(contados.values()), self.TOTAL_VOTOS)
+
+
+@override_settings(ENQUETE_MODO_VOTO='buffer')
+class BufferVotosTests(TransactionTestCase):
+    def setUp(self):
+        self.buffer = BufferVotos(tamanho_lote=3, intervalo=60)
+        patcher = mock.patch('enquete.views.obter_buffer', return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.buffer.encerrar)
+
+        self.client = APIClient()
+        self.enquete = criar_enquete()
+        self.opcao = self.enquete.opcoes.first()
+        self.url = reverse('enquete:enquete-votar', args=[self.enquete.pk])
+
+    def votar(self, id_participante):
+        return self.client.post(
+            self.url, {'id_opcao': self.opcao.id, 'id_participante': id_participante}, format='json'
+        )
+
+    def test_votos_aceitos_sao_gravados_no_encerramento(self):
+        codigos = [self.votar(f'p{i}').status_code for i in range(7)]
+        self.assertEqual(codigos, [202] * 7)
+        self.assertEqual(self.votar('p0').status_code, 409)
+
+        self.buffer.encerrar()
+
+        self.opcao.refresh_from_db()
+        self.assertEqual(self.opcao.votos, 7)
+        self.assertEqual(Voto.objects.filter(enquete=self.enquete).count(), 7)
+        estatisticas = self.buffer.estatisticas()
+        self.assertEqual(estatisticas['persistidos'], 7)
+        self.assertEqual(estatisticas['pendentes'], 0)
+
+    def test_duplicado_de_outro_processo_descartado_no_log_sem_voto_a_voto(self):
+        # Menos que um lote: a thread de fundo não descarrega antes do teste
+        codigos = [self.votar(f'p{i}').status_code for i in range(2)]
+        self.assertEqual(codigos, [202] * 2)
+        # Outro processo grava o mesmo participante depois do aceite
+        Voto.objects.create(enquete=self.enquete, opcao_escolhida=self.opcao, id_participante='p1')
+
+        with self.assertLogs('enquete.buffer', 'WARNING') as logs, \
+                CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.buffer.descarregar(), 1)
+
+        self.assertIn(f"({self.enquete.id}, 'p1')", logs.output[0])
+        inserts = [c for c in consultas.captured_queries if c['sql'].startswith('INSERT INTO "enquete_voto"')]
+        self.assertEqual(len(inserts), 1)
+        estatisticas = self.buffer.estatisticas()
+        self.assertEqual((estatisticas['persistidos'], estatisticas['descartados']), (1, 1))
+
+    def test_votos_de_enquete_arquivada_ou_apagada_descartados_no_log(self):
+        outra = criar_enquete()
+        self.votar('p0')
+        self.buffer.aceitar(outra, outra.opcoes.first().id, 'p1')
+        # Arquivada e apagada entre o aceite e a descarga
+        Enquete.objects.filter(pk=self.enquete.pk).update(arquivada_em=timezone.now())
+        id_outra = outra.id
+        outra.delete()
+
+        with self.assertLogs('enquete.buffer', 'WARNING') as logs:
+            self.assertEqual(self.buffer.descarregar(), 0)
+
+        self.assertIn(f"({self.enquete.id}, 'p0')", logs.output[0])
+        self.assertIn(f"({id_outra}, 'p1')", logs.output[0])
+        self.assertFalse(Voto.objects.exists())
+        self.opcao.refresh_from_db()
+        self.assertEqual(self.opcao.votos, 0)
+        estatisticas = self.buffer.estatisticas()
+        self.assertEqual((estatisticas['persistidos'], estatisticas['descartados']), (0, 2))
+
+    def test_duplicado_ja_gravado_e_barrado_no_aceite(self):
+        self.votar('p0')
+        self.buffer.encerrar()
+
+        self.assertEqual(self.votar('p0').status_code, 409)
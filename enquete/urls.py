@@ -1,6 +1,8 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import EnqueteViewSet
+from . import assincrono
+from .views import EnqueteViewSet, metricas_prometheus, stream_enquete
 
 app_name = 'enquete'  # Necessário para o namespace funcionar corretamente
 
@@ -10,5 +12,18 @@ router.register(r'enquetes', EnqueteViewSet, basename='enquete')
 
 # As urlpatterns do app apontam para as rotas geradas pelo roteador
 urlpatterns = [
+    path('enquetes/<int:pk>/stream/', stream_enquete, name='enquete-stream'),
+    path('metrics/', metricas_prometheus, name='metricas'),
+]
+
+if settings.ENQUETE_VIEWS_ASSINCRONAS:
+    # Sob ASGI, leitura e voto nas mesmas URLs (e nomes) por views assíncronas
+    urlpatterns += [
+        path('enquetes/', assincrono.listar_enquetes, name='enquete-list'),
+        path('enquetes/<int:pk>/', assincrono.detalhar_enquete, name='enquete-detail'),
+        path('enquetes/<int:pk>/votar/', assincrono.votar_enquete, name='enquete-votar'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Versões das enquetes e validadores HTTP (ETag / Last-Modified).
+
+Cada enquete tem um ``versao`` que só cresce: é incrementado a cada edição
+e a cada mudança nos votos que não seja um voto novo (correção de contador,
+voto apagado, arquivamento), sempre na mesma transação da mudança. Votos
+novos não tocam a linha da enquete, que seria disputada por todos eles: o
+ETag também leva o total de votos (opções mais slots), gravado pela própria
+transação do voto. Votos só aumentam o total, e o resto incrementa a versão,
+então o par nunca se repete com placares diferentes.
+
+O ETag da enquete combina id, versão, total e status, já que o status muda
+só com o relógio. O da lista é a versão da página: id, versão, total e
+status de cada enquete da página, o total e o próximo link da paginação, a
+URL completa e o formato da resposta. Qualquer voto, edição, criação,
+exclusão ou encerramento que altere a página altera o ETag, e ele sai da
+mesma leitura estreita (sem opções) que a paginação já faz.
+
+O instante do último voto não é gravado, então enquetes abertas não têm
+``Last-Modified``: quem quiser revalidar usa o ETag. Encerradas não recebem
+mais votos e o ``Last-Modified`` delas é a última edição ou troca de status.
+"""
+import hashlib
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.http import http_date, quote_etag
+
+from .contadores import total_de_votos
+from .models import ABERTA, PARA_DELETAR, Enquete, calcular_status
+
+
+def incrementar_versao(*ids_enquete):
+    if ids_enquete:
+        Enquete.objects.filter(pk__in=ids_enquete).update(
+            versao=F('versao') + 1, atualizada_em=timezone.now()
+        )
+
+
+def enquetes_alteradas(*ids_enquete):
+    """Nova versão: ETags e payloads em cache da versão anterior deixam de valer."""
+    incrementar_versao(*ids_enquete)
+
+
+def _etag(*partes):
+    return quote_etag(hashlib.blake2b(repr(partes).encode(), digest_size=12).hexdigest())
+
+
+def _colunas_de_versao(id_enquete):
+    return Enquete.objects.filter(pk=id_enquete).annotate(total_votos=total_de_votos()).values(
+        'versao', 'total_votos', 'atualizada_em', 'expires_at', 'delete_at'
+    )
+
+
+def _com_status(estado):
+    if estado is not None:
+        estado['status'] = calcular_status(estado['expires_at'], estado['delete_at'], timezone.now())
+    return estado
+
+
+def estado_da_enquete(id_enquete):
+    """Versão, total de votos, datas e status, sem ler as opções; ``None`` se a enquete não existir."""
+    return _com_status(_colunas_de_versao(id_enquete).first())
+
+
+async def aestado_da_enquete(id_enquete):
+    return _com_status(await _colunas_de_versao(id_enquete).afirst())
+
+
+def estado_da_linha(enquete, payload):
+    """
+    O mesmo estado, sem outra consulta: versão e datas vêm da linha lida junto
+    com o payload (que não as expõe), total e status do próprio payload.
+    """
+    return {
+        'versao': enquete.versao,
+        'total_votos': sum(opcao['votos'] for opcao in payload['opcoes']),
+        'status': payload['status'],
+        'atualizada_em': enquete.atualizada_em,
+        'expires_at': enquete.expires_at,
+        'delete_at': enquete.delete_at,
+    }
+
+
+def _ultima_modificacao(status, atualizada_em, expires_at, delete_at):
+    """
+    A última edição ou a troca de status mais recente, que vem só do relógio;
+    ``None`` para enquetes abertas, cujos votos não têm instante gravado.
+    """
+    if status == ABERTA:
+        return None
+    if status == PARA_DELETAR:
+        return max(atualizada_em, expires_at, delete_at)
+    return max(atualizada_em, expires_at)
+
+
+def validadores_enquete(request, id_enquete, versao, total_votos, status, atualizada_em, expires_at, delete_at):
+    """``(etag, ultima_modificacao)`` de uma enquete; as trocas de status contam como modificação."""
+    return (
+        _etag('enquete', id_enquete, versao, total_votos, status, request.accepted_renderer.format),
+        _ultima_modificacao(status, atualizada_em, expires_at, delete_at),
+    )
+
+
+def validadores_lista(request, enquetes, paginador=None):
+    """
+    ``(etag, ultima_modificacao)`` da página: ``enquetes`` são as da página,
+    lidas só com as colunas de versão e anotadas com ``total_votos``;
+    ``paginador`` traz total e links. Sem ``Last-Modified`` se alguma estiver aberta.
+    """
+    agora = timezone.now()
+    itens = []
+    modificacoes = []
+    for enquete in enquetes:
+        status = calcular_status(enquete.expires_at, enquete.delete_at, agora)
+        itens.append((enquete.pk, enquete.versao, enquete.total_votos, status))
+        modificacoes.append(
+            _ultima_modificacao(status, enquete.atualizada_em, enquete.expires_at, enquete.delete_at)
+        )
+    ultima_modificacao = None if None in modificacoes or not modificacoes else max(modificacoes)
+
+    paginacao = None
+    if paginador is not None:
+        paginacao = (getattr(paginador, 'count', None), paginador.get_next_link())
+    etag = _etag(
+        'lista', itens, paginacao, request.build_absolute_uri(), request.accepted_renderer.format
+    )
+    return etag, ultima_modificacao
+
+
+def aplicar_validadores(response, etag, ultima_modificacao):
+    response['ETag'] = etag
+    if ultima_modificacao:
+        response['Last-Modified'] = http_date(ultima_modificacao.timestamp())
+    return response
@@ -1,16 +1,56 @@
-from rest_framework import viewsets, status
+from rest_framework import serializers, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Case, When, Value, IntegerField
-from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiResponse
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.db.models import Case, When, Value, IntegerField, prefetch_related_objects
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import (
+    extend_schema, extend_schema_view, OpenApiParameter, OpenApiResponse, PolymorphicProxySerializer
+)
 
-from .models import Enquete, Opcao, Voto
-from .serializers import EnqueteSerializer, VotoInputSerializer
+from . import cache as cache_enquetes
+from .buffer import obter_buffer
+from .contadores import prefetch_opcoes, total_de_votos
+from .expurgo import disparar_em_segundo_plano
+from .exportacao import (
+    CAMPOS_RESULTADOS, CAMPOS_VOTOS, FORMATOS, resposta_exportacao, totais_das_opcoes, votos_da_enquete
+)
+from .filters import EnqueteFilter
+from .leitura import NAO_ENCONTRADA, RenderizadorJSON, ler_enquetes
+from .linha_do_tempo import RESOLUCOES, linha_do_tempo
+from .metricas import formatar_prometheus, registro as registro_metricas
+from .models import Enquete, ExecucaoExpurgo, contagem_por_status
+from .pagination import EnquetePagination
+from .participantes import obter_filtro
+from .replicas import ACOES_DE_LEITURA, em_replica
+from .resultados import resultados_das_enquetes
+from .serializers import (
+    ContagemStatusSerializer, EnqueteSerializer, ExecucaoExpurgoSerializer, LinhaDoTempoSerializer,
+    PlacarSerializer,
+    ResultadoLoteVotosSerializer, ResultadosEnqueteSerializer, VotoInputSerializer
+)
+from .streaming import evento_unico, eventos_enquete
+from .versoes import (
+    aplicar_validadores, enquetes_alteradas, estado_da_enquete, estado_da_linha,
+    validadores_enquete, validadores_lista
+)
+from .votacao import ACEITO, DUPLICADO, INVALIDO, ErroVoto, registrar_voto, registrar_votos_em_lote
 
 @extend_schema_view(
     list=extend_schema(
-        description="Lista todas as enquetes, priorizando as ainda abertas.",
+        description=(
+            "Lista todas as enquetes, priorizando as ainda abertas. "
+            "Com `?paginacao=cursor` a paginação é por cursor: sem contagem total, "
+            "retorna apenas `next` e `results`, e o link `next` traz o `cursor`."
+        ),
         responses=EnqueteSerializer(many=True)
     ),
     retrieve=extend_schema(
@@ -44,16 +84,30 @@ class EnqueteViewSet(viewsets.ModelViewSet):
     """
 
     serializer_class = EnqueteSerializer
+    pagination_class = EnquetePagination
+    renderer_classes = [RenderizadorJSON, BrowsableAPIRenderer]
+    filterset_class = EnqueteFilter
+
+    def dispatch(self, request, *args, **kwargs):
+        # Ações de leitura consultam uma réplica, quando configurada
+        if self.action_map.get(request.method.lower()) in ACOES_DE_LEITURA:
+            return em_replica(super().dispatch)(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
 
     def get_queryset(self):
         """
         Lista todas as enquetes, abertas primeiro, ordenadas pela data de criação.
         """
-        base_qs = Enquete.objects.all().prefetch_related('opcoes')
+        base_qs = Enquete.objects.all().prefetch_related(prefetch_opcoes())
 
         if self.action == 'retrieve':
             return base_qs
 
+        if self.action in ('votar', 'linha_do_tempo', 'exportar'):
+            # Sem prefetch: o voto lê as opções depois, já atualizadas, e a
+            # linha do tempo e a exportação só precisam dos textos
+            return Enquete.objects.all()
+
         now = timezone.now()
         return base_qs.annotate(
             prioridade=Case(
@@ -63,11 +117,145 @@ class EnqueteViewSet(viewsets.ModelViewSet):
             )
         ).order_by('prioridade', '-data_criacao')
 
+    def list(self, request, *args, **kwargs):
+        itens, paginada = self.pagina_de_versoes()
+        etag, ultima_modificacao = validadores_lista(request, itens, self.paginator if paginada else None)
+        nao_modificada = self.resposta_nao_modificada(request, etag, ultima_modificacao)
+        if nao_modificada:
+            return nao_modificada
+
+        payloads = self.payloads_da_pagina(itens)
+        return aplicar_validadores(self.resposta_da_pagina(payloads, paginada), etag, ultima_modificacao)
+
+    def pagina_de_versoes(self):
+        """
+        Enquetes da página, lidas só com as colunas de versão, e se houve
+        paginação. O 304 sai daqui sem serializar nem buscar as opções, e o
+        200 busca depois apenas as enquetes da página.
+        """
+        enquetes = (
+            self.filter_queryset(self.get_queryset())
+            .prefetch_related(None)
+            .only('id', 'data_criacao', 'expires_at', 'delete_at', 'versao', 'atualizada_em')
+            .annotate(total_votos=total_de_votos())
+        )
+        page = self.paginate_queryset(enquetes)
+        return list(enquetes if page is None else page), page is not None
+
+    def resposta_da_pagina(self, payloads, paginada):
+        if paginada:
+            return self.get_paginated_response(payloads)
+        return Response(payloads)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = str(self.kwargs['pk'])
+        if not pk.isdigit():
+            return super().retrieve(request, *args, **kwargs)
+
+        # O estado vem antes do payload: dá o 304 e a chave do cache
+        estado = None
+        if cache_enquetes.ativo() or self.requisicao_condicional(request):
+            estado = estado_da_enquete(pk)
+            if estado is None:
+                raise Http404(NAO_ENCONTRADA)
+            etag, ultima_modificacao = validadores_enquete(request, int(pk), **estado)
+            nao_modificada = self.resposta_nao_modificada(request, etag, ultima_modificacao)
+            if nao_modificada:
+                return nao_modificada
+
+        payload = chaves = None
+        if cache_enquetes.ativo():
+            chaves = {int(pk): cache_enquetes.chave_do_payload(int(pk), estado['versao'], estado['total_votos'])}
+            payload = cache_enquetes.obter_payload(int(pk), chaves[int(pk)])
+
+        if payload is None:
+            enquetes, payloads = self.ler_payloads([int(pk)])
+            if not payloads:
+                raise Http404(NAO_ENCONTRADA)
+            payload = payloads[0]
+            if chaves:
+                cache_enquetes.guardar_payloads(chaves, enquetes, payloads)
+
+        if estado is None:
+            etag, ultima_modificacao = validadores_enquete(request, int(pk), **estado_da_linha(enquetes[0], payload))
+        return aplicar_validadores(Response(payload), etag, ultima_modificacao)
+
+    @staticmethod
+    def requisicao_condicional(request):
+        return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+    @staticmethod
+    def resposta_nao_modificada(request, etag, ultima_modificacao):
+        """304 (ou 412) quando as pré-condições da requisição batem; senão ``None``."""
+        resposta = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=int(ultima_modificacao.timestamp()) if ultima_modificacao else None
+        )
+        if resposta is not None:
+            aplicar_validadores(resposta, etag, ultima_modificacao)
+        return resposta
+
+    def payloads_da_pagina(self, itens):
+        """Payloads das enquetes ``itens`` (lidas por ``pagina_de_versoes``), na mesma ordem."""
+        if cache_enquetes.ativo():
+            return self.payloads_em_cache(itens)
+        return self.ler_payloads([e.pk for e in itens])[1]
+
+    def ler_payloads(self, ids):
+        """
+        ``(enquetes, payloads)`` de ``ids``, na mesma ordem: pelo caminho
+        rápido de ``leitura`` ou, com ele desligado, pelo serializer.
+        """
+        if settings.ENQUETE_LEITURA_RAPIDA:
+            return ler_enquetes(ids)
+        por_id = {e.pk: e for e in self.get_queryset().filter(id__in=ids)}
+        enquetes = [por_id[i] for i in ids if i in por_id]
+        return enquetes, self.get_serializer(enquetes, many=True).data
+
+    def payloads_em_cache(self, itens):
+        """Payloads das enquetes ``itens`` na mesma ordem, serializando só as ausentes do cache."""
+        chaves = {
+            e.pk: cache_enquetes.chave_do_payload(e.pk, e.versao, e.total_votos) for e in itens
+        }
+        payloads = cache_enquetes.obter_payloads(chaves)
+
+        faltantes = [i for i in chaves if i not in payloads]
+        if faltantes:
+            enquetes, dados = self.ler_payloads(faltantes)
+            cache_enquetes.guardar_payloads(chaves, enquetes, dados)
+            payloads.update(zip([e.id for e in enquetes], dados))
+
+        return [payloads[i] for i in chaves if i in payloads]
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        enquetes_alteradas(serializer.instance.pk)
+
     @extend_schema(
-        description="Permite votar em uma opção de enquete, se ainda estiver ativa.",
+        description=(
+            "Permite votar em uma opção de enquete, se ainda estiver ativa. "
+            "Com `?resposta=compacta` (ou o header `X-Resposta-Voto: compacta`) "
+            "retorna apenas o placar atualizado em vez da enquete completa."
+        ),
         request=VotoInputSerializer,
+        parameters=[
+            OpenApiParameter(
+                'resposta', str, enum=['completa', 'compacta'], required=False,
+                description="Formato da resposta de sucesso. Padrão: `completa`."
+            )
+        ],
         responses={
-            200: EnqueteSerializer,
+            200: PolymorphicProxySerializer(
+                component_name='RespostaVoto',
+                serializers=[EnqueteSerializer, PlacarSerializer],
+                resource_type_field_name=None
+            ),
+            202: OpenApiResponse(description=(
+                "Voto aceito no buffer (modo de escrita adiada). Não garante a gravação: o voto é "
+                "descartado na descarga se o participante votar por outro processo antes dela, e "
+                "perdido se o processo cair com ele na fila."
+            )),
             400: OpenApiResponse(description="Requisição inválida."),
             403: OpenApiResponse(description="Enquete expirada."),
             409: OpenApiResponse(description="Usuário já votou nesta enquete.")
@@ -82,47 +270,390 @@ class EnqueteViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        id_participante = serializer.validated_data['id_participante']
-        id_opcao = serializer.validated_data['id_opcao']
+        dados = {
+            'id_opcao': serializer.validated_data['id_opcao'],
+            'id_participante': serializer.validated_data['id_participante'],
+        }
+        bufferizado = settings.ENQUETE_MODO_VOTO == 'buffer'
+        compacta = self.resposta_compacta(request)
 
-        # Impede votos em enquetes já expiradas
-        if enquete.expires_at <= timezone.now():
-            return Response({'error': 'Esta enquete está encerrada.'},
-                            status=status.HTTP_403_FORBIDDEN)
+        try:
+            if bufferizado:
+                obter_buffer().aceitar(enquete, **dados)
+            else:
+                _, placar = registrar_voto(enquete, com_placar=compacta, **dados)
+        except ErroVoto as erro:
+            return Response({'error': erro.mensagem}, status=erro.status_http)
+
+        if bufferizado:
+            return Response({'message': 'Voto aceito e será contabilizado em instantes.'},
+                            status=status.HTTP_202_ACCEPTED)
+
+        if compacta:
+            return Response(placar, status=status.HTTP_200_OK)
+
+        prefetch_related_objects([enquete], prefetch_opcoes())
+        return Response(EnqueteSerializer(enquete).data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        description=(
+            "Cria várias enquetes de uma vez, em uma única transação. "
+            "Se algum item for inválido, nada é criado e a resposta traz os erros na posição de cada item."
+        ),
+        request=EnqueteSerializer(many=True),
+        responses={
+            201: EnqueteSerializer(many=True),
+            400: OpenApiResponse(description="Lista com os erros de validação de cada item.")
+        }
+    )
+
+    @action(detail=False, methods=['post'])
+    def criar_em_lote(self, request):
+        serializer = self.get_serializer(
+            data=request.data, many=True, max_length=settings.ENQUETE_LOTE_MAXIMO
+        )
+        serializer.is_valid(raise_exception=True)
+        enquetes = serializer.save()
 
-        # Impede múltiplos votos
-        if Voto.objects.filter(enquete=enquete, id_participante=id_participante).exists():
-            return Response({'error': 'Este participante já votou nesta enquete.'},
-                            status=status.HTTP_409_CONFLICT)
+        prefetch_related_objects(enquetes, prefetch_opcoes())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @extend_schema(
+        description=(
+            "Registra de uma vez votos coletados offline (quiosques, importações), de uma ou mais "
+            "enquetes: a enquete de cada voto é a da opção escolhida. Cada voto é aceito, duplicado "
+            "(participante que já votou na enquete, inclusive no próprio lote) ou inválido "
+            "(dados malformados, opção inexistente ou enquete encerrada); um voto recusado não "
+            "impede os demais. O resultado vem na ordem enviada."
+        ),
+        request=VotoInputSerializer(many=True),
+        responses={
+            200: ResultadoLoteVotosSerializer,
+            400: OpenApiResponse(description="Corpo que não é uma lista ou lote acima do limite.")
+        }
+    )
+
+    @action(detail=False, methods=['post'])
+    def votar_em_lote(self, request):
+        if not isinstance(request.data, list):
+            return Response({'error': 'Envie uma lista de votos.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > settings.ENQUETE_LOTE_VOTOS_MAXIMO:
+            return Response(
+                {'error': f'No máximo {settings.ENQUETE_LOTE_VOTOS_MAXIMO} votos por lote.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        validador = VotoInputSerializer()
+        resultados = [None] * len(request.data)
+        validos = []
+        for indice, item in enumerate(request.data):
+            try:
+                validos.append((indice, validador.run_validation(item)))
+            except serializers.ValidationError as erro:
+                resultados[indice] = {'indice': indice, 'resultado': INVALIDO, 'erro': erro.detail}
+
+        registrados = registrar_votos_em_lote([dados for _, dados in validos])
+        for (indice, _), (resultado, mensagem) in zip(validos, registrados):
+            resultados[indice] = {'indice': indice, 'resultado': resultado}
+            if mensagem:
+                resultados[indice]['erro'] = mensagem
+
+        totais = {ACEITO: 0, DUPLICADO: 0, INVALIDO: 0}
+        for item in resultados:
+            totais[item['resultado']] += 1
+        return Response({
+            'aceitos': totais[ACEITO],
+            'duplicados': totais[DUPLICADO],
+            'invalidos': totais[INVALIDO],
+            'resultados': resultados,
+        })
+
+    @staticmethod
+    def resposta_compacta(request):
+        """O cliente pede o placar em vez da enquete completa por query string ou header."""
+        escolha = request.query_params.get('resposta') or request.headers.get('X-Resposta-Voto', '')
+        return escolha.lower() == 'compacta'
+
+    @extend_schema(
+        description=(
+            "Total de votos, percentual de cada opção e opção líder da enquete, "
+            "calculados a partir dos contadores mantidos a cada voto."
+        ),
+        responses={200: ResultadosEnqueteSerializer, 404: OpenApiResponse(description="Enquete não encontrada.")}
+    )
+
+    @action(detail=True, methods=['get'])
+    def resultados(self, request, pk=None):
+        resultados = resultados_das_enquetes([int(pk)]) if str(pk).isdigit() else []
+        if not resultados:
+            raise Http404(NAO_ENCONTRADA)
+        return Response(resultados[0])
+
+    @extend_schema(
+        description=(
+            "Resultados de várias enquetes de uma vez (painéis), na ordem dos IDs pedidos. "
+            "IDs inexistentes são omitidos."
+        ),
+        parameters=[
+            OpenApiParameter(
+                'ids', str, required=True,
+                description="IDs das enquetes separados por vírgula. Ex: `1,2,3`."
+            )
+        ],
+        responses={
+            200: ResultadosEnqueteSerializer(many=True),
+            400: OpenApiResponse(description="IDs ausentes, inválidos ou acima do limite.")
+        }
+    )
+
+    @action(detail=False, methods=['get'], url_path='resultados')
+    def resultados_em_lote(self, request):
         try:
-            opcao_selecionada = Opcao.objects.get(id=id_opcao, enquete=enquete)
-        except Opcao.DoesNotExist:
-            return Response({'error': 'Opção inválida para esta enquete.'},
+            ids = self.ids_da_consulta(request)
+        except ValueError:
+            return Response({'error': 'Informe IDs numéricos separados por vírgula.'},
                             status=status.HTTP_400_BAD_REQUEST)
+        if not ids or len(ids) > settings.ENQUETE_RESULTADOS_MAXIMO:
+            return Response(
+                {'error': f'Informe de 1 a {settings.ENQUETE_RESULTADOS_MAXIMO} IDs em `ids`.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(resultados_das_enquetes(ids))
+
+    @staticmethod
+    def ids_da_consulta(request):
+        """IDs de ``?ids=1,2,3``, sem repetição e na ordem pedida; ``ValueError`` se algum não for numérico."""
+        return list(dict.fromkeys(
+            int(parte) for parte in request.query_params.get('ids', '').split(',') if parte.strip()
+        ))
 
-        opcao_selecionada.votos += 1
-        opcao_selecionada.save(update_fields=['votos'])
+    @extend_schema(
+        description=(
+            "Todos os votos da enquete, um por participante, em fluxo (CSV ou NDJSON), para auditoria. "
+            "Os de enquetes arquivadas saem do arquivo de votos. Com `Accept-Encoding: gzip` a resposta "
+            "vem compactada. Só para administradores (`is_staff`)."
+        ),
+        parameters=[
+            OpenApiParameter('formato', str, enum=tuple(FORMATOS), required=False,
+                             description="Formato do arquivo. Padrão: `csv`.")
+        ],
+        responses={
+            (200, 'text/csv'): OpenApiTypes.STR,
+            (200, 'application/x-ndjson'): OpenApiTypes.STR,
+            400: OpenApiResponse(description="Formato inválido."),
+            403: OpenApiResponse(description="Sem login de administrador."),
+            404: OpenApiResponse(description="Enquete não encontrada.")
+        }
+    )
 
-        Voto.objects.create(
-            enquete=enquete,
-            opcao_escolhida=opcao_selecionada,
-            id_participante=id_participante
+    @action(detail=True, methods=['get'], permission_classes=[IsAdminUser])
+    def exportar(self, request, pk=None):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response({'error': f'Formato deve ser um de: {", ".join(FORMATOS)}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        enquete = self.get_object()
+        return resposta_exportacao(
+            request._request, votos_da_enquete(enquete), CAMPOS_VOTOS, formato, f'votos-enquete-{enquete.id}'
         )
 
-        return Response(EnqueteSerializer(enquete).data, status=status.HTTP_200_OK)
+    @extend_schema(
+        operation_id='enquetes_exportar_resultados',
+        description=(
+            "Resumo de muitas enquetes em uma passada: o total de votos de cada opção, em fluxo "
+            "(CSV ou NDJSON). Aceita os filtros da listagem (ex.: `status`) e, opcionalmente, `ids`. "
+            "Com `Accept-Encoding: gzip` a resposta vem compactada. Só para administradores (`is_staff`)."
+        ),
+        parameters=[
+            OpenApiParameter('formato', str, enum=tuple(FORMATOS), required=False,
+                             description="Formato do arquivo. Padrão: `csv`."),
+            OpenApiParameter('ids', str, required=False,
+                             description="IDs das enquetes separados por vírgula. Ex: `1,2,3`.")
+        ],
+        responses={
+            (200, 'text/csv'): OpenApiTypes.STR,
+            (200, 'application/x-ndjson'): OpenApiTypes.STR,
+            400: OpenApiResponse(description="Formato ou IDs inválidos."),
+            403: OpenApiResponse(description="Sem login de administrador.")
+        }
+    )
+
+    @action(detail=False, methods=['get'], url_path='exportar', permission_classes=[IsAdminUser])
+    def exportar_resultados(self, request):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS:
+            return Response({'error': f'Formato deve ser um de: {", ".join(FORMATOS)}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        enquetes = self.filter_queryset(Enquete.objects.all())
+        if 'ids' in request.query_params:
+            try:
+                enquetes = enquetes.filter(id__in=self.ids_da_consulta(request))
+            except ValueError:
+                return Response({'error': 'Informe IDs numéricos separados por vírgula.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        return resposta_exportacao(
+            request._request, totais_das_opcoes(enquetes), CAMPOS_RESULTADOS, formato, 'resultados-enquetes'
+        )
+
+    @extend_schema(
+        description=(
+            "Votos da enquete por minuto ou por hora, por opção, para gráficos ao vivo. "
+            "Sem `inicio`, começa na criação da enquete (limitado ao máximo de intervalos)."
+        ),
+        parameters=[
+            OpenApiParameter('resolucao', str, enum=tuple(RESOLUCOES), required=False,
+                             description="Tamanho do intervalo. Padrão: `minuto`."),
+            OpenApiParameter('inicio', str, required=False, description="Início (ISO 8601)."),
+            OpenApiParameter('fim', str, required=False, description="Fim, exclusivo (ISO 8601). Padrão: agora."),
+        ],
+        responses={
+            200: LinhaDoTempoSerializer,
+            400: OpenApiResponse(description="Parâmetros inválidos ou intervalos demais."),
+            404: OpenApiResponse(description="Enquete não encontrada.")
+        }
+    )
+
+    @action(detail=True, methods=['get'])
+    def linha_do_tempo(self, request, pk=None):
+        enquete = self.get_object()
+        resolucao = request.query_params.get('resolucao', 'minuto')
+        if resolucao not in RESOLUCOES:
+            return Response({'error': f'Resolução deve ser uma de: {", ".join(RESOLUCOES)}.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        passo = RESOLUCOES[resolucao]
+        maximo = settings.ENQUETE_LINHA_DO_TEMPO_MAX_INTERVALOS
+        try:
+            fim = self.instante(request, 'fim') or timezone.now()
+            inicio = self.instante(request, 'inicio') or max(enquete.data_criacao, fim - passo * maximo)
+        except ValueError:
+            return Response({'error': '`inicio` e `fim` devem estar no formato ISO 8601.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if inicio >= fim or (fim - inicio) / passo > maximo:
+            return Response(
+                {'error': f'`inicio` deve ser anterior a `fim`, com no máximo {maximo} intervalos.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            'id': enquete.id,
+            'resolucao': resolucao,
+            'inicio': inicio,
+            'fim': fim,
+            'opcoes': list(enquete.opcoes.values('id', 'texto_opcao')),
+            'intervalos': linha_do_tempo(enquete.id, inicio, fim, resolucao),
+        })
+
+    @staticmethod
+    def instante(request, parametro):
+        """Data e hora de um parâmetro da query string (sem fuso, vale o atual); ``None`` se ausente."""
+        valor = request.query_params.get(parametro)
+        if not valor:
+            return None
+        instante = parse_datetime(valor)
+        if instante is None:
+            raise ValueError(valor)
+        return instante if timezone.is_aware(instante) else timezone.make_aware(instante)
+
+    @extend_schema(
+        description=(
+            "Quantidade de enquetes em cada status, com uma única consulta agregada. "
+            "Aceita os mesmos filtros da lista."
+        ),
+        responses={200: ContagemStatusSerializer}
+    )
+
+    @action(detail=False, methods=['get'])
+    def contagem_status(self, request):
+        return Response(contagem_por_status(self.filter_queryset(Enquete.objects.all())))
+
+    @extend_schema(
+        description="Estado do buffer de votos deste processo: aceitos, persistidos e pendentes.",
+        responses={200: OpenApiResponse(description="Estatísticas do buffer de votos.")}
+    )
+
+    @action(detail=False, methods=['get'])
+    def buffer_votos(self, request):
+        return Response(obter_buffer().estatisticas())
+
+    @extend_schema(
+        description="Contadores de acerto e falha do cache de payloads das enquetes.",
+        responses={200: OpenApiResponse(description="Estatísticas do cache.")}
+    )
+
+    @action(detail=False, methods=['get'])
+    def estatisticas_cache(self, request):
+        return Response(cache_enquetes.estatisticas())
 
     @extend_schema(
-        description="Remove do banco todas as enquetes cuja data de exclusão (`delete_at`) já passou.",
+        description=(
+            "Filtro de participantes deste processo: votos repetidos recusados sem ir ao banco "
+            "(acertos), consultas que seguiram para o banco (falhas) e ocupação da memória."
+        ),
+        responses={200: OpenApiResponse(description="Estatísticas do filtro de participantes.")}
+    )
+
+    @action(detail=False, methods=['get'])
+    def filtro_participantes(self, request):
+        filtro = obter_filtro()
+        return Response(filtro.estatisticas() if filtro else {'ativo': False})
+
+    @extend_schema(
+        methods=['DELETE'],
+        description=(
+            "Dispara, em segundo plano, o expurgo das enquetes cuja data de exclusão (`delete_at`) "
+            "já passou. Se já houver uma execução em andamento, apenas a retorna."
+        ),
         responses={
-            200: OpenApiResponse(description="Retorna a quantidade de enquetes deletadas.")
+            202: ExecucaoExpurgoSerializer
         }
     )
+    @extend_schema(
+        methods=['GET'],
+        description="Relatório das últimas execuções do expurgo, com o tempo de cada lote.",
+        responses={200: ExecucaoExpurgoSerializer(many=True)}
+    )
 
-    @action(detail=False, methods=['delete'])
+    @action(detail=False, methods=['delete', 'get'])
     def limpar_enquetes_expiradas(self, request):
-        now = timezone.now()
-        expiradas = Enquete.objects.filter(delete_at__lte=now)
-        count = expiradas.count()
-        expiradas.delete()
-        return Response({'message': f'{count} enquetes deletadas com sucesso.'})
+        if request.method == 'GET':
+            execucoes = ExecucaoExpurgo.objects.all()[:settings.ENQUETE_EXPURGO_RELATORIO]
+            return Response(ExecucaoExpurgoSerializer(execucoes, many=True).data)
+
+        execucao, iniciada = disparar_em_segundo_plano()
+        mensagem = 'Expurgo iniciado.' if iniciada else 'Já existe um expurgo em andamento.'
+        return Response(
+            {'message': mensagem, 'execucao': ExecucaoExpurgoSerializer(execucao).data},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+async def stream_enquete(request, pk):
+    """
+    Resultados ao vivo via Server-Sent Events: envia o placar atual e, a cada
+    rajada de votos, no máximo uma atualização por intervalo. Sob WSGI, só o
+    placar atual (ver ``streaming``).
+    """
+    if not await Enquete.objects.filter(pk=pk).aexists():
+        raise Http404('Enquete não encontrada.')
+
+    if not isinstance(request, ASGIRequest):
+        # Sob WSGI o fluxo prenderia o worker: só o placar atual
+        response = HttpResponse(await sync_to_async(evento_unico)(pk), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    response = StreamingHttpResponse(eventos_enquete(pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Evita que proxies segurem os eventos
+    return response
+
+
+def metricas_prometheus(request):
+    """Métricas por rota no formato texto do Prometheus, somadas entre os workers."""
+    if not settings.ENQUETE_METRICAS:
+        raise Http404('Métricas desligadas.')
+    return HttpResponse(
+        formatar_prometheus(registro_metricas.agregado()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
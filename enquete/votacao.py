@@ -0,0 +1,225 @@
+"""
+Pipeline de votação.
+
+Concentra a regra de negócio do voto para que a view (e futuros pontos de
+entrada) apenas traduzam o resultado em resposta HTTP.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+
+from .contadores import incrementar_slot, incrementar_votos, placar, slots_da_enquete
+from .models import Opcao, Voto
+from .participantes import obter_filtro
+from .streaming import notificar_votos
+
+
+class ErroVoto(Exception):
+    """Falha esperada ao votar, já com a mensagem e o status HTTP da resposta."""
+    mensagem = 'Não foi possível registrar o voto.'
+    status_http = status.HTTP_400_BAD_REQUEST
+
+
+class EnqueteEncerrada(ErroVoto):
+    mensagem = 'Esta enquete está encerrada.'
+    status_http = status.HTTP_403_FORBIDDEN
+
+
+class VotoDuplicado(ErroVoto):
+    mensagem = 'Este participante já votou nesta enquete.'
+    status_http = status.HTTP_409_CONFLICT
+
+
+class OpcaoInvalida(ErroVoto):
+    mensagem = 'Opção inválida para esta enquete.'
+    status_http = status.HTTP_400_BAD_REQUEST
+
+
+ACEITO = 'aceito'
+DUPLICADO = 'duplicado'
+INVALIDO = 'invalido'
+
+
+def votos_alterados(*ids_enquete):
+    """
+    Efeitos de uma mudança nos votos, para rodar depois do commit. A versão
+    não muda: o total de votos, gravado na transação, já troca o ETag e a
+    chave do payload em cache.
+    """
+    notificar_votos(*ids_enquete)
+
+
+def registrar_voto(enquete, id_opcao, id_participante, com_placar=False):
+    """
+    Registra o voto e incrementa o contador da opção em uma única transação.
+
+    O incremento é feito pelo banco (``votos = votos + 1``), então votos
+    simultâneos na mesma opção não se perdem. Voto repetido é detectado pela
+    restrição ``unique_together`` de ``Voto``: o ``IntegrityError`` desfaz a
+    transação inteira, inclusive o incremento. Em enquetes com contador
+    fragmentado, o incremento vai para um slot sorteado da opção.
+
+    Enquetes encerradas (ou já arquivadas) são recusadas antes de qualquer
+    consulta, inclusive a checagem de voto repetido. Com o filtro de
+    participantes ligado (ver ``participantes``), quem certamente já votou é
+    recusado em seguida, também sem abrir a transação.
+
+    Retorna ``(voto, placar)``. O placar (ver ``contadores.placar``) só é lido,
+    ainda dentro da transação, quando ``com_placar`` é verdadeiro.
+    """
+    if enquete.arquivada_em or enquete.expires_at <= timezone.now():
+        raise EnqueteEncerrada()
+
+    filtro = obter_filtro()
+    if filtro and filtro.ja_votou(enquete.id, id_participante):
+        raise VotoDuplicado()
+
+    try:
+        with transaction.atomic():
+            opcao = Opcao.objects.filter(id=id_opcao, enquete=enquete)
+            slots = slots_da_enquete(enquete)
+
+            if slots > 1:
+                if not opcao.exists():
+                    raise OpcaoInvalida()
+                incrementar_slot(id_opcao, slots)
+            # O UPDATE vem primeiro: valida a opção e já trava a linha dela
+            elif not opcao.update(votos=F('votos') + 1):
+                raise OpcaoInvalida()
+
+            voto = Voto.objects.create(
+                enquete=enquete,
+                opcao_escolhida_id=id_opcao,
+                id_participante=id_participante
+            )
+            transaction.on_commit(lambda: votos_alterados(enquete.id))
+            if filtro:
+                transaction.on_commit(lambda: filtro.registrar(enquete.id, id_participante))
+
+            resultado = placar(enquete.id) if com_placar else None
+    except IntegrityError:
+        if filtro:
+            filtro.registrar(enquete.id, id_participante)
+        raise VotoDuplicado()
+
+    return voto, resultado
+
+
+def registrar_votos_em_lote(itens):
+    """
+    Registra de uma vez votos de uma ou mais enquetes (``id_opcao`` e
+    ``id_participante`` já validados); a enquete de cada voto é a da opção.
+
+    Opções, enquetes e votos já existentes são conferidos com uma consulta
+    cada, para o lote inteiro. Os votos novos entram com um ``bulk_create``
+    em um savepoint e os contadores recebem um único UPDATE agregado
+    (``contadores.incrementar_votos``), tudo na mesma transação. Se outra
+    requisição gravar um dos participantes entre a conferência e o INSERT, a
+    ``unique_together`` de ``Voto`` desfaz o savepoint e os votos novos entram
+    um por um, cada um no seu savepoint: os que a restrição recusar são
+    duplicados.
+
+    Retorna, na ordem dos itens, ``(resultado, mensagem)``, com resultado
+    ``ACEITO``, ``DUPLICADO`` ou ``INVALIDO`` e a mensagem do erro (ou ``None``).
+    """
+    agora = timezone.now()
+    enquete_da_opcao = {}
+    encerradas = set()
+    for id_opcao, id_enquete, expires_at, arquivada_em in Opcao.objects.filter(
+        id__in={item['id_opcao'] for item in itens}
+    ).values_list('id', 'enquete_id', 'enquete__expires_at', 'enquete__arquivada_em'):
+        enquete_da_opcao[id_opcao] = id_enquete
+        if arquivada_em or expires_at <= agora:
+            encerradas.add(id_enquete)
+
+    resultados = [None] * len(itens)
+    candidatos = {}
+    for indice, item in enumerate(itens):
+        id_enquete = enquete_da_opcao.get(item['id_opcao'])
+        if id_enquete is None:
+            resultados[indice] = (INVALIDO, OpcaoInvalida.mensagem)
+        elif id_enquete in encerradas:
+            resultados[indice] = (INVALIDO, EnqueteEncerrada.mensagem)
+        elif (id_enquete, item['id_participante']) in candidatos:
+            # Repetido dentro do próprio lote: vale o primeiro
+            resultados[indice] = (DUPLICADO, VotoDuplicado.mensagem)
+        else:
+            candidatos[(id_enquete, item['id_participante'])] = (indice, item['id_opcao'])
+
+    if candidatos:
+        with transaction.atomic():
+            _registrar_candidatos(candidatos, resultados)
+
+    return resultados
+
+
+def _votos_existentes(chaves):
+    return Voto.objects.filter(
+        enquete_id__in={id_enquete for id_enquete, _ in chaves},
+        id_participante__in={id_participante for _, id_participante in chaves}
+    )
+
+
+def _gravar_um_por_um(novos):
+    """
+    Grava os votos de ``novos`` (``{(id_enquete, id_participante): Voto}``)
+    cada um no seu savepoint e retorna as chaves gravadas. Só um voto
+    recusado porque o participante já votou fica de fora; qualquer outro
+    ``IntegrityError`` sobe.
+    """
+    gravados = set()
+    for chave, voto in novos.items():
+        try:
+            with transaction.atomic():
+                Voto.objects.create(
+                    enquete_id=voto.enquete_id, opcao_escolhida_id=voto.opcao_escolhida_id,
+                    id_participante=voto.id_participante
+                )
+        except IntegrityError:
+            if not _votos_existentes([chave]).exists():
+                raise
+            continue
+        gravados.add(chave)
+    return gravados
+
+
+def _registrar_candidatos(candidatos, resultados):
+    filtro = obter_filtro()
+    if filtro:
+        # Aceitos ou duplicados, depois do commit todos os candidatos já votaram
+        transaction.on_commit(lambda: [filtro.registrar(*chave) for chave in candidatos])
+
+    existentes = set(_votos_existentes(candidatos).values_list('enquete_id', 'id_participante'))
+    novos = {}
+    for chave, (indice, id_opcao) in candidatos.items():
+        if chave in existentes:
+            resultados[indice] = (DUPLICADO, VotoDuplicado.mensagem)
+        else:
+            novos[chave] = Voto(
+                enquete_id=chave[0], opcao_escolhida_id=id_opcao, id_participante=chave[1]
+            )
+    if not novos:
+        return
+
+    try:
+        with transaction.atomic():
+            Voto.objects.bulk_create(novos.values())
+        gravados = set(novos)
+    except IntegrityError:
+        gravados = _gravar_um_por_um(novos)
+
+    contagens = {}
+    ids = set()
+    for chave, voto in novos.items():
+        indice = candidatos[chave][0]
+        if chave not in gravados:
+            resultados[indice] = (DUPLICADO, VotoDuplicado.mensagem)
+            continue
+        resultados[indice] = (ACEITO, None)
+        contagens[voto.opcao_escolhida_id] = contagens.get(voto.opcao_escolhida_id, 0) + 1
+        ids.add(voto.enquete_id)
+
+    incrementar_votos(contagens)
+    if ids:
+        transaction.on_commit(lambda: votos_alterados(*ids))